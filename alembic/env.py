@@ -2,7 +2,14 @@ from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from src.config.config import settings
 from src.config.database import Base
+from src.models.user import User
+from src.models.order import Order
+from src.models.order_stats import OrderStats
+from src.models.order_archive import OrderArchive
+from src.models.refresh_family import RefreshTokenFamily
+from src.models.idempotency_key import IdempotencyKey
 from alembic import context
 
 # this is the Alembic Config object, which provides
@@ -14,11 +21,15 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# the application settings are the single source of truth for the database url
+if settings.Database_url:
+    config.set_main_option("sqlalchemy.url", settings.Database_url.replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
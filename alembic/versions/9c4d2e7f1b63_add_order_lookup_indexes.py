@@ -0,0 +1,35 @@
+"""add order lookup indexes
+
+Revision ID: 9c4d2e7f1b63
+Revises: 5b1e0c2f7a41
+Create Date: 2026-10-18 09:05:00.000000
+
+The indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL so the
+orders table stays writable while they build. That cannot run inside a
+transaction, hence the autocommit block.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d2e7f1b63'
+down_revision: Union[str, Sequence[str], None] = '5b1e0c2f7a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_orders_user_id_id', 'orders', ['user_id', 'id'], unique=False, if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('ix_orders_order_status_id', 'orders', ['order_status', 'id'], unique=False, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_orders_order_status_id', table_name='orders', if_exists=True, postgresql_concurrently=True)
+        op.drop_index('ix_orders_user_id_id', table_name='orders', if_exists=True, postgresql_concurrently=True)
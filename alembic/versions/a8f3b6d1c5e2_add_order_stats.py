@@ -0,0 +1,43 @@
+"""add order stats
+
+Revision ID: a8f3b6d1c5e2
+Revises: d2a7c91e4f08
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8f3b6d1c5e2'
+down_revision: Union[str, Sequence[str], None] = 'd2a7c91e4f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'order_stats',
+        sa.Column('order_status', sa.String(), nullable=False),
+        sa.Column('size', sa.String(), nullable=False),
+        sa.Column('pizza_type', sa.String(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('order_status', 'size', 'pizza_type'),
+    )
+    # backfill from the existing orders, later writes keep it up to date
+    op.execute(
+        "INSERT INTO order_stats (order_status, size, pizza_type, order_count, quantity, revenue) "
+        "SELECT COALESCE(order_status, 'pending'), size, pizza_type, COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(price), 0) "
+        "FROM orders GROUP BY COALESCE(order_status, 'pending'), size, pizza_type"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('order_stats')
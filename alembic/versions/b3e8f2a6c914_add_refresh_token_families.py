@@ -0,0 +1,40 @@
+"""add refresh token families
+
+Revision ID: b3e8f2a6c914
+Revises: e6c4a9b2d7f3
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f2a6c914'
+down_revision: Union[str, Sequence[str], None] = 'e6c4a9b2d7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'refresh_token_families',
+        sa.Column('family', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('family'),
+    )
+    op.create_index('ix_refresh_token_families_user_id', 'refresh_token_families', ['user_id'])
+    op.create_index('ix_refresh_token_families_expires_at', 'refresh_token_families', ['expires_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_token_families_expires_at', table_name='refresh_token_families')
+    op.drop_index('ix_refresh_token_families_user_id', table_name='refresh_token_families')
+    op.drop_table('refresh_token_families')
@@ -0,0 +1,68 @@
+"""add order timestamps and archive
+
+Revision ID: e6c4a9b2d7f3
+Revises: a8f3b6d1c5e2
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c4a9b2d7f3'
+down_revision: Union[str, Sequence[str], None] = 'a8f3b6d1c5e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def timestamp_columns() -> list:
+    # existing orders are stamped with the time of the upgrade
+    return [
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite only adds columns with a constant default, so the table is rebuilt, with AUTOINCREMENT
+        # from now on so that the id of an archived order is never handed out again
+        with op.batch_alter_table('orders', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            for column in timestamp_columns():
+                batch_op.add_column(column)
+    else:
+        for column in timestamp_columns():
+            op.add_column('orders', column)
+
+    op.create_table(
+        'orders_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('size', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('pizza_type', sa.String(), nullable=False),
+        sa.Column('toppings', sa.Float(), nullable=True),
+        sa.Column('order_status', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+        *timestamp_columns(),
+        sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_orders_archive_user_id_id', 'orders_archive', ['user_id', 'id'])
+    op.create_index('ix_orders_archive_order_status_id', 'orders_archive', ['order_status', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_archive_order_status_id', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_user_id_id', table_name='orders_archive')
+    op.drop_table('orders_archive')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
@@ -0,0 +1,31 @@
+"""HTTP load tests and benchmarks for the API.
+
+Runs a scripted scenario with an async httpx client against the real app,
+started under uvicorn on a fresh local SQLite database (or --database-url,
+or an already running server with --url). It writes throughput and
+p50/p95/p99 latency per endpoint to a JSON file, and compares two such
+files to flag regressions:
+
+    python -m loadtest run order_flow --users 50 --duration 30 --out base.json
+    python -m loadtest run order_flow --users 50 --duration 30 --out new.json
+    python -m loadtest compare base.json new.json --threshold 10
+
+Scenarios: order_flow, admin_listing, login_storm, order_burst and
+status_watch; `python -m loadtest list` describes them. Settings of the
+local server are passed with --env, which is how two configurations are
+compared:
+
+    # sync vs async sessions
+    python -m loadtest run order_flow --out sync.json
+    python -m loadtest run order_flow --env DATABASE_ASYNC=true --out async.json
+    # commits/s vs p99 with and without group commit
+    python -m loadtest run order_burst --users 200 --env ORDER_GROUP_COMMIT=true
+    # poll vs push for order status watchers
+    python -m loadtest run status_watch --users 10000 --watch push
+
+Admission control is off on the local server unless --admission is given,
+since every virtual user connects from the same address. `decode` is an
+in-process microbenchmark of JWT verification with and without the token
+cache, `serialize` one of order serialization through response_model and
+through the cached TypeAdapters.
+"""
@@ -0,0 +1,186 @@
+from dataclasses import fields
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import sys
+import time
+import uuid
+
+from loadtest.harness import Recorder, compare, local_server, print_comparison, print_summary, results_document, write_results
+from loadtest.scenarios import SCENARIOS, Options, run_scenario
+
+
+def parse_env(pairs: list[str]) -> dict:
+    env = {}
+    for pair in pairs:
+        name, separator, value = pair.partition("=")
+        if not separator:
+            raise SystemExit(f"--env expects NAME=VALUE, got {pair!r}")
+        env[name] = value
+    return env
+
+
+def run(args: argparse.Namespace) -> int:
+    options = Options(**{option.name: getattr(args, option.name) for option in fields(Options)})
+    env = parse_env(args.env)
+    if not args.admission:
+        env.setdefault("ADMISSION_CONTROL", "false")
+    if not args.url:
+        # the local server inherits os.environ, so it and the scraper share the token
+        os.environ["METRICS_TOKEN"] = env.pop("METRICS_TOKEN", None) or os.environ.get("METRICS_TOKEN") or secrets.token_urlsafe(16)
+    scenario = SCENARIOS[args.scenario]
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+
+    if args.url:
+        duration, before, after = asyncio.run(run_scenario(args.url.rstrip("/"), scenario, options, recorder, run_id))
+    else:
+        with local_server(env, args.database_url, args.workers) as url:
+            duration, before, after = asyncio.run(run_scenario(url, scenario, options, recorder, run_id))
+
+    meta = {
+        "scenario": args.scenario,
+        "options": vars(options),
+        "server_env": env if not args.url else {},
+        "target": args.url or args.database_url or "local sqlite",
+        "workers": args.workers,
+    }
+    document = results_document(meta, recorder.summary(duration), duration, before, after)
+    out = args.out or os.path.join("loadtest-results", f"{args.scenario}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    write_results(document, out)
+    print_summary(document)
+    print(f"results written to {out}")
+    return 0
+
+
+def compare_runs(args: argparse.Namespace) -> int:
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+    print_comparison(baseline, current)
+    regressions = compare(baseline, current, args.threshold, args.min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"ok   no regression over {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+def decode(args: argparse.Namespace) -> int:
+    """Times jwt.decode against decode_token's cache hits on one access token"""
+    from src.service.auth_service import AuthService
+    from src.utils.token_cache import decode_token, token_cache
+    from src.config.config import settings
+    import jwt
+
+    token = AuthService.create_access_token({"sub": "loadtest@example.com", "role": "user"})
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    verified = time.perf_counter() - started
+
+    token_cache.clear()
+    decode_token(token)
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        decode_token(token)
+    cached = time.perf_counter() - started
+    print(f"jwt.decode        {verified / args.iterations * 1e6:8.1f} us per token")
+    print(f"decode_token hit  {cached / args.iterations * 1e6:8.1f} us per token")
+    return 0
+
+
+def serialize(args: argparse.Namespace) -> int:
+    """Times the response_model path against the cached TypeAdapters of src.utils.serialization on one page of orders"""
+    from fastapi.responses import JSONResponse
+    from src.models.order import Order, utcnow
+    from src.service.order_service import OrderService
+    from src.utils.response import FastJSONResponse
+    from src.utils.serialization import ORDER_LIST, ORDER_PAGE, model_response
+    import timeit
+
+    count, now = args.orders, utcnow()
+    orders = [
+        Order(id=i, size="medium", quantity=2, price=25.6, pizza_type="margarita", toppings=1.0, order_status="pending", user_id=i % 100,
+              created_at=now, updated_at=now)
+        for i in range(1, count + 2)
+    ]
+
+    def response_model_path():
+        # what FastAPI does for a returned OrderPage: validate, dump to primitives, json.dumps
+        page = ORDER_PAGE.validate_python(OrderService.orders_page(orders, count), from_attributes=True)
+        return JSONResponse(content=ORDER_PAGE.dump_python(page, mode="json")).body
+
+    def type_adapter_path():
+        return model_response(ORDER_PAGE, OrderService.orders_page(orders, count)).body
+
+    rows = [ORDER_LIST.dump_python(ORDER_LIST.validate_python(orders[:count], from_attributes=True), mode="json")]
+    cases = {
+        "OrderPage via response_model": response_model_path,
+        "OrderPage via cached TypeAdapter": type_adapter_path,
+        "success envelope via JSONResponse": lambda: JSONResponse(content={"status": "success", "data": rows}).body,
+        f"success envelope via {FastJSONResponse.__name__}": lambda: FastJSONResponse(content={"status": "success", "data": rows}).body,
+    }
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        print(f"{name:<45} {best * 1000:8.1f} ms per {count} orders")
+    return 0
+
+
+def list_scenarios(args: argparse.Namespace) -> int:
+    for name, scenario in sorted(SCENARIOS.items()):
+        print(f"{name:15} {scenario.description}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Load tests and benchmarks for the API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a scenario and write its results")
+    run_parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    defaults = Options()
+    run_parser.add_argument("--users", type=int, default=defaults.users, help="virtual users running at once")
+    run_parser.add_argument("--duration", type=float, default=defaults.duration, help="seconds the recorded phase runs")
+    run_parser.add_argument("--think", type=float, default=defaults.think, help="seconds a user waits between requests")
+    run_parser.add_argument("--polls", type=int, default=defaults.polls, help="order_flow, login_storm: status polls per order")
+    run_parser.add_argument("--shoppers", type=int, default=defaults.shoppers, help="login_storm: users creating orders and polling their status during the storm")
+    run_parser.add_argument("--page-size", type=int, default=defaults.page_size, help="admin_listing: orders per page")
+    run_parser.add_argument("--seed-orders", type=int, default=defaults.seed_orders, help="admin_listing: orders created before the run")
+    run_parser.add_argument("--watch", choices=("poll", "push"), default=defaults.watch, help="status_watch: how users learn of status changes")
+    run_parser.add_argument("--poll-interval", type=float, default=defaults.poll_interval, help="status_watch: seconds between polls")
+    run_parser.add_argument("--change-interval", type=float, default=defaults.change_interval, help="status_watch: seconds between status changes")
+    run_parser.add_argument("--url", help="test an already running server instead of starting one")
+    run_parser.add_argument("--database-url", help="database of the local server, a fresh SQLite file by default")
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the local server")
+    run_parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="setting of the local server, repeatable")
+    run_parser.add_argument("--admission", action="store_true", help="keep admission control on in the local server")
+    run_parser.add_argument("--out", help="results file, loadtest-results/<scenario>-<time>.json by default")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions of one results file against another")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=1.0, help="latency changes below this are never flagged")
+    compare_parser.set_defaults(handler=compare_runs)
+
+    decode_parser = commands.add_parser("decode", help="microbenchmark JWT verification with and without the token cache")
+    decode_parser.add_argument("--iterations", type=int, default=20000)
+    decode_parser.set_defaults(handler=decode)
+
+    serialize_parser = commands.add_parser("serialize", help="microbenchmark order serialization through response_model and the cached TypeAdapters")
+    serialize_parser.add_argument("--orders", type=int, default=10000)
+    serialize_parser.add_argument("--repeat", type=int, default=5)
+    serialize_parser.set_defaults(handler=serialize)
+
+    list_parser = commands.add_parser("list", help="describe the scenarios")
+    list_parser.set_defaults(handler=list_scenarios)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
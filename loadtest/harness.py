@@ -0,0 +1,241 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the local server inherits the app's environment, but never its other databases
+LOCAL_DATABASE_ENV = {"ASYNC_DATABASE_URL": "", "DATABASE_REPLICA_URLS": ""}
+# counters read from the server's /metrics before and after a run
+SERVER_COUNTERS = (
+    "order_group_commit_batches_total",
+    "order_group_commit_rows_total",
+    "http_request_sql_budget_exceeded_total",
+    "db_pool_timeouts_total",
+    "admission_shed_total",
+)
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@contextmanager
+def local_server(env: dict, database_url: Optional[str] = None, workers: int = 1) -> Iterator[str]:
+    """Runs the app under uvicorn against a fresh SQLite file, or `database_url`, and yields its base url"""
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as directory:
+        port = free_port()
+        server_env = {
+            **os.environ,
+            **LOCAL_DATABASE_ENV,
+            "DATABASE_URL": database_url or f"sqlite:///{directory}/loadtest.db",
+            "DB_CREATE_SCHEMA": "true",
+            **env,
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--no-access-log", "--log-level", "warning"],
+            env=server_env,
+            cwd=REPO_ROOT,
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(url, process)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"the app exited with status {process.returncode} before it started")
+        try:
+            httpx.get(url + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"the app did not start within {timeout:.0f} s")
+
+
+async def scrape_counters(http: httpx.AsyncClient) -> dict:
+    """Sums the SERVER_COUNTERS samples of /metrics over their labels, {} when the server has no /metrics.
+    The server's METRICS_TOKEN is read from the environment, like the server itself does."""
+    token = os.environ.get("METRICS_TOKEN")
+    try:
+        response = await http.get("/metrics", headers={"Authorization": f"Bearer {token}"} if token else None)
+    except httpx.HTTPError:
+        return {}
+    if response.status_code != 200:
+        return {}
+    counters = {}
+    for line in response.text.splitlines():
+        if line.startswith("#") or not line:
+            continue
+        sample, _, value = line.rpartition(" ")
+        name = sample.split("{", 1)[0]
+        if name in SERVER_COUNTERS:
+            counters[name] = counters.get(name, 0) + float(value)
+    return counters
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    """Latency and outcome of every request, grouped by endpoint label.
+
+    An outcome is the status code, or the exception name when no response
+    arrived. Status codes of 400 and above and exceptions count as errors.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.outcomes: dict[str, dict[str, int]] = {}
+
+    def record(self, endpoint: str, seconds: float, outcome) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        outcomes = self.outcomes.setdefault(endpoint, {})
+        outcomes[str(outcome)] = outcomes.get(str(outcome), 0) + 1
+
+    @staticmethod
+    def is_error(outcome: str) -> bool:
+        return not outcome.isdigit() or int(outcome) >= 400
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            outcomes = self.outcomes[endpoint]
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": sum(count for outcome, count in outcomes.items() if self.is_error(outcome)),
+                "throughput": round(len(values) / duration, 2) if duration else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+                "outcomes": dict(sorted(outcomes.items())),
+            }
+        return endpoints
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def results_document(meta: dict, endpoints: dict, duration: float, server_before: dict, server_after: dict) -> dict:
+    """Builds the machine-readable result of a run, see compare() for how two of them are compared"""
+    server = {name: server_after.get(name, 0) - server_before.get(name, 0) for name in server_after}
+    document = {
+        "meta": {
+            **meta,
+            "duration_s": round(duration, 3),
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "endpoints": endpoints,
+        "server": server,
+    }
+    created = endpoints.get("POST /api/v1/order/order")
+    if created:
+        orders = created["outcomes"].get("201", 0)
+        # a group commit batch is one commit, without group commit every created order is one
+        commits = server.get("order_group_commit_batches_total") or orders
+        document["orders"] = {
+            "created_per_second": round(orders / duration, 2) if duration else 0.0,
+            "commits_per_second": round(commits / duration, 2) if duration else 0.0,
+            "p99_ms": created["p99_ms"],
+        }
+        polled = endpoints.get("GET /api/v1/order/orders/{order_id}/status")
+        if polled:
+            document["orders"]["status_p99_ms"] = polled["p99_ms"]
+    return document
+
+
+def write_results(document: dict, path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as out:
+        json.dump(document, out, indent=2)
+        out.write("\n")
+
+
+def print_summary(document: dict) -> None:
+    print(f"{'endpoint':58} {'req':>7} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, stats in document["endpoints"].items():
+        print(f"{endpoint:58} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput']:>9.1f} "
+              f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    if "orders" in document:
+        orders = document["orders"]
+        status = f", status p99 {orders['status_p99_ms']:.2f} ms" if "status_p99_ms" in orders else ""
+        print(f"orders: {orders['created_per_second']:.1f} created/s, {orders['commits_per_second']:.1f} commits/s, p99 {orders['p99_ms']:.2f} ms{status}")
+    if any(document["server"].values()):
+        print("server:", ", ".join(f"{name} +{value:g}" for name, value in document["server"].items() if value))
+
+
+def compare(baseline: dict, current: dict, threshold: float = 10.0, min_delta_ms: float = 1.0) -> list[str]:
+    """Returns a line per regression of `current` against `baseline`.
+
+    A latency percentile regresses when it grew by more than `threshold`
+    percent and by more than `min_delta_ms`, which keeps sub-millisecond
+    jitter from being flagged. Throughput regresses when it fell by more
+    than `threshold` percent, and an endpoint regresses when its error rate
+    grew or it produced errors it did not produce before.
+    """
+    regressions = []
+    for endpoint, new in current["endpoints"].items():
+        old = baseline["endpoints"].get(endpoint)
+        if old is None:
+            continue
+        for key in LATENCY_KEYS:
+            delta = new[key] - old[key]
+            if delta > min_delta_ms and old[key] and delta / old[key] * 100 > threshold:
+                regressions.append(f"{endpoint}: {key} {old[key]:.2f} -> {new[key]:.2f} (+{delta / old[key] * 100:.0f}%)")
+        if old["throughput"] and (old["throughput"] - new["throughput"]) / old["throughput"] * 100 > threshold:
+            regressions.append(f"{endpoint}: throughput {old['throughput']:.1f} -> {new['throughput']:.1f} req/s")
+        old_rate = old["errors"] / old["requests"] if old["requests"] else 0
+        new_rate = new["errors"] / new["requests"] if new["requests"] else 0
+        if new_rate > old_rate and new["errors"]:
+            regressions.append(f"{endpoint}: error rate {old_rate:.2%} -> {new_rate:.2%}")
+    return regressions
+
+
+def print_comparison(baseline: dict, current: dict) -> None:
+    print(f"{'endpoint':58} {'p50 ms':>17} {'p99 ms':>19} {'req/s':>19}")
+    for endpoint, new in current["endpoints"].items():
+        old = baseline["endpoints"].get(endpoint)
+        if old is None:
+            print(f"{endpoint:58} (not in baseline)")
+            continue
+        print(f"{endpoint:58} {old['p50_ms']:>7.2f} -> {new['p50_ms']:>7.2f} {old['p99_ms']:>8.2f} -> {new['p99_ms']:>8.2f} "
+              f"{old['throughput']:>8.1f} -> {new['throughput']:>8.1f}")
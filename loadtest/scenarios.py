@@ -0,0 +1,304 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Optional
+import asyncio
+import itertools
+import json
+import random
+import time
+
+import httpx
+
+from loadtest.harness import Recorder, scrape_counters
+
+
+ORDER = {"size": "small", "quantity": 1, "pizza_type": "cheese", "toppings": 0}
+PASSWORD = "loadtest-password"
+STATUS_CYCLE = ("is_delivering", "delivered", "pending")
+# the largest batch POST /orders/batch accepts by default
+SEED_BATCH = 50
+
+
+class ApiClient:
+    """Calls the API and records each call's latency under a route-template label"""
+
+    def __init__(self, http: httpx.AsyncClient, recorder: Optional[Recorder]):
+        self.http = http
+        self.recorder = recorder
+
+    async def call(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.record(endpoint, time.perf_counter() - started, type(e).__name__)
+            return None
+        self.record(endpoint, time.perf_counter() - started, response.status_code)
+        return response
+
+    def record(self, endpoint: str, seconds: float, outcome) -> None:
+        if self.recorder is not None:
+            self.recorder.record(endpoint, seconds, outcome)
+
+    async def signup(self, email: str, role: str = "user") -> None:
+        await self.call("POST /api/v1/auth/signup", "POST", "/api/v1/auth/signup", json={
+            "username": email.split("@")[0], "email": email, "phone": "0123456789", "password": PASSWORD, "role": role,
+        })
+
+    async def login(self, email: str) -> Optional[dict]:
+        """Returns the Authorization header of the user, None when the login failed"""
+        response = await self.call("POST /api/v1/auth/login", "POST", "/api/v1/auth/login", json={"email": email, "password": PASSWORD})
+        if response is None or response.status_code != 200:
+            return None
+        return {"Authorization": "Bearer " + response.json()["data"]["data"]["access_token"]}
+
+    async def create_order(self, headers: dict) -> Optional[int]:
+        response = await self.call("POST /api/v1/order/order", "POST", "/api/v1/order/order", json=ORDER, headers=headers)
+        if response is None or response.status_code != 201:
+            return None
+        return response.json()["id"]
+
+    async def order_status(self, headers: dict, order_id: int, etag: Optional[str] = None) -> Optional[httpx.Response]:
+        if etag:
+            headers = {**headers, "If-None-Match": etag}
+        return await self.call("GET /api/v1/order/orders/{order_id}/status", "GET", f"/api/v1/order/orders/{order_id}/status", headers=headers)
+
+
+@dataclass
+class Options:
+    users: int = 20
+    duration: float = 30.0
+    think: float = 0.0
+    polls: int = 3
+    shoppers: int = 10
+    page_size: int = 50
+    seed_orders: int = 2000
+    watch: str = "poll"
+    poll_interval: float = 1.0
+    change_interval: float = 0.2
+
+
+@dataclass
+class Context:
+    """What a scenario's setup and virtual users share during one run"""
+    setup_client: ApiClient
+    client: ApiClient
+    options: Options
+    run_id: str
+    deadline: float = 0.0
+    shared: dict = field(default_factory=dict)
+
+    def email(self, name) -> str:
+        return f"lt-{self.run_id}-{name}@example.com"
+
+    def running(self) -> bool:
+        return time.monotonic() < self.deadline
+
+
+async def sign_up_users(ctx: Context, count: int, prefix: str) -> list[Optional[dict]]:
+    """Signs up and logs in `count` users without recording, ten at a time"""
+    semaphore = asyncio.Semaphore(10)
+
+    async def one(index: int) -> Optional[dict]:
+        async with semaphore:
+            await ctx.setup_client.signup(ctx.email(f"{prefix}{index}"))
+            return await ctx.setup_client.login(ctx.email(f"{prefix}{index}"))
+
+    return await asyncio.gather(*(one(index) for index in range(count)))
+
+
+async def shop(ctx: Context, headers: dict) -> None:
+    """Creates orders and polls each one's status until the deadline"""
+    while ctx.running():
+        order_id = await ctx.client.create_order(headers)
+        etag = None
+        for _ in range(ctx.options.polls if order_id else 0):
+            await asyncio.sleep(ctx.options.think)
+            response = await ctx.client.order_status(headers, order_id, etag)
+            if response is not None and response.status_code == 200:
+                etag = response.headers.get("etag")
+        await asyncio.sleep(ctx.options.think)
+
+
+async def admin_headers(ctx: Context) -> dict:
+    await ctx.setup_client.signup(ctx.email("admin"), role="admin")
+    headers = await ctx.setup_client.login(ctx.email("admin"))
+    if headers is None:
+        raise RuntimeError("could not log in the load-test admin")
+    return headers
+
+
+class Scenario(ABC):
+    """A scripted workload: `setup` runs unrecorded, then `users` virtual users run `user` until the deadline"""
+    description = ""
+
+    async def setup(self, ctx: Context) -> None:
+        pass
+
+    @abstractmethod
+    async def user(self, ctx: Context, index: int) -> None:
+        """One virtual user, looping until ctx.running() turns false"""
+
+    async def background(self, ctx: Context) -> None:
+        """Runs next to the virtual users, for load that is not one per user"""
+
+
+class OrderFlow(Scenario):
+    description = "each user signs up, logs in, then creates orders and polls each order's status"
+
+    async def user(self, ctx: Context, index: int) -> None:
+        await ctx.client.signup(ctx.email(index))
+        headers = await ctx.client.login(ctx.email(index))
+        if headers is not None:
+            await shop(ctx, headers)
+
+
+class AdminListing(Scenario):
+    description = "admins page through every order with the keyset cursor, then read the order statistics"
+
+    async def setup(self, ctx: Context) -> None:
+        ctx.shared["admin"] = await admin_headers(ctx)
+        [seller] = await sign_up_users(ctx, 1, "seller")
+        for start in range(0, ctx.options.seed_orders, SEED_BATCH):
+            await ctx.setup_client.call("seed", "POST", "/api/v1/order/orders/batch", headers=seller,
+                                        json={"orders": [ORDER] * min(SEED_BATCH, ctx.options.seed_orders - start)})
+
+    async def user(self, ctx: Context, index: int) -> None:
+        headers = ctx.shared["admin"]
+        while ctx.running():
+            cursor = None
+            while ctx.running():
+                params = {"limit": ctx.options.page_size, **({"cursor": cursor} if cursor else {})}
+                response = await ctx.client.call("GET /api/v1/order/orders", "GET", "/api/v1/order/orders", params=params, headers=headers)
+                cursor = response.json().get("next_cursor") if response is not None and response.status_code == 200 else None
+                if cursor is None:
+                    break
+                await asyncio.sleep(ctx.options.think)
+            await ctx.client.call("GET /api/v1/admin/stats/orders", "GET", "/api/v1/admin/stats/orders", headers=headers)
+            await asyncio.sleep(ctx.options.think)
+
+
+class LoginStorm(Scenario):
+    description = "existing users log in over and over, the password hashing path, while --shoppers users create orders and poll their status"
+
+    async def setup(self, ctx: Context) -> None:
+        await sign_up_users(ctx, ctx.options.users, "storm")
+        ctx.shared["shoppers"] = await sign_up_users(ctx, ctx.options.shoppers, "shopper")
+
+    async def background(self, ctx: Context) -> None:
+        # the order and status p99 under the storm is what shows whether logins starve the rest of the API
+        await asyncio.gather(*(shop(ctx, headers) for headers in ctx.shared["shoppers"] if headers is not None))
+
+    async def user(self, ctx: Context, index: int) -> None:
+        while ctx.running():
+            await ctx.client.login(ctx.email(f"storm{index}"))
+            await asyncio.sleep(ctx.options.think)
+
+
+class OrderBurst(Scenario):
+    description = "logged-in users create orders back to back; run with and without ORDER_GROUP_COMMIT to compare commits/s and p99"
+
+    async def setup(self, ctx: Context) -> None:
+        ctx.shared["users"] = await sign_up_users(ctx, ctx.options.users, "burst")
+
+    async def user(self, ctx: Context, index: int) -> None:
+        headers = ctx.shared["users"][index]
+        while headers is not None and ctx.running():
+            await ctx.client.create_order(headers)
+            await asyncio.sleep(ctx.options.think)
+
+
+class StatusWatch(Scenario):
+    """Measures how long an order status change takes to reach the watching user.
+
+    One task keeps changing the status of random orders. With --watch poll
+    every user polls its order's status with If-None-Match; with --watch push
+    every user holds the server-sent event stream open. The time from
+    sending the PATCH to the user seeing the new status is recorded as
+    "status change seen", and the requests per second show what each mode
+    costs the server.
+    """
+    description = "users watch their order's status by polling or by server-sent events, while an admin changes statuses"
+
+    async def setup(self, ctx: Context) -> None:
+        ctx.shared["admin"] = await admin_headers(ctx)
+        ctx.shared["users"] = await sign_up_users(ctx, ctx.options.users, "watcher")
+        ctx.shared["orders"] = [
+            await ctx.setup_client.create_order(headers) if headers else None for headers in ctx.shared["users"]
+        ]
+        ctx.shared["changes"] = {}
+
+    def seen(self, ctx: Context, order_id: int, order_status: str) -> None:
+        change = ctx.shared["changes"].get(order_id)
+        if change is not None and change[0] == order_status and not change[2]:
+            change[2] = True
+            ctx.client.record("status change seen", time.perf_counter() - change[1], 200)
+
+    async def background(self, ctx: Context) -> None:
+        orders = [order_id for order_id in ctx.shared["orders"] if order_id]
+        statuses = {order_id: itertools.cycle(STATUS_CYCLE) for order_id in orders}
+        while orders and ctx.running():
+            order_id = random.choice(orders)
+            new_status = next(statuses[order_id])
+            # [status, sent at, seen]; a later change of the same order replaces an unseen one
+            ctx.shared["changes"][order_id] = [new_status, time.perf_counter(), False]
+            await ctx.client.call("PATCH /api/v1/order/orders/{order_id}/status", "PATCH", f"/api/v1/order/orders/{order_id}/status",
+                                  json={"new_status": new_status}, headers=ctx.shared["admin"])
+            await asyncio.sleep(ctx.options.change_interval)
+
+    async def user(self, ctx: Context, index: int) -> None:
+        headers, order_id = ctx.shared["users"][index], ctx.shared["orders"][index]
+        if headers is None or order_id is None:
+            return
+        if ctx.options.watch == "push":
+            await self.push(ctx, headers, order_id)
+        else:
+            await self.poll(ctx, headers, order_id)
+
+    async def poll(self, ctx: Context, headers: dict, order_id: int) -> None:
+        etag = None
+        while ctx.running():
+            response = await ctx.client.order_status(headers, order_id, etag)
+            if response is not None and response.status_code == 200:
+                etag = response.headers.get("etag")
+                self.seen(ctx, order_id, response.json()["order_status"])
+            await asyncio.sleep(ctx.options.poll_interval)
+
+    async def push(self, ctx: Context, headers: dict, order_id: int) -> None:
+        async def listen():
+            started = time.perf_counter()
+            async with ctx.client.http.stream("GET", "/api/v1/order/orders/events", headers=headers) as response:
+                ctx.client.record("GET /api/v1/order/orders/events", time.perf_counter() - started, response.status_code)
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        event = json.loads(line[len("data: "):])
+                        self.seen(ctx, event.get("order_id"), event.get("order_status"))
+
+        try:
+            await asyncio.wait_for(listen(), timeout=max(0.0, ctx.deadline - time.monotonic()))
+        except (asyncio.TimeoutError, httpx.HTTPError):
+            pass
+
+
+SCENARIOS = {
+    "order_flow": OrderFlow(),
+    "admin_listing": AdminListing(),
+    "login_storm": LoginStorm(),
+    "order_burst": OrderBurst(),
+    "status_watch": StatusWatch(),
+}
+
+
+async def run_scenario(url: str, scenario: Scenario, options: Options, recorder: Recorder, run_id: str) -> tuple[float, dict, dict]:
+    """Runs the scenario against `url`, returns the seconds its recorded phase took and the server counters before and after it"""
+    # SSE watchers hold one connection each, so the pool must not cap them
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=httpx.Timeout(60.0)) as http:
+        ctx = Context(setup_client=ApiClient(http, None), client=ApiClient(http, recorder), options=options, run_id=run_id)
+        await scenario.setup(ctx)
+        before = await scrape_counters(http)
+        started = time.monotonic()
+        ctx.deadline = started + options.duration
+        await asyncio.gather(scenario.background(ctx), *(scenario.user(ctx, index) for index in range(options.users)))
+        duration = time.monotonic() - started
+        return duration, before, await scrape_counters(http)
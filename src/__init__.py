@@ -1,15 +1,62 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.routes.auth_route import auth_router
 from src.routes.order_route import order_router
-from src.config.database import Base,engine
+from src.routes.menu_route import menu_router
+from src.routes.admin_route import admin_router
+from src.routes.metrics_route import metrics_router
+from src.config.config import settings
+from src.config.database import REPLICA_URLS, Base, dispose_engines, get_engine
+from src.utils.admission import AdmissionControlMiddleware, AdmissionController, AdmissionPolicy
+from src.utils.order_archiver import order_archiver
+from src.utils.password_pool import password_pool
+from src.utils.recent_writes import RecentWritesMiddleware, recent_writes
+from src.utils.request_metrics import RequestMetrics, RequestMetricsMiddleware
+from starlette.concurrency import run_in_threadpool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown; importing the app never connects to the database"""
+    if settings.DB_CREATE_SCHEMA:
+        await run_in_threadpool(Base.metadata.create_all, bind=get_engine())
+    # a no-op unless ORDER_ARCHIVE_AFTER_DAYS is set
+    order_archiver.start()
+    yield
+    await order_archiver.stop()
+    password_pool.shutdown()
+    await dispose_engines()
 
 
 app = FastAPI(
     title="Pizza delivery project",
-    summary = " This API is for tracking the order status of pizza"
+    summary = " This API is for tracking the order status of pizza",
+    lifespan=lifespan
 )
-Base.metadata.create_all(bind=engine)
+
+# first matching policy wins; "critical" routes keep being admitted after "normal" and "low" ones are shed
+ADMISSION_POLICIES = [
+    AdmissionPolicy(name="order_events", path="/api/v1/order/orders/events", methods=("GET",), priority="critical", max_concurrency=1000, long_lived=True),
+    AdmissionPolicy(name="order_create", path="/api/v1/order/(order|orders/batch)", methods=("POST",), priority="critical"),
+    AdmissionPolicy(name="order_read", path=r"/api/v1/order/(order/\d+|orders/\d+/status)", methods=("GET",), priority="critical"),
+    AdmissionPolicy(name="order_export", path="/api/v1/order/orders/export", methods=("GET",), priority="low", max_concurrency=2),
+    AdmissionPolicy(name="auth_login", path="/api/v1/auth/(login|signup)", methods=("POST",), priority="low", max_concurrency=64, client_rate=1, client_burst=10),
+    AdmissionPolicy(name="user_import", path="/api/v1/auth/users/import", methods=("POST",), priority="low", max_concurrency=1),
+]
+admission = AdmissionController(ADMISSION_POLICIES, max_in_flight=int(settings.ADMISSION_MAX_INFLIGHT), max_clients=int(settings.ADMISSION_MAX_CLIENTS))
+app.state.admission = admission
+if settings.ADMISSION_CONTROL:
+    # added before CORS so that shed responses still carry the CORS headers
+    app.add_middleware(AdmissionControlMiddleware, controller=admission, trusted_proxies=(settings.ADMISSION_TRUSTED_PROXIES or "").split(","))
+if settings.REQUEST_METRICS:
+    request_metrics = RequestMetrics(query_budget=int(settings.QUERY_BUDGET))
+    app.state.request_metrics = request_metrics
+    # added after admission control, so it wraps it and also times the requests it sheds
+    app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+if REPLICA_URLS:
+    # carries each client's last write between its requests, so its reads after a write stay on the primary
+    app.add_middleware(RecentWritesMiddleware, recent_writes=recent_writes)
 app.add_middleware(
     CORSMiddleware,
     allow_origins= ["*"],
@@ -20,6 +67,9 @@ app.add_middleware(
 
 app.include_router(auth_router, prefix= "/api/v1/auth", tags={"Authentification"})
 app.include_router(order_router, prefix= "/api/v1/order", tags={"Order"})
+app.include_router(menu_router, prefix= "/api/v1", tags={"Menu"})
+app.include_router(admin_router, prefix= "/api/v1/admin", tags={"Admin"})
+app.include_router(metrics_router, tags={"Metrics"})
 
 @app.get('/')
 async def home():
@@ -1,16 +1,68 @@
 import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 load_dotenv()
 
 class Settings(BaseSettings):
     Project_Name: str = "Pizza Delivery API"
     Database_url: str = os.getenv("DATABASE_URL")
+    # async mode needs an async driver: asyncpg for PostgreSQL, aiosqlite for SQLite
+    DATABASE_ASYNC: bool = os.getenv("DATABASE_ASYNC", default=False)
+    ASYNC_DATABASE_URL: Optional[str] = os.getenv("ASYNC_DATABASE_URL")
+    # creates missing tables at startup, for throwaway databases; deployments run `alembic upgrade head`
+    DB_CREATE_SCHEMA: bool = os.getenv("DB_CREATE_SCHEMA", default=False)
+    # comma separated read replica urls, reads fall back to the primary when empty
+    DATABASE_REPLICA_URLS: Optional[str] = os.getenv("DATABASE_REPLICA_URLS")
+    DATABASE_REPLICA_SELECTION: str = os.getenv("DATABASE_REPLICA_SELECTION", default="round_robin")
+    READ_YOUR_WRITES_WINDOW: float = os.getenv("READ_YOUR_WRITES_WINDOW", default=5)
+    DB_POOL_SIZE: int = os.getenv("DB_POOL_SIZE", default=5)
+    DB_MAX_OVERFLOW: int = os.getenv("DB_MAX_OVERFLOW", default=10)
+    DB_POOL_TIMEOUT: float = os.getenv("DB_POOL_TIMEOUT", default=30)
+    DB_POOL_RECYCLE: int = os.getenv("DB_POOL_RECYCLE", default=1800)
+    # "always" pings on every checkout, "idle" only after DB_PRE_PING_IDLE seconds unused, "never" skips it
+    DB_PRE_PING: str = os.getenv("DB_PRE_PING", default="idle")
+    DB_PRE_PING_IDLE: float = os.getenv("DB_PRE_PING_IDLE", default=30)
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY")
     JWT_ACCESS_TOKEN_EXPIRES: int = os.getenv("JWT_ACCESS_TOKEN_EXPIRES")
     JWT_REFRESH_TOKEN_EXPIRES: int = os.getenv("JWT_REFRESH_TOKEN_EXPIRES")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", default="HS256")
+    PRINCIPAL_CACHE_TTL: int = os.getenv("PRINCIPAL_CACHE_TTL", default=60)
+    PRINCIPAL_CACHE_SIZE: int = os.getenv("PRINCIPAL_CACHE_SIZE", default=10000)
+    TOKEN_CACHE_SIZE: int = os.getenv("TOKEN_CACHE_SIZE", default=10000)
+    PASSWORD_HASH_WORKERS: int = os.getenv("PASSWORD_HASH_WORKERS", default=os.cpu_count() or 1)
+    PASSWORD_HASH_QUEUE_SIZE: int = os.getenv("PASSWORD_HASH_QUEUE_SIZE", default=16)
+    PASSWORD_HASH_TIMEOUT: float = os.getenv("PASSWORD_HASH_TIMEOUT", default=10)
+    USER_IMPORT_BATCH_SIZE: int = os.getenv("USER_IMPORT_BATCH_SIZE", default=1000)
+    USER_IMPORT_MAX: int = os.getenv("USER_IMPORT_MAX", default=1000)
+    MENU_FILE: Optional[str] = os.getenv("MENU_FILE")
+    MENU_RELOAD_INTERVAL: float = os.getenv("MENU_RELOAD_INTERVAL", default=5)
+    ORDER_PAGE_SIZE: int = os.getenv("ORDER_PAGE_SIZE", default=50)
+    ORDER_PAGE_SIZE_MAX: int = os.getenv("ORDER_PAGE_SIZE_MAX", default=200)
+    ORDER_BATCH_MAX: int = os.getenv("ORDER_BATCH_MAX", default=50)
+    ORDER_EXPORT_CHUNK_SIZE: int = os.getenv("ORDER_EXPORT_CHUNK_SIZE", default=1000)
+    ORDER_GROUP_COMMIT: bool = os.getenv("ORDER_GROUP_COMMIT", default=False)
+    ORDER_GROUP_COMMIT_WINDOW_MS: float = os.getenv("ORDER_GROUP_COMMIT_WINDOW_MS", default=2)
+    ORDER_GROUP_COMMIT_MAX_BATCH: int = os.getenv("ORDER_GROUP_COMMIT_MAX_BATCH", default=64)
+    # delivered orders untouched for this many days move to orders_archive, unset or 0 turns the archiver off
+    ORDER_ARCHIVE_AFTER_DAYS: Optional[float] = os.getenv("ORDER_ARCHIVE_AFTER_DAYS")
+    ORDER_ARCHIVE_INTERVAL: float = os.getenv("ORDER_ARCHIVE_INTERVAL", default=3600)
+    ORDER_ARCHIVE_BATCH_SIZE: int = os.getenv("ORDER_ARCHIVE_BATCH_SIZE", default=1000)
+    ADMISSION_CONTROL: bool = os.getenv("ADMISSION_CONTROL", default=True)
+    ADMISSION_MAX_INFLIGHT: int = os.getenv("ADMISSION_MAX_INFLIGHT", default=256)
+    ADMISSION_MAX_CLIENTS: int = os.getenv("ADMISSION_MAX_CLIENTS", default=10000)
+    # comma separated addresses or networks of the reverse proxies allowed to set X-Forwarded-For
+    ADMISSION_TRUSTED_PROXIES: Optional[str] = os.getenv("ADMISSION_TRUSTED_PROXIES")
+    REQUEST_METRICS: bool = os.getenv("REQUEST_METRICS", default=True)
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN")
+    QUERY_BUDGET: int = os.getenv("QUERY_BUDGET", default=20)
+    IDEMPOTENCY_KEY_TTL: float = os.getenv("IDEMPOTENCY_KEY_TTL", default=86400)
+    ORDER_EVENTS_BACKEND: str = os.getenv("ORDER_EVENTS_BACKEND", default="local")
+    ORDER_EVENTS_QUEUE_SIZE: int = os.getenv("ORDER_EVENTS_QUEUE_SIZE", default=100)
+    ORDER_EVENTS_KEEPALIVE: float = os.getenv("ORDER_EVENTS_KEEPALIVE", default=15)
+    ORDER_VERSION_CACHE_SIZE: int = os.getenv("ORDER_VERSION_CACHE_SIZE", default=100000)
+    ORDER_VERSION_CACHE_TTL: float = os.getenv("ORDER_VERSION_CACHE_TTL", default=30)
 
 
 
@@ -1,20 +1,262 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+from typing import Optional
+import itertools
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
 from src.config.config import settings
+from src.utils.pool_metrics import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, instrument_engine
+from src.utils.recent_writes import recent_writes
+from src.utils.request_metrics import track_queries
 
 
 SQLALCHEMY_DATABASE_URL = settings.Database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping = True)
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+def pool_options(url: str, name: str, is_async: bool = False) -> dict:
+    """Returns the create_engine pool arguments from Settings for a database url"""
+    if settings.DB_PRE_PING not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_PRE_PING must be one of {', '.join(PRE_PING_STRATEGIES)}")
+    options = {"pool_pre_ping": settings.DB_PRE_PING == "always"}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # in-memory SQLite keeps its single-connection pool
+        return options
+    return {
+        **options,
+        "poolclass": InstrumentedAsyncAdaptedQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": int(settings.DB_POOL_SIZE),
+        "max_overflow": int(settings.DB_MAX_OVERFLOW),
+        "pool_timeout": float(settings.DB_POOL_TIMEOUT),
+        "pool_recycle": int(settings.DB_POOL_RECYCLE),
+        "pool_logging_name": name,
+    }
+
+def instrument(engine, name: str):
+    instrument_engine(engine, name, settings.DB_PRE_PING, float(settings.DB_PRE_PING_IDLE))
+    if settings.REQUEST_METRICS:
+        track_queries(engine)
+    return engine
+
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(database_url: str) -> str:
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+def async_database_url() -> str:
+    """Returns ASYNC_DATABASE_URL, or the sync database url switched to its async driver"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    return to_async_url(SQLALCHEMY_DATABASE_URL)
+
+
+class ReplicaSet:
+    """The read replicas, picked round robin or by the fewest checked out connections"""
+
+    STRATEGIES = ("round_robin", "least_busy")
+
+    def __init__(self, engines: list, strategy: str):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"DATABASE_REPLICA_SELECTION must be one of {', '.join(self.STRATEGIES)}")
+        self.engines = engines
+        self.strategy = strategy
+        self._turn = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self):
+        if self.strategy == "least_busy":
+            return min(self.engines, key=lambda replica: replica.pool.checkedout() if isinstance(replica.pool, QueuePool) else 0)
+        return self.engines[next(self._turn) % len(self.engines)]
+
+
+class RoutingSession(Session):
+    """Sends the SELECTs of a session marked read-only to a replica, everything else to the primary.
+
+    A session sticks to the first replica it picks, so all its reads see one
+    snapshot, and it notes any write so the rest of the request, and the
+    client's requests in the next READ_YOUR_WRITES_WINDOW seconds, read from
+    the primary; see RecentWrites.
+    """
+
+    def __init__(self, *args, replicas: ReplicaSet = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        reading = clause is None or clause.is_select
+        if self._flushing or not reading:
+            self.info["wrote"] = True
+        elif self.replicas and self.info.get("read_only"):
+            if "replica" not in self.info:
+                self.info["replica"] = self.replicas.pick()
+            return self.info["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+def lazy(factory):
+    """Builds the value of `factory` on first use, once, so importing this module never touches a database driver"""
+    built = []
+    lock = Lock()
+
+    @wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+
+    get.is_built = lambda: bool(built)
+    return get
+
+
+REPLICA_URLS = [url.strip() for url in (settings.DATABASE_REPLICA_URLS or "").split(",") if url.strip()]
+
+@lazy
+def get_engine():
+    return instrument(create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL, "primary")), "primary")
+
+@lazy
+def get_replicas() -> ReplicaSet:
+    return ReplicaSet([
+        instrument(create_engine(url, **pool_options(url, f"replica_{i}")), f"replica_{i}")
+        for i, url in enumerate(REPLICA_URLS)
+    ], settings.DATABASE_REPLICA_SELECTION)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@lazy
+def get_session_factory() -> sessionmaker:
+    return sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=get_engine(), replicas=get_replicas())
+
+@lazy
+def get_async_engine():
+    if not settings.DATABASE_ASYNC:
+        return None
+    return instrument(
+        create_async_engine(async_database_url(), **pool_options(async_database_url(), "primary_async", is_async=True)), "primary_async"
+    )
+
+@lazy
+def get_async_replica_engines() -> list:
+    if not settings.DATABASE_ASYNC:
+        return []
+    return [
+        instrument(create_async_engine(to_async_url(url), **pool_options(to_async_url(url), f"replica_{i}_async", is_async=True)), f"replica_{i}_async")
+        for i, url in enumerate(REPLICA_URLS)
+    ]
+
+@lazy
+def get_async_replicas() -> Optional[ReplicaSet]:
+    if not settings.DATABASE_ASYNC:
+        return None
+    # an AsyncSession routes through the sync engines wrapped by its async replica engines
+    return ReplicaSet([replica.sync_engine for replica in get_async_replica_engines()], settings.DATABASE_REPLICA_SELECTION)
+
+@lazy
+def get_async_session_factory() -> Optional[async_sessionmaker]:
+    if not settings.DATABASE_ASYNC:
+        return None
+    return async_sessionmaker(
+        bind=get_async_engine(), sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False, replicas=get_async_replicas()
+    )
+
+
+# the engines and session factories used to be module attributes, they are still importable by those names
+LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "replicas": get_replicas,
+    "replica_engines": lambda: get_replicas().engines,
+    "SessionLocal": get_session_factory,
+    "async_engine": get_async_engine,
+    "async_replicas": get_async_replicas,
+    "AsyncSessionLocal": get_async_session_factory,
+}
+
+def __getattr__(name: str):
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def dispose_engines() -> None:
+    """Closes the pooled connections of every engine that was built"""
+    if get_engine.is_built():
+        get_engine().dispose()
+    if get_replicas.is_built():
+        for replica in get_replicas().engines:
+            replica.dispose()
+    if get_async_engine.is_built() and get_async_engine() is not None:
+        await get_async_engine().dispose()
+    if get_async_replica_engines.is_built():
+        for replica in get_async_replica_engines():
+            await replica.dispose()
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_writer(session):
+    if session.info.pop("wrote", False):
+        recent_writes.mark()
+
+@event.listens_for(RoutingSession, "after_rollback")
+def forget_write(session):
+    session.info.pop("wrote", None)
+
+
+@contextmanager
+def replica_reads(db):
+    """Lets the reads made inside the block go to a replica, unless the client wrote within READ_YOUR_WRITES_WINDOW"""
+    if not REPLICA_URLS or recent_writes.recent() or db.info.get("read_only"):
+        yield db
+        return
+    db.info["read_only"] = True
+    try:
+        yield db
+    finally:
+        db.info["read_only"] = False
 
 
 Base = declarative_base()
 
 def get_db():
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
+
+# the session dependency of the routes, an AsyncSession when DATABASE_ASYNC is enabled
+get_session = get_async_db if settings.DATABASE_ASYNC else get_db
+
+
+async def run_db(sync_call, async_call, db, *args, **kwargs):
+    """Runs the async service call on an AsyncSession, or the sync one on the threadpool"""
+    if isinstance(db, AsyncSession):
+        return await async_call(db, *args, **kwargs)
+    return await run_in_threadpool(sync_call, db, *args, **kwargs)
+
+
+async def release_db(db) -> None:
+    """Gives the session's connection back to the pool while the request carries on"""
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        db.close()
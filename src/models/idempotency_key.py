@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from src.config.database import Base
+
+
+class IdempotencyKey(Base):
+    """The order created for an Idempotency-Key, shared by every worker until expires_at"""
+    __tablename__ = 'idempotency_keys'
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    # no foreign key: the order may move to orders_archive
+    order_id = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, Integer, String, Float, ForeignKey, Index, func
+from sqlalchemy.orm import declared_attr, relationship
 from src.config.database import Base
+from datetime import datetime, timezone
 from enum import Enum
 
 class DeliveryStatus(str, Enum):
@@ -10,8 +11,12 @@ class DeliveryStatus(str, Enum):
 
 
 
-class Order(Base):
-    __tablename__ = 'orders'
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class OrderColumns:
+    """The columns an order keeps in the orders table and, once archived, in orders_archive"""
     id = Column(Integer, primary_key=True)
     size = Column(String, nullable=False)
     quantity = Column(Integer, nullable=False, default = 1)
@@ -20,5 +25,29 @@ class Order(Base):
     toppings = Column(Float)
     order_status = Column(String, default= DeliveryStatus.PENDING)
     user_id= Column(Integer, ForeignKey("users.id"), nullable = False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # set in Python so a flushed order always has them loaded, the server defaults cover other writers.
+    # onupdate is applied by ORM flushes and by update(Order) statements, bulk ones included, as long as
+    # they do not set updated_at themselves; raw SQL and writers outside the app must set it explicitly
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow, server_default=func.now())
+
+
+class Order(OrderColumns, Base):
+    __tablename__ = 'orders'
+
+    customer= relationship("User", back_populates="orders")
+
+    __table_args__ = (
+        # keyset pages and per-user lookups: WHERE user_id = ? AND id > ? ORDER BY id
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        # status filtered admin pages: WHERE order_status = ? AND id > ? ORDER BY id
+        Index("ix_orders_order_status_id", "order_status", "id"),
+        # archived orders keep their ids, so SQLite must never hand out the id of an archived order again
+        {"sqlite_autoincrement": True},
+    )
 
-    customer= relationship("User", back_populates="orders")
\ No newline at end of file
+    # bumped by the ORM on every UPDATE, exposed to clients as the ETag of the order
+    @declared_attr.directive
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
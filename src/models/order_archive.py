@@ -0,0 +1,19 @@
+from sqlalchemy import Column, DateTime, Index, Integer
+from sqlalchemy.orm import relationship
+from src.config.database import Base
+from src.models.order import OrderColumns, utcnow
+
+
+class OrderArchive(OrderColumns, Base):
+    """Delivered orders moved out of the orders table, read only, under their original ids"""
+    __tablename__ = 'orders_archive'
+    # the id the order had in the orders table, never generated here
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+    customer = relationship("User", viewonly=True)
+
+    __table_args__ = (
+        Index("ix_orders_archive_user_id_id", "user_id", "id"),
+        Index("ix_orders_archive_order_status_id", "order_status", "id"),
+    )
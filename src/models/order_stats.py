@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Float
+from src.config.database import Base
+
+
+class OrderStats(Base):
+    """Running order totals per (order_status, size, pizza_type), updated in the same transaction as the orders"""
+    __tablename__ = 'order_stats'
+    order_status = Column(String, primary_key=True)
+    size = Column(String, primary_key=True)
+    pizza_type = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from src.config.database import Base
+
+
+class RefreshTokenFamily(Base):
+    """The one live refresh token (jti) of a login session, shared by every worker"""
+    __tablename__ = 'refresh_token_families'
+    family = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    jti = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
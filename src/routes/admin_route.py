@@ -0,0 +1,263 @@
+from fastapi import APIRouter, Depends, Query, Request
+from typing import Optional
+from sqlalchemy.orm import Session
+from src.config.database import get_session, replica_reads, run_db
+from src.service.stats_service import OrderStatsService
+from src.service.async_stats_service import AsyncOrderStatsService
+from src.utils.pool_metrics import pool_metrics
+from src.utils.order_archiver import order_archiver
+from src.utils.role import role_required
+from src.utils.response import success_response, failure_response
+import logging
+
+admin_router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@admin_router.get(
+    path="/db/pool",
+    status_code=200,
+    summary="Get connection pool metrics",
+    description="This endpoint returns the live state of every database connection pool: in-use and idle connections, overflow, timeouts, the checkout wait-time histogram and the connection age histogram. Only admins can read it.",
+    responses={
+        200: {
+            "description": "Pool metrics retrieved successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Pool metrics retrieved successfully",
+                        "data": {
+                            "primary": {
+                                "name": "primary",
+                                "pool": {"size": 5, "in_use": 2, "idle": 3, "overflow": 0, "max_overflow": 10, "timeout": 30.0},
+                                "connects": 5,
+                                "overflow_connects": 0,
+                                "checkouts": 1200,
+                                "timeouts": 0,
+                                "invalidations": 0,
+                                "pings": 14,
+                                "ping_failures": 0,
+                                "checkout_wait_seconds": {"buckets": {"0.001": 1180, "+Inf": 1200}, "count": 1200, "sum": 0.84},
+                                "connection_age_seconds": {"buckets": {"60": 40, "+Inf": 1200}, "count": 1200, "sum": 91000.0}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can read pool metrics",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        }
+    }
+)
+def get_pool_metrics(current_user=Depends(role_required(["admin"]))):
+    """This endpoint reports connection pool usage for sizing the pool"""
+    return success_response(
+        status_code=200,
+        message="Pool metrics retrieved successfully",
+        data={name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+    )
+
+
+@admin_router.get(
+    path="/admission",
+    status_code=200,
+    summary="Get admission control metrics",
+    description="This endpoint returns the requests in flight and, per admission policy, how many requests were admitted and how many were shed and why: overloaded, concurrency, rate or client_rate. Only admins can read it.",
+    responses={
+        200: {
+            "description": "Admission metrics retrieved successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Admission metrics retrieved successfully",
+                        "data": {
+                            "in_flight": 12,
+                            "max_in_flight": 256,
+                            "policies": {
+                                "auth_login": {"priority": "low", "in_flight": 3, "admitted": 5400, "shed": {"client_rate": 310, "overloaded": 42}}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can read admission metrics",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        }
+    }
+)
+def get_admission_metrics(request: Request, current_user=Depends(role_required(["admin"]))):
+    """This endpoint reports how many requests the admission control shed"""
+    return success_response(
+        status_code=200,
+        message="Admission metrics retrieved successfully",
+        data=request.app.state.admission.stats()
+    )
+
+
+ORDER_STATS_EXAMPLE = {
+    "total": {"count": 3, "quantity": 5, "revenue": 71.6},
+    "by_order_status": {"pending": {"count": 2, "quantity": 3, "revenue": 48.2}, "delivered": {"count": 1, "quantity": 2, "revenue": 23.4}},
+    "by_size": {"small": {"count": 3, "quantity": 5, "revenue": 71.6}},
+    "by_pizza_type": {"cheese": {"count": 3, "quantity": 5, "revenue": 71.6}}
+}
+
+@admin_router.get(
+    path="/stats/orders",
+    status_code=200,
+    summary="Get order statistics",
+    description="This endpoint returns order counts, quantities and revenue in total and by order status, size and pizza type. It reads the order_stats summary, which every order write keeps up to date, so its cost does not grow with the number of orders. Only admins can read it.",
+    responses={
+        200: {
+            "description": "Order statistics retrieved successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Order statistics retrieved successfully",
+                        "data": ORDER_STATS_EXAMPLE
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can read order statistics",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        }
+    }
+)
+async def get_order_stats(db: Session = Depends(get_session), current_user=Depends(role_required(["admin"]))):
+    """This endpoint returns the order statistics of the admin dashboard"""
+    try:
+        with replica_reads(db):
+            stats = await run_db(OrderStatsService.get_stats, AsyncOrderStatsService.get_stats, db)
+        return success_response(status_code=200, message="Order statistics retrieved successfully", data=stats)
+    except Exception:
+        logger.exception("Reading the order statistics failed")
+        return failure_response(status_code=500, message="An unexpected error occurred")
+
+
+@admin_router.post(
+    path="/stats/orders/reconcile",
+    status_code=200,
+    summary="Rebuild order statistics",
+    description="This endpoint rebuilds the order_stats summary from the orders and orders_archive tables, for orders changed outside the API. It scans every order, archived ones included, so run it rarely. Only admins can rebuild the statistics.",
+    responses={
+        200: {
+            "description": "Order statistics rebuilt successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Order statistics rebuilt successfully",
+                        "data": ORDER_STATS_EXAMPLE
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can rebuild order statistics",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        }
+    }
+)
+async def reconcile_order_stats(db: Session = Depends(get_session), current_user=Depends(role_required(["admin"]))):
+    """This endpoint recomputes the order statistics from the orders"""
+    try:
+        stats = await run_db(OrderStatsService.reconcile, AsyncOrderStatsService.reconcile, db)
+        return success_response(status_code=200, message="Order statistics rebuilt successfully", data=stats)
+    except Exception:
+        logger.exception("Rebuilding the order statistics failed")
+        return failure_response(status_code=500, message="An unexpected error occurred")
+
+
+@admin_router.post(
+    path="/orders/archive",
+    status_code=200,
+    summary="Archive delivered orders",
+    description="This endpoint moves the delivered orders not changed for older_than_days days, ORDER_ARCHIVE_AFTER_DAYS by default, from the orders table to orders_archive, in batches of ORDER_ARCHIVE_BATCH_SIZE. The archiver runs on its own every ORDER_ARCHIVE_INTERVAL seconds when ORDER_ARCHIVE_AFTER_DAYS is set; this runs it now. Archived orders are only read when a request passes include_archived=true and can no longer be changed or deleted. Only admins can archive orders.",
+    responses={
+        200: {
+            "description": "Delivered orders archived successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Delivered orders archived successfully",
+                        "data": {
+                            "archived": 1250,
+                            "archiver": {"enabled": True, "after_days": 30.0, "interval": 3600.0, "runs": 5, "failures": 0, "archived": 4100, "last_run": "2026-10-18T12:00:00+00:00"}
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Bad Request - No age given and ORDER_ARCHIVE_AFTER_DAYS is not set",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "failure",
+                        "message": "Pass older_than_days or set ORDER_ARCHIVE_AFTER_DAYS"
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can archive orders",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        }
+    }
+)
+async def archive_orders(
+    older_than_days: Optional[float] = Query(default=None, gt=0, description="archive delivered orders not changed for this many days"),
+    current_user=Depends(role_required(["admin"]))
+):
+    """This endpoint archives the delivered orders now instead of at the archiver's next run"""
+    if older_than_days is None and not order_archiver.enabled:
+        return failure_response(status_code=400, message="Pass older_than_days or set ORDER_ARCHIVE_AFTER_DAYS")
+    try:
+        archived = await order_archiver.run_once(older_than_days)
+        return success_response(
+            status_code=200,
+            message="Delivered orders archived successfully",
+            data={"archived": archived, "archiver": order_archiver.stats()}
+        )
+    except Exception:
+        logger.exception("Archiving delivered orders failed")
+        return failure_response(status_code=500, message="An unexpected error occurred")
@@ -1,12 +1,16 @@
 from src.service.auth_service import AuthService
-from fastapi import APIRouter, Depends
+from src.service.async_auth_service import AsyncAuthService
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from src.config.database import get_db
+from src.config.database import get_session, run_db
 from src.utils.response import success_response, failure_response
-from src.schema.user_schemas import SignUpRequest
-from src.schema.login_schema import loginRequest, loginResponse
+from src.schema.user_schemas import SignUpRequest, UserImportRequest
+from src.utils.role import role_required
+from src.schema.login_schema import loginRequest, loginResponse, refreshRequest
+import logging
 
 auth_router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 
@@ -62,11 +66,11 @@ auth_router = APIRouter()
     }
     )
 
-def sign_up(user_data: SignUpRequest, db: Session = Depends(get_db)):
+async def sign_up(user_data: SignUpRequest, db: Session = Depends(get_session)):
     """Endpoint to register a new user"""
 
     try:
-        new_user = AuthService.create_user(db, user_data)
+        new_user = await run_db(AuthService.create_user, AsyncAuthService.create_user, db, user_data)
         user_response = {
             "id": new_user.id,
             "username": new_user.username,
@@ -80,8 +84,14 @@ def sign_up(user_data: SignUpRequest, db: Session = Depends(get_db)):
             data=user_response
         )
 
-    except Exception as e:
-        print(str(e))
+    except HTTPException as e:
+        return failure_response(
+            status_code=e.status_code,
+            message=e.detail,
+            headers=e.headers
+        )
+    except Exception:
+        logger.exception("Sign up failed")
         return failure_response(
             status_code=500,
             message="An unexpected error occurred. Please try again"
@@ -138,18 +148,192 @@ def sign_up(user_data: SignUpRequest, db: Session = Depends(get_db)):
         }
     }
     )
-def login_user(user_data: loginRequest, db:Session=Depends(get_db)):
+async def login_user(user_data: loginRequest, db:Session=Depends(get_session)):
     """Endpoint for generating access and refresh tokensr"""
     try:
-        login = AuthService.login(db, user_data)
+        login = await run_db(AuthService.login, AsyncAuthService.login, db, user_data)
         return success_response(
             status_code=200,
             message="User login successfully",
             data= {"data":login.dict()}
         )
-    except Exception as e:
-        print(str(e))
+    except HTTPException as e:
+        return failure_response(
+            status_code=e.status_code,
+            message=e.detail,
+            headers=e.headers
+        )
+    except Exception:
+        logger.exception("Login failed")
+        return failure_response(
+            status_code=500,
+            message="An unexpected error occurred. Please try again"
+        )
+
+
+@auth_router.post(
+    path="/refresh",
+    response_model=dict,
+    status_code=200,
+    summary="Refresh an access token",
+    description="This endpoint exchanges a refresh token for a new access token and a rotated refresh token. The new tokens carry the user's current role, and a deleted or deactivated user cannot refresh.",
+    responses={
+        200: {
+            "description": "Tokens refreshed successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Token refreshed successfully",
+                        "data": {
+                            "data": {
+                                "email": "zikabereyi@gmail.com",
+                                "role": "user",
+                                "access_token": "djghjlmjhgfdsdfghuytr",
+                                "refresh_token": "fghjytfdfvbnjuytfvbnmkuyt",
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Refresh token is invalid, expired or was already used",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "failure",
+                        "message": "Refresh token has been revoked",
+                        "data": {}
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - The user account is inactive",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "failure",
+                        "message": "User account is inactive",
+                        "data": {}
+                    }
+                }
+            }
+        },
+        500: {
+            "description": "Internal Server Error",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "failure",
+                        "message": "An unexpected error occured. Please try again later.",
+                        "data": {}
+                    }
+                }
+            }
+        }
+    }
+    )
+async def refresh_tokens(refresh_detail: refreshRequest, db: Session = Depends(get_session)):
+    """Endpoint for renewing access and refresh tokens without logging in again"""
+    try:
+        tokens = await run_db(AuthService.renew_tokens, AsyncAuthService.renew_tokens, db, refresh_detail)
+        return success_response(
+            status_code=200,
+            message="Token refreshed successfully",
+            data= {"data":tokens.dict()}
+        )
+    except HTTPException as e:
+        return failure_response(
+            status_code=e.status_code,
+            message=e.detail,
+            headers=e.headers
+        )
+    except Exception:
+        logger.exception("Token refresh failed")
+        return failure_response(
+            status_code=500,
+            message="An unexpected error occurred. Please try again"
+        )
+
+
+@auth_router.post(
+    path="/users/import",
+    response_model=dict,
+    status_code=201,
+    summary="Bulk import users",
+    description="This endpoint lets an admin register many users at once, up to USER_IMPORT_MAX per request. Users whose email or username already exists are skipped. The passwords are hashed a few at a time, so logins keep being served while an import runs.",
+    responses={
+        201: {
+            "description": "Users imported successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "success",
+                        "message": "Users imported successfully",
+                        "data": {
+                            "created": 2,
+                            "skipped": ["zikabereyi@gmail.com"]
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Bad Request - Too many users in one import",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "failure",
+                        "message": "An import can contain at most 1000 users",
+                        "data": {}
+                    }
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can import users",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        },
+        503: {
+            "description": "Service Unavailable - Password hashing is saturated",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "failure",
+                        "message": "Authentication service is busy. Please try again shortly.",
+                        "data": {}
+                    }
+                }
+            }
+        }
+    }
+    )
+async def import_users(import_data: UserImportRequest, db: Session = Depends(get_session), current_user = Depends(role_required(["admin"]))):
+    """Endpoint to register users in bulk"""
+    try:
+        result = await run_db(AuthService.import_users, AsyncAuthService.import_users, db, import_data.users)
+        return success_response(
+            status_code=201,
+            message="Users imported successfully",
+            data=result
+        )
+    except HTTPException as e:
+        return failure_response(
+            status_code=e.status_code,
+            message=e.detail,
+            headers=e.headers
+        )
+    except Exception:
+        logger.exception("User import failed")
         return failure_response(
             status_code=500,
             message="An unexpected error occurred. Please try again"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Request, Response
+from src.utils.etag import etag_matches
+from src.utils.menu_catalog import get_catalog
+
+menu_router = APIRouter()
+
+
+@menu_router.get(
+    path="/menu",
+    status_code=200,
+    summary="Get the menu",
+    description="This endpoint returns the current menu. It answers If-None-Match with 304 when the menu has not changed.",
+    responses={
+        200: {
+            "description": "Menu retrieved successfully",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "small": {
+                            "cheese": 11.7,
+                            "peperoni": 17.2,
+                            "toppings": 2.0
+                        }
+                    }
+                }
+            }
+        },
+        304: {
+            "description": "Not Modified - The menu matches the ETag sent by the client"
+        }
+    }
+)
+def get_menu(request: Request) -> Response:
+    """This endpoint returns the menu from its pre-serialized bytes"""
+    catalog = get_catalog()
+    headers = {"ETag": catalog.etag, "Cache-Control": "public, max-age=60, stale-while-revalidate=300"}
+    if etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from src.config.config import settings
+from src.utils.group_commit import order_group_commit
+from src.utils.idempotency import order_idempotency
+from src.utils.order_archiver import order_archiver
+from src.utils.order_versions import order_versions
+from src.utils.pool_metrics import render_pool_metrics
+from src.utils.password_pool import password_pool
+from src.utils.principal_cache import principal_cache
+from src.utils.refresh_store import refresh_store
+from src.utils.token_cache import token_cache
+from typing import Optional
+import hmac
+
+metrics_router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+metrics_bearer = HTTPBearer(auto_error=False)
+
+
+def require_metrics_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(metrics_bearer)) -> None:
+    """Admits the scraper holding METRICS_TOKEN; without a configured token the endpoint does not exist"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@metrics_router.get(
+    path="/metrics",
+    status_code=200,
+    summary="Prometheus metrics",
+    description="This endpoint returns the request latency, status code and SQL statement metrics per route, the connection pool, admission control, order group commit, order archiver, principal cache, token cache, order version cache, order idempotency, password pool and refresh token reuse metrics in the Prometheus text format, for a Prometheus server to scrape. It is only served when METRICS_TOKEN is set, to requests sending it as a bearer token.",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_metrics_token)],
+    responses={
+        200: {
+            "description": "Metrics in the Prometheus text format",
+            "content": {
+                "text/plain": {
+                    "example": "# HELP http_request_sql_statements SQL statements run per request by route.\n# TYPE http_request_sql_statements histogram\nhttp_request_sql_statements_bucket{method=\"GET\",route=\"/api/v1/order/orders\",le=\"2\"} 118\n"
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Invalid or missing metrics token",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Invalid or missing metrics token"
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Not Found - METRICS_TOKEN is not set, so metrics are not served",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Not Found"
+                    }
+                }
+            }
+        }
+    }
+)
+def get_metrics(request: Request):
+    """This endpoint exposes the metrics of this worker process"""
+    lines = []
+    if getattr(request.app.state, "request_metrics", None) is not None:
+        lines += request.app.state.request_metrics.render()
+    lines += render_pool_metrics()
+    lines += request.app.state.admission.render()
+    lines += order_group_commit.render("order_group_commit")
+    lines += order_archiver.render("order_archiver")
+    lines += principal_cache.render("principal_cache")
+    lines += token_cache.render("token_cache")
+    lines += order_versions.render("order_version_cache")
+    lines += order_idempotency.render("order_idempotency")
+    lines += password_pool.render("password_pool")
+    lines += refresh_store.render("refresh_tokens")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,18 +1,64 @@
 from src.service.order_service import OrderService
-from src.schema.order_schema import OrderRequest, OrderResponse, UpdateOrderStatusRequest
+from src.service.async_order_service import AsyncOrderService
+from src.models.order_archive import OrderArchive
+from src.schema.order_schema import OrderRequest, BatchOrderRequest, OrderResponse, OrderPage, UpdateOrderStatusRequest
 from src.utils.role import role_required, get_current_user
-from src.config.database import get_db
-from fastapi import APIRouter, Depends, HTTPException
+from src.config.database import get_session, replica_reads, run_db, release_db
+from src.config.config import settings
+from src.utils.order_events import ALL_ORDERS, order_events
+from src.utils.order_versions import order_etag, order_versions
+from src.utils.etag import etag_matches
+from src.utils.idempotency import order_idempotency, request_fingerprint
+from src.utils.group_commit import order_group_commit
+from src.utils.recent_writes import recent_writes
+from src.utils.serialization import ORDER_LIST, ORDER_PAGE, ORDER_WITH_CUSTOMER, ORDER_WITH_CUSTOMER_PAGE, model_response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
 from sqlalchemy.orm import Session
+import asyncio
+import json
 
 order_router = APIRouter()
 
+
+async def conditional_order(load_order, load_order_async, order_id: int, request: Request, response: Response, db: Session, current_user, include_customer: bool = False, include_archived: bool = False):
+    """Answers If-None-Match from the order version cache, loading the order only when it may have changed"""
+    if_none_match = request.headers.get("if-none-match")
+    headers = {"Cache-Control": "private, no-cache"}
+    # customers are never edited through the API, so the order version also versions the expanded order
+    variant = "customer" if include_customer else ""
+    if if_none_match:
+        cached = order_versions.get(order_id)
+        if cached is not None and cached[0] == current_user.id:
+            etag = order_etag(order_id, cached[1], variant)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    options = {}
+    if include_customer:
+        options["include_customer"] = True
+    if include_archived:
+        options["include_archived"] = True
+    with replica_reads(db):
+        order = await run_db(load_order, load_order_async, db, order_id, current_user, **options)
+    # the cache answers reads that ignore the archive, so an archived order must not enter it
+    if not isinstance(order, OrderArchive):
+        order_versions.put(order.id, order.user_id, order.version)
+    etag = order_etag(order.id, order.version, variant)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    if include_customer:
+        return model_response(ORDER_WITH_CUSTOMER, order, headers={**headers, "ETag": etag})
+    response.headers.update({**headers, "ETag": etag})
+    return order
+
 @order_router.post(
     path="/order",
     response_model=OrderResponse,
     status_code=201,
     summary="create a new order",
-    description="This endpoint create a new order",
+    description="This endpoint create a new order. Send an Idempotency-Key header to make retries safe: a retry with the same key within IDEMPOTENCY_KEY_TTL returns the order created by the first attempt, with an Idempotent-Replayed header, instead of creating another one.",
     responses={
         201: {
             "description": "Order created successfully",
@@ -51,24 +97,134 @@ order_router = APIRouter()
                     }
                 }
             }
+        },
+        409: {
+            "description": "Conflict - The order created with this Idempotency-Key was deleted",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "The order created with this Idempotency-Key was deleted"
+                    }
+                }
+            }
+        },
+        422: {
+            "description": "Unprocessable Entity - The Idempotency-Key was already used with a different order",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Idempotency-Key was already used with a different request"
+                    }
+                }
+            }
         }
     }   
 )
-def create_order(
+async def create_order(
     order_request : OrderRequest,
-    db: Session= Depends(get_db),
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: Session= Depends(get_session),
     current_user = Depends(role_required(["user"]))
     ) -> OrderResponse:
-    """It endpoint creates a new order for the user"""
-    order = OrderService.create_order(db, order_request, current_user)
+    """It endpoint creates a new order for the user, once per Idempotency-Key"""
+    if idempotency_key is None:
+        if settings.ORDER_GROUP_COMMIT:
+            # the order is written in a shared transaction with the orders of concurrent requests
+            order = await order_group_commit.submit(OrderService.order_row(order_request, current_user))
+            # the batch committed on a session of its own, outside this request
+            recent_writes.mark()
+        else:
+            order = await run_db(OrderService.create_order, AsyncOrderService.create_order, db, order_request, current_user)
+        return OrderResponse.model_validate(order)
+
+    fingerprint = request_fingerprint(order_request.model_dump_json())
+
+    async def create():
+        # the key is stored in the order's own transaction, so keyed orders skip the group commit
+        order, replayed = await run_db(
+            OrderService.create_order_once, AsyncOrderService.create_order_once, db, order_request, current_user, idempotency_key, fingerprint
+        )
+        return OrderResponse.model_validate(order), replayed
+
+    order, replayed = await order_idempotency.run(current_user.id, idempotency_key, fingerprint, create)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     return order
 
+@order_router.post(
+    path="/orders/batch",
+    response_model=list[OrderResponse],
+    status_code=201,
+    summary="create several orders at once",
+    description="This endpoint creates several orders in one transaction. If any order is invalid, none of them is created.",
+    responses={
+        201: {
+            "description": "Orders created successfully",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "id": 1,
+                            "size": "small",
+                            "quantity": 2,
+                            "price": 23.4,
+                            "pizza_type": "cheese",
+                            "toppings": 0,
+                            "order_status": "pending",
+                            "user_id": 345
+                        },
+                        {
+                            "id": 2,
+                            "size": "small",
+                            "quantity": 1,
+                            "price": 15.5,
+                            "pizza_type": "meat",
+                            "toppings": 0,
+                            "order_status": "pending",
+                            "user_id": 345
+                        }
+                    ]
+                }
+            }
+        },
+        400:{
+            "description": "Bad Request - Invalid order details",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Order 1: Invalid pizza size"
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Invalid or missing token",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Authorization token is missing"
+                    }
+                }
+            }
+        }
+    }
+)
+async def create_orders(
+    batch_request : BatchOrderRequest,
+    db: Session= Depends(get_session),
+    current_user = Depends(role_required(["user"]))
+    ) -> list[OrderResponse]:
+    """This endpoint creates several orders for the user at once"""
+    orders = await run_db(OrderService.create_orders, AsyncOrderService.create_orders, db, batch_request.orders, current_user)
+    return model_response(ORDER_LIST, orders, status_code=201)
+
 @order_router.get(
     path= "/order/{order_id}",
     response_model = OrderResponse,
     status_code=200,
     summary= "Get order by ID",
-    description = "This endpoint retrieves an order by its id for the current user",
+    description = "This endpoint retrieves an order by its id for the current user. Pass include=customer to add the customer's id, username, email and phone number to the order. Delivered orders are moved to the archive after a while; pass include_archived=true to also look the order up there.",
     responses = {
         200: {
             "description": "Order retrived successfully",
@@ -85,6 +241,9 @@ def create_order(
                     }
                 }
             }
+        },
+        304: {
+            "description": "Not Modified - The order matches the ETag sent in If-None-Match"
         },
          401: {
             "description": "Unauthorized - Invalid or missing token",
@@ -118,48 +277,66 @@ def create_order(
         }
     }
 )
-def get_order_by_id(
+async def get_order_by_id(
     order_id:int,
-    db: Session=Depends(get_db),
+    request: Request,
+    response: Response,
+    include: Optional[Literal["customer"]] = Query(default=None, description="customer adds the customer of the order, loaded in the same query"),
+    include_archived: bool = Query(default=False, description="true also looks the order up in the archive of delivered orders"),
+    db: Session=Depends(get_session),
     current_user= Depends(role_required(["user"]))
 ) -> OrderResponse:
     """This endpoint retrieves an order by its id for the current user"""
-    order = OrderService.get_order_by_id(db, order_id, current_user)
-    return order
+    return await conditional_order(
+        OrderService.get_order_by_id, AsyncOrderService.get_order_by_id, order_id, request, response, db, current_user,
+        include_customer=include == "customer", include_archived=include_archived
+    )
     
 
 @order_router.get(
     "/orders",
-    response_model= list[OrderResponse],
+    response_model= OrderPage,
     status_code=200,
     summary="Get all orders",
-    description="This endpoint retrieves all orders. Admins can see all orders, users can see their own orders only.",
+    description="This endpoint retrieves orders one page at a time. Admins can see all orders, users can see their own orders only. Pass the returned next_cursor to fetch the following page. Pass include=customer to add each order's customer; the customers of a page are loaded in one extra query, however long the page is. Delivered orders are moved to the archive after a while; pass include_archived=true to page through archived orders too, at the cost of a second query per page.",
     responses={
         200: {
             "description": "Order retrieved successfully",
             "content": {
                 "application/json": {
-                    "example": [
-                        {
-                            "id": 1,
-                            "size": "medium",
-                            "quantity": 4,
-                            "price": 65,
-                            "pizza_type": "pepperoni",
-                            "toppings": "extra cheese",
-                            "order_status": "in-transit"
-                        },
-                        {
-                            "id": 3,
-                            "size": "medium",
-                            "quantity": 4,
-                            "price": 65,
-                                                        "price": 65,
-                            "pizza_type": "pepperoni",
-                            "toppings": "extra cheese",
-                            "order_status": "in-transit"
-                        }
-                    ]
+                    "example": {
+                        "items": [
+                            {
+                                "id": 1,
+                                "size": "medium",
+                                "quantity": 4,
+                                "price": 65,
+                                "pizza_type": "pepperoni",
+                                "toppings": "extra cheese",
+                                "order_status": "in-transit"
+                            },
+                            {
+                                "id": 3,
+                                "size": "medium",
+                                "quantity": 4,
+                                "price": 65,
+                                "pizza_type": "pepperoni",
+                                "toppings": "extra cheese",
+                                "order_status": "in-transit"
+                            }
+                        ],
+                        "next_cursor": "eyJpZCI6M30"
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Bad Request - Invalid cursor",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Invalid cursor"
+                    }
                 }
             }
         },
@@ -185,10 +362,134 @@ def get_order_by_id(
     }
 }
 )
-def get_all_orders(db: Session = Depends(get_db), current_user = Depends(role_required(["admin", "user"]))) -> list[OrderResponse]:
-    """This endpoint retrieves all orders. Admins can see all orders, users can see their own orders only."""
-    orders = OrderService.get_all_orders(db, current_user)
-    return orders
+async def get_all_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=settings.ORDER_PAGE_SIZE, ge=1, le=settings.ORDER_PAGE_SIZE_MAX),
+    order_status: Optional[str] = None,
+    size: Optional[str] = None,
+    pizza_type: Optional[str] = None,
+    user_id: Optional[int] = None,
+    include: Optional[Literal["customer"]] = Query(default=None, description="customer adds the customer of each order"),
+    include_archived: bool = Query(default=False, description="true also lists archived orders, merged in id order"),
+    db: Session = Depends(get_session),
+    current_user = Depends(role_required(["admin", "user"]))
+) -> OrderPage:
+    """This endpoint retrieves a page of orders. Admins can see all orders, users can see their own orders only."""
+    with replica_reads(db):
+        orders = await run_db(
+            OrderService.get_all_orders,
+            AsyncOrderService.get_all_orders,
+            db,
+            current_user,
+            cursor=cursor,
+            limit=limit,
+            order_status=order_status,
+            size=size,
+            pizza_type=pizza_type,
+            user_id=user_id,
+            include_customer=include == "customer",
+            include_archived=include_archived
+        )
+    return model_response(ORDER_WITH_CUSTOMER_PAGE if include == "customer" else ORDER_PAGE, orders)
+
+@order_router.get(
+    "/orders/export",
+    status_code=200,
+    summary="Export all orders",
+    description="This endpoint streams every order as NDJSON or CSV. Only admins can export orders. Delivered orders are moved to the archive after a while; pass include_archived=true to export archived orders too, in id order with the others.",
+    responses={
+        200: {
+            "description": "Orders streamed successfully",
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"id": 1, "size": "medium", "quantity": 4, "price": 65, "pizza_type": "pepperoni", "toppings": 1.0, "order_status": "pending", "user_id": 345}\n'
+                },
+                "text/csv": {
+                    "example": "id,size,quantity,price,pizza_type,toppings,order_status,user_id\r\n1,medium,4,65,pepperoni,1.0,pending,345\r\n"
+                }
+            }
+        },
+        403: {
+            "description": "Forbidden - Only admins can export orders",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "You do not have permission to access this resource"
+                    }
+                }
+            }
+        }
+    }
+)
+def export_orders(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    order_status: Optional[str] = None,
+    include_archived: bool = Query(default=False, description="true also exports archived orders, merged in id order"),
+    current_user=Depends(role_required(["admin"]))
+) -> StreamingResponse:
+    """This endpoint streams every order for reconciliation"""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        OrderService.export_orders(format, order_status, include_archived),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
+
+@order_router.get(
+    "/orders/events",
+    status_code=200,
+    summary="Subscribe to order status changes",
+    description="This endpoint streams order status changes as Server-Sent Events. Users receive events for their own orders, admins for every order.",
+    responses={
+        200: {
+            "description": "Event stream opened",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: order_status\ndata: {"order_id": 1, "user_id": 345, "order_status": "is_delivering"}\n\n'
+                }
+            }
+        },
+        401: {
+            "description": "Unauthorized - Invalid or missing token",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Authorization token is missing"
+                    }
+                }
+            }
+        }
+    }
+)
+async def order_events_stream(
+    request: Request,
+    db: Session = Depends(get_session),
+    current_user=Depends(role_required(["user", "admin"]))
+) -> StreamingResponse:
+    """This endpoint pushes order status changes to the client instead of having it poll"""
+    # the stream can stay open for hours, give the connection used for authentication back to the pool
+    await release_db(db)
+    key = ALL_ORDERS if current_user.role == "admin" else current_user.id
+
+    async def stream():
+        subscription = order_events.subscribe(key)
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=float(settings.ORDER_EVENTS_KEEPALIVE))
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event.get('event', 'order_status')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            order_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @order_router.patch(
     "/orders/{order_id}/status",
@@ -232,17 +533,27 @@ def get_all_orders(db: Session = Depends(get_db), current_user = Depends(role_re
                     }
                 }
             }
+        },
+        409: {
+            "description": "Conflict - The order was changed by another request while this one updated it",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Order was changed by another request. Please retry."
+                    }
+                }
+            }
         }
     }
 )
-def update_order_status(
+async def update_order_status(
     order_id: int,
     new_status: UpdateOrderStatusRequest,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
     current_user=Depends(role_required(["admin"]))
 ) -> OrderResponse:
     """This endpoint updates the status of an order by its id"""
-    order = OrderService.update_order_status(db, order_id, new_status, current_user)
+    order = await run_db(OrderService.update_order_status, AsyncOrderService.update_order_status, db, order_id, new_status, current_user)
     return order
 
 @order_router.get(
@@ -250,7 +561,7 @@ def update_order_status(
     response_model=OrderResponse,
     status_code=200,
     summary="Get order status",
-    description="This endpoint retrieves the status of an order by its id for the current user.",
+    description="This endpoint retrieves the status of an order by its id for the current user. Pass include_archived=true to also look the order up in the archive of delivered orders.",
     responses={
         200: {
             "description": "Order status retrieved successfully",
@@ -262,6 +573,9 @@ def update_order_status(
                 }
             }
         },
+        304: {
+            "description": "Not Modified - The order matches the ETag sent in If-None-Match"
+        },
         401: {
             "description": "Unauthorized - Invalid or missing token",
             "content": {
@@ -294,14 +608,18 @@ def update_order_status(
         }
     }
 )
-def get_order_status(
+async def get_order_status(
     order_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    include_archived: bool = Query(default=False, description="true also looks the order up in the archive of delivered orders"),
+    db: Session = Depends(get_session),
     current_user=Depends(role_required(["user", "admin"]))
 ):
     """This endpoint retrieves the status of an order by its id"""
-    status = OrderService.get_order_status(db, order_id, current_user)
-    return status
+    return await conditional_order(
+        OrderService.get_order_status, AsyncOrderService.get_order_status, order_id, request, response, db, current_user, include_archived=include_archived
+    )
 
 @order_router.delete(
     path="/order/{order_id}",
@@ -341,14 +659,16 @@ def get_order_status(
         }
     }
 )
-def delete_order(
+async def delete_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
     current_user = Depends(role_required(["user"]))
 ):
     """This endpoint deletes an order for the authenticated user"""
-    return OrderService.delete_order(
-        db=db,
+    return await run_db(
+        OrderService.delete_order,
+        AsyncOrderService.delete_order,
+        db,
         order_id=order_id,
         current_user=current_user
     )
@@ -10,4 +10,8 @@ class loginResponse(BaseModel):
     email: EmailStr
     role: Literal["user", "admin"]
     access_token: str
-    refresh_token: str
\ No newline at end of file
+    refresh_token: str
+
+
+class refreshRequest(BaseModel):
+    refresh_token: str = Field()
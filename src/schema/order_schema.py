@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from datetime import datetime, timezone
+from typing import Optional
 
 
 class OrderRequest(BaseModel):
@@ -8,7 +10,13 @@ class OrderRequest(BaseModel):
     toppings: float
 
 
+class BatchOrderRequest(BaseModel):
+    orders: list[OrderRequest] = Field(..., min_length=1)
+
+
 class OrderResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     size: str
     quantity: int
@@ -16,10 +24,34 @@ class OrderResponse(BaseModel):
     pizza_type: str
     toppings: float
     order_status: str
-    user_id:str
+    user_id:int
+    created_at: datetime
+    updated_at: datetime
+
+    @field_validator("created_at", "updated_at")
+    @classmethod
+    def as_utc(cls, value: datetime) -> datetime:
+        # SQLite hands the UTC timestamps back without their timezone
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+class CustomerResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    email: str
+    phone_no: str
+
+class OrderWithCustomerResponse(OrderResponse):
+    customer: CustomerResponse
+
+class OrderPage(BaseModel):
+    items: list[OrderResponse]
+    next_cursor: Optional[str] = None
 
-    class Config():
-        orm_mode =True
+class OrderWithCustomerPage(BaseModel):
+    items: list[OrderWithCustomerResponse]
+    next_cursor: Optional[str] = None
 
 class UpdateOrderStatusRequest(BaseModel):
     new_status: str
\ No newline at end of file
@@ -5,4 +5,8 @@ class SignUpRequest(BaseModel):
     email: EmailStr =Field()
     phone: str= Field(...,min_lenght=10, max_lenght=15)
     password: str= Field(..., min_lenght=6)
-    role: str= Field(default='user')
\ No newline at end of file
+    role: str= Field(default='user')
+
+
+class UserImportRequest(BaseModel):
+    users: list[SignUpRequest] = Field(..., min_length=1)
@@ -0,0 +1,78 @@
+from src.models.order import Order, DeliveryStatus, utcnow
+from src.models.order_archive import OrderArchive
+from src.utils.order_events import order_events
+from sqlalchemy import DateTime, Select, delete, insert, literal, select
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Iterable
+
+
+ARCHIVED_COLUMNS = [column.name for column in Order.__table__.columns]
+
+
+class OrderArchiveService:
+    """Moves delivered orders out of the orders table into orders_archive.
+
+    The orders table keeps only the orders that can still change, so its
+    indexes and keyset pages stay small however many orders were ever
+    delivered. An order is archived under its own id and left out of every
+    read unless the caller asks for archived orders, and it can no longer
+    be updated or deleted. The order_stats summary keeps counting archived
+    orders, see OrderStatsService.rebuild_statements.
+    """
+
+    @staticmethod
+    def cutoff(older_than_days: float) -> datetime:
+        return utcnow() - timedelta(days=older_than_days)
+
+    @staticmethod
+    def batch_statement(cutoff: datetime, batch_size: int) -> Select:
+        """selects the next batch of delivered orders last changed before `cutoff`"""
+        # skip_locked leaves orders being updated right now to the next run, and lets two archivers share the work
+        return (
+            select(Order.id, Order.user_id)
+            .where(Order.order_status == DeliveryStatus.DELIVERED.value, Order.updated_at < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+
+    @staticmethod
+    def move_statements(order_ids: list[int], archived_at: datetime) -> tuple:
+        """copies the orders to the archive and deletes them, run both in one transaction"""
+        copied = select(
+            *(Order.__table__.c[column] for column in ARCHIVED_COLUMNS),
+            literal(archived_at, DateTime(timezone=True)),
+        ).where(Order.id.in_(order_ids))
+        return (
+            insert(OrderArchive).from_select([*ARCHIVED_COLUMNS, "archived_at"], copied),
+            delete(Order).where(Order.id.in_(order_ids)),
+        )
+
+    @staticmethod
+    def archived_events(rows: Iterable) -> list[dict]:
+        # without a version, the event also drops the order from the ETag cache
+        return [{"event": "order_archived", "order_id": order_id, "user_id": user_id} for order_id, user_id in rows]
+
+    @staticmethod
+    def archive_delivered(db: Session, older_than_days: float, batch_size: int = 1000) -> int:
+        """Archives the delivered orders not changed for `older_than_days` days, one transaction per batch, and returns how many"""
+        cutoff = OrderArchiveService.cutoff(older_than_days)
+        archived = 0
+        while True:
+            try:
+                rows = db.execute(OrderArchiveService.batch_statement(cutoff, batch_size)).all()
+                events = OrderArchiveService.archived_events(rows)
+                if rows:
+                    for statement in OrderArchiveService.move_statements([row.id for row in rows], utcnow()):
+                        db.execute(statement)
+                    for statement in order_events.publish_statements(events):
+                        db.execute(statement)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            order_events.publish_committed(events)
+            archived += len(rows)
+            if len(rows) < batch_size:
+                return archived
@@ -0,0 +1,32 @@
+from src.service.archive_service import OrderArchiveService
+from src.models.order import utcnow
+from src.utils.order_events import order_events
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+
+class AsyncOrderArchiveService:
+    """AsyncSession counterpart of OrderArchiveService, used when DATABASE_ASYNC is enabled"""
+
+    @staticmethod
+    async def archive_delivered(db: AsyncSession, older_than_days: float, batch_size: int = 1000) -> int:
+        """Archives the delivered orders not changed for `older_than_days` days, one transaction per batch, and returns how many"""
+        cutoff = OrderArchiveService.cutoff(older_than_days)
+        archived = 0
+        while True:
+            try:
+                rows = (await db.execute(OrderArchiveService.batch_statement(cutoff, batch_size))).all()
+                events = OrderArchiveService.archived_events(rows)
+                if rows:
+                    for statement in OrderArchiveService.move_statements([row.id for row in rows], utcnow()):
+                        await db.execute(statement)
+                    for statement in order_events.publish_statements(events):
+                        await db.execute(statement)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            await run_in_threadpool(order_events.publish_committed, events)
+            archived += len(rows)
+            if len(rows) < batch_size:
+                return archived
@@ -0,0 +1,86 @@
+from src.models.user import User
+from src.schema.user_schemas import SignUpRequest
+from src.schema.login_schema import loginRequest, loginResponse, refreshRequest
+from src.service.auth_service import AuthService
+from src.config.config import settings
+from src.utils.password_pool import password_pool
+from src.utils.refresh_store import refresh_store
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAuthService:
+    """AsyncSession counterpart of AuthService, used when DATABASE_ASYNC is enabled"""
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: SignUpRequest) -> User:
+        """Register a new user in the database"""
+        password_hash = await password_pool.hash_async(user_data.password)
+
+        try:
+            new_user = (await db.scalars(AuthService.signup_statement(user_data, password_hash))).one()
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail =AuthService._conflict_detail(e))
+        return new_user
+
+    @staticmethod
+    async def import_users(db: AsyncSession, users: list[SignUpRequest]) -> dict:
+        """Register many users at once, skipping those whose email or username already exists"""
+        AuthService.check_import_size(users)
+        hashes = await password_pool.hash_many_async([user.password for user in users])
+        rows = AuthService.import_rows(users, hashes)
+
+        created = []
+        batch_size = int(settings.USER_IMPORT_BATCH_SIZE)
+        try:
+            for start in range(0, len(rows), batch_size):
+                statement = AuthService._insert_ignoring_duplicates(db).values(rows[start:start + batch_size]).returning(User.email)
+                created.extend((await db.execute(statement)).scalars())
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail =AuthService._conflict_detail(e))
+        return AuthService.import_summary(rows, created)
+
+    @staticmethod
+    async def login(db: AsyncSession, login_detail: loginRequest) -> loginResponse:
+        """Login a user and return token"""
+        try:
+            user = (await db.scalars(select(User).where(User.email == login_detail.email))).first()
+            if not user:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            # bcrypt takes a while; give the connection back to the pool instead of holding it idle meanwhile
+            db.expunge(user)
+            await db.rollback()
+            if not await password_pool.verify_async(login_detail.password, user.password):
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+            family, jti = await refresh_store.start_async(db, user.id, ttl=AuthService.refresh_ttl())
+            return AuthService.login_response(user, family, jti)
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Login failed")
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail= "internal server error")
+
+    @staticmethod
+    async def renew_tokens(db: AsyncSession, refresh_detail: refreshRequest) -> loginResponse:
+        """Exchange a refresh token for a new access token and a rotated refresh token"""
+        payload = AuthService.refresh_claims(refresh_detail.refresh_token)
+        user = (await db.scalars(select(User).where(User.id == payload["id"]))).first()
+        try:
+            AuthService.check_refreshable(user)
+        except HTTPException:
+            await refresh_store.revoke_async(db, payload["fam"])
+            raise
+
+        new_jti = await refresh_store.rotate_async(db, payload["fam"], payload["jti"], ttl=AuthService.refresh_ttl())
+        if new_jti is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token has been revoked")
+        return AuthService.login_response(user, payload["fam"], new_jti)
@@ -0,0 +1,182 @@
+from src.models.order import Order, DeliveryStatus
+from src.models.order_archive import OrderArchive
+from src.schema.order_schema import OrderRequest, OrderResponse, OrderPage, UpdateOrderStatusRequest
+from src.service.order_service import OrderService
+from src.service.async_stats_service import AsyncOrderStatsService
+from src.utils.order_events import order_events
+from src.utils.idempotency import order_idempotency
+from src.config.database import get_async_session_factory
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from starlette.concurrency import run_in_threadpool
+from fastapi import HTTPException, status
+from typing import Optional
+
+
+class AsyncOrderService:
+    """AsyncSession counterpart of OrderService, used when DATABASE_ASYNC is enabled"""
+
+    @staticmethod
+    async def create_order(db: AsyncSession, order_request: OrderRequest, current_user) -> OrderResponse:
+        """creates a new order for the current user"""
+        new_order = OrderService.new_order(order_request, current_user)
+
+        db.add(new_order)
+        await AsyncOrderStatsService.record(db, added=[(DeliveryStatus.PENDING, new_order)])
+        await db.commit()
+        return new_order
+
+    @staticmethod
+    async def stored_order(db: AsyncSession, current_user, idempotency_key: str, fingerprint: str) -> Optional[Order]:
+        stored = (await db.scalars(order_idempotency.lookup_statement(current_user.id, idempotency_key))).first()
+        if stored is None:
+            return None
+        order_idempotency.check_fingerprint(stored.fingerprint, fingerprint)
+        return OrderService.replayed_order(await db.get(Order, stored.order_id) or await db.get(OrderArchive, stored.order_id))
+
+    @staticmethod
+    async def create_order_once(db: AsyncSession, order_request: OrderRequest, current_user, idempotency_key: str, fingerprint: str) -> tuple[Order, bool]:
+        """creates a new order and records its Idempotency-Key in the same transaction, see OrderService.create_order_once"""
+        stored = await AsyncOrderService.stored_order(db, current_user, idempotency_key, fingerprint)
+        if stored is not None:
+            return stored, True
+
+        new_order = OrderService.new_order(order_request, current_user)
+        try:
+            db.add(new_order)
+            await AsyncOrderStatsService.record(db, added=[(DeliveryStatus.PENDING, new_order)])
+            await db.flush()
+            for statement in order_idempotency.store_statements(current_user.id, idempotency_key, fingerprint, new_order.id):
+                await db.execute(statement)
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            stored = await AsyncOrderService.stored_order(db, current_user, idempotency_key, fingerprint)
+            if stored is None:
+                raise
+            return stored, True
+        except Exception:
+            await db.rollback()
+            raise
+        return new_order, False
+
+    @staticmethod
+    async def create_orders(db: AsyncSession, order_requests: list[OrderRequest], current_user) -> list[OrderResponse]:
+        """creates several orders for the current user in a single transaction, or none of them"""
+        return await AsyncOrderService.insert_orders(db, OrderService.batch_rows(order_requests, current_user))
+
+    @staticmethod
+    async def insert_orders(db: AsyncSession, rows: list[dict]) -> list[Order]:
+        """inserts priced order rows with one multi-row INSERT ... RETURNING and a single commit"""
+        try:
+            new_orders = (await db.scalars(insert(Order).returning(Order, sort_by_parameter_order=True), rows)).all()
+            await AsyncOrderStatsService.record(db, added=[(new_order.order_status, new_order) for new_order in new_orders])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return new_orders
+
+    @staticmethod
+    async def group_insert(rows: list[dict]) -> list:
+        """inserts the rows collected by the group commit, see OrderService.group_insert"""
+        async with get_async_session_factory()() as db:
+            try:
+                results = list(await AsyncOrderService.insert_orders(db, rows))
+            except Exception:
+                if len(rows) == 1:
+                    raise
+                results = []
+                for row in rows:
+                    try:
+                        results.extend(await AsyncOrderService.insert_orders(db, [row]))
+                    except Exception as e:
+                        results.append(e)
+        return results
+
+    @staticmethod
+    async def _owned_order(db: AsyncSession, order_id: int, current_user, *options, include_archived: bool = False, include_customer: bool = False) -> Order:
+        order = (await db.scalars(select(Order).where(Order.id == order_id, Order.user_id == current_user.id).options(*options))).first()
+        if not order and include_archived:
+            order = (await db.scalars(OrderService.archived_order_statement(order_id, current_user, include_customer))).first()
+        if not order:
+            raise HTTPException(
+                status_code = status.HTTP_404_NOT_FOUND,
+                detail= "Order not found"
+            )
+        return order
+
+    @staticmethod
+    async def get_order_by_id(db: AsyncSession, order_id: int, current_user, include_customer: bool = False, include_archived: bool = False) -> OrderResponse:
+        """retrieves an order by id by the current user, with its customer joined in when include_customer is set.
+        The archive is only searched when include_archived is set and the order is not in the orders table."""
+        options = (joinedload(Order.customer, innerjoin=True),) if include_customer else ()
+        return await AsyncOrderService._owned_order(db, order_id, current_user, *options, include_archived=include_archived, include_customer=include_customer)
+
+    @staticmethod
+    async def get_all_orders(
+        db: AsyncSession,
+        current_user,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        order_status: Optional[str] = None,
+        size: Optional[str] = None,
+        pizza_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        include_customer: bool = False,
+        include_archived: bool = False,
+    ) -> OrderPage:
+        """retrieves one page of orders, admins can see all orders while users only see their own"""
+        # an AsyncSession cannot lazy load, with include_customer the customers must come with the page
+        statements = OrderService.page_statements(current_user, cursor, limit, order_status, size, pizza_type, user_id, include_customer, include_archived)
+        return OrderService.merged_page([(await db.scalars(statement)).all() for statement in statements], limit, include_customer)
+
+    @staticmethod
+    async def update_order_status(db: AsyncSession, order_id: int, new_status: UpdateOrderStatusRequest, current_user) -> OrderResponse:
+        """Change the status of an order given its id."""
+        OrderService.validate_status(new_status)
+        order_to_update = (await db.scalars(select(Order).where(Order.id == order_id))).first()
+        if order_to_update is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Order not found",
+            )
+        await AsyncOrderStatsService.record(db, added=[(new_status.new_status, order_to_update)], removed=[(order_to_update.order_status, order_to_update)])
+        order_to_update.order_status = new_status.new_status
+        try:
+            # flushed first, so the event carries the new version
+            await db.flush()
+            status_event = OrderService.status_event(order_to_update)
+            for statement in order_events.publish_statements([status_event]):
+                await db.execute(statement)
+            await db.commit()
+        except StaleDataError:
+            await db.rollback()
+            raise OrderService.stale_order(await db.scalar(select(Order.id).where(Order.id == order_id)) is not None)
+        await run_in_threadpool(order_events.publish_committed, [status_event])
+        return order_to_update
+
+    @staticmethod
+    async def get_order_status(db: AsyncSession, order_id: int, current_user, include_archived: bool = False) -> OrderResponse:
+        """Check the status of your order"""
+        return await AsyncOrderService._owned_order(db, order_id, current_user, include_archived=include_archived)
+
+    @staticmethod
+    async def delete_order(db: AsyncSession, order_id: int, current_user):
+        """Deletes an order"""
+        order_to_delete = await AsyncOrderService._owned_order(db, order_id, current_user)
+        deleted_event = {"event": "order_deleted", "order_id": order_to_delete.id, "user_id": order_to_delete.user_id}
+        await AsyncOrderStatsService.record(db, removed=[(order_to_delete.order_status, order_to_delete)])
+        await db.delete(order_to_delete)
+        try:
+            for statement in order_events.publish_statements([deleted_event]):
+                await db.execute(statement)
+            await db.commit()
+        except StaleDataError:
+            await db.rollback()
+            raise OrderService.stale_order(await db.scalar(select(Order.id).where(Order.id == order_id)) is not None)
+        await run_in_threadpool(order_events.publish_committed, [deleted_event])
+        return {"detail": "Order deleted successfully"}
@@ -0,0 +1,32 @@
+from src.models.order_stats import OrderStats
+from src.service.stats_service import OrderStatsService
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Iterable
+
+
+class AsyncOrderStatsService:
+    """AsyncSession counterpart of OrderStatsService, used when DATABASE_ASYNC is enabled"""
+
+    @staticmethod
+    async def record(db: AsyncSession, added: Iterable = (), removed: Iterable = ()) -> None:
+        """Adds the net change of an order write to the summary, call it before the write commits"""
+        rows = OrderStatsService.delta_rows(added, removed)
+        if rows:
+            await db.execute(OrderStatsService.upsert_statement(db.get_bind().dialect.name, rows))
+
+    @staticmethod
+    async def get_stats(db: AsyncSession) -> dict:
+        return OrderStatsService.summarize((await db.scalars(select(OrderStats))).all())
+
+    @staticmethod
+    async def reconcile(db: AsyncSession) -> dict:
+        """Rebuilds the summary from the live and archived orders in one transaction"""
+        try:
+            for statement in OrderStatsService.rebuild_statements():
+                await db.execute(statement)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return await AsyncOrderStatsService.get_stats(db)
@@ -1,23 +1,29 @@
 from src.models.user import User
 from passlib.context import CryptContext
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from src.schema.user_schemas import SignUpRequest
 from src.config.config import settings
-from src.schema.login_schema import loginRequest, loginResponse
+from src.schema.login_schema import loginRequest, loginResponse, refreshRequest
 from fastapi import HTTPException, status
 from typing import Optional
+from collections import Counter
 from datetime import datetime, timedelta, timezone
-import bcrypt
+from src.utils.password_pool import password_pool
+from src.utils.refresh_store import refresh_store
 import jwt
+import logging
 
 
+logger = logging.getLogger(__name__)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def get_password_hash(password: str)->str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify (plain_password, hashed_password)
+    return password_pool.verify(plain_password, hashed_password)
 
 
 class AuthService:
@@ -26,9 +32,7 @@ class AuthService:
     @staticmethod
     def hash_password(password:str)-> str:
         "Hashes password of a user"
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"),salt)
-        return hashed_password.decode("utf-8")
+        return password_pool.hash(password)
 
     @staticmethod
     def create_access_token(data: dict, expiration_time: Optional[timedelta] = None) -> str:
@@ -73,29 +77,123 @@ class AuthService:
         return encoded_refresh_jwt
 
 
+    @staticmethod
+    def _conflict_detail(error: IntegrityError) -> str:
+        message = str(error.orig).lower()
+        if "username" in message:
+            return "Username already exists."
+        return "Email already exists."
+
+    @staticmethod
+    def _insert_ignoring_duplicates(db: Session):
+        """INSERT that skips rows violating the unique email/username constraints"""
+        # the dialect modules are imported here, the postgresql one alone adds ~40ms to app import
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            return dialect_insert(User).on_conflict_do_nothing()
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            return dialect_insert(User).on_conflict_do_nothing()
+        return insert(User)
+
+    @staticmethod
+    def signup_statement(user_data: SignUpRequest, password_hash: str):
+        return insert(User).values(
+            email = user_data.email,
+            username = user_data.username,
+            password = password_hash,
+            phone_no = user_data.phone,
+            role = user_data.role,
+        ).returning(User)
+
+    @staticmethod
+    def import_rows(users: list[SignUpRequest], hashes: list[str]) -> list[dict]:
+        return [
+            {
+                "email": user.email,
+                "username": user.username,
+                "password": password_hash,
+                "phone_no": user.phone,
+                "role": user.role,
+            }
+            for user, password_hash in zip(users, hashes)
+        ]
+
+    @staticmethod
+    def import_summary(rows: list[dict], created: list[str]) -> dict:
+        remaining = Counter(created)
+        skipped = []
+        for row in rows:
+            if remaining[row["email"]]:
+                remaining[row["email"]] -= 1
+            else:
+                skipped.append(row["email"])
+        return {"created": len(created), "skipped": skipped}
+
+    @staticmethod
+    def refresh_ttl() -> float:
+        return int(settings.JWT_REFRESH_TOKEN_EXPIRES) * 60
+
+    @staticmethod
+    def login_response(user: User, family: str, jti: str) -> loginResponse:
+        """issues an access token and the refresh token `jti` of the token family, with the user's current claims"""
+        claims = {"id": user.id, "sub": user.email, "role": user.role}
+        access_token = AuthService.create_access_token(data=claims)
+        refresh_token = AuthService.refresh_token(data={**claims, "fam": family, "jti": jti})
+        return loginResponse(
+            email = user.email,
+            role = user.role,
+            access_token = access_token,
+            refresh_token = refresh_token
+        )
+
     @staticmethod
     def create_user(db:Session, user_data: SignUpRequest)-> User:
         """Register a new user in the database"""
-        if  db.query(User).filter(User.email == user_data.email).first():
-            raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail ="Email already exists.")
-        if db.query(User).filter(User.username == user_data.username).first():
-            raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail ="Username already exists.")
-
         password_hash= AuthService.hash_password(user_data.password)
 
-        new_user =User(
-        email = user_data.email,
-        username = user_data.username,
-        password = password_hash,
-        phone_no = user_data.phone,
-        role = user_data.role,
-        )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        statement = AuthService.signup_statement(user_data, password_hash)
+        try:
+            new_user = db.scalars(statement).one()
+            db.expunge(new_user)
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail =AuthService._conflict_detail(e))
         return new_user
 
 
+    @staticmethod
+    def check_import_size(users: list[SignUpRequest]) -> None:
+        """bounds how long one import keeps the password workers busy"""
+        if len(users) > int(settings.USER_IMPORT_MAX):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"An import can contain at most {settings.USER_IMPORT_MAX} users"
+            )
+
+    @staticmethod
+    def import_users(db: Session, users: list[SignUpRequest]) -> dict:
+        """Register many users at once, skipping those whose email or username already exists"""
+        AuthService.check_import_size(users)
+        hashes = password_pool.hash_many([user.password for user in users])
+        rows = AuthService.import_rows(users, hashes)
+
+        created = []
+        batch_size = int(settings.USER_IMPORT_BATCH_SIZE)
+        try:
+            for start in range(0, len(rows), batch_size):
+                statement = AuthService._insert_ignoring_duplicates(db).values(rows[start:start + batch_size]).returning(User.email)
+                created.extend(db.execute(statement).scalars())
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(status_code= status.HTTP_409_CONFLICT, detail =AuthService._conflict_detail(e))
+
+        return AuthService.import_summary(rows, created)
+
+
     @staticmethod
     def login(db: Session, login_detail: loginRequest) -> loginResponse:
         """Login a user and return token"""
@@ -103,18 +201,54 @@ class AuthService:
             user = db.query(User).filter(User.email == login_detail.email).first()
             if not user:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            # bcrypt takes a while; give the connection back to the pool instead of holding it idle meanwhile
+            db.expunge(user)
+            db.rollback()
             if not verify_password(login_detail.password, user.password):
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-            access_token = AuthService.create_access_token(data={"id": user.id, "sub": user.email, "role": user.role})
-            refresh_token = AuthService.refresh_token(data={"sub": user.email, "role": user.role})
-            return loginResponse(
-                email = user.email,
-                role = user.role,
-                access_token = access_token,
-                refresh_token = refresh_token
-            )
-        except Exception as e:
-            print(str(e))
+            family, jti = refresh_store.start(db, user.id, ttl=AuthService.refresh_ttl())
+            return AuthService.login_response(user, family, jti)
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Login failed")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail= "internal server error")
-            
-        
\ No newline at end of file
+
+
+    @staticmethod
+    def refresh_claims(refresh_token: str) -> dict:
+        """verifies a refresh token and returns its payload"""
+        try:
+            payload = jwt.decode(refresh_token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token has expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+
+        if payload.get("type") != "refresh" or None in (payload.get("id"), payload.get("fam"), payload.get("jti")):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return payload
+
+    @staticmethod
+    def check_refreshable(user: Optional[User]) -> None:
+        """the claims of the new tokens come from the user row, not the old token, so a deleted or deactivated user gets none"""
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        if not user.is_active:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User account is inactive")
+
+    @staticmethod
+    def renew_tokens(db: Session, refresh_detail: refreshRequest) -> loginResponse:
+        """Exchange a refresh token for a new access token and a rotated refresh token"""
+        payload = AuthService.refresh_claims(refresh_detail.refresh_token)
+        user = db.scalars(select(User).where(User.id == payload["id"])).first()
+        try:
+            AuthService.check_refreshable(user)
+        except HTTPException:
+            refresh_store.revoke(db, payload["fam"])
+            raise
+
+        new_jti = refresh_store.rotate(db, payload["fam"], payload["jti"], ttl=AuthService.refresh_ttl())
+        if new_jti is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token has been revoked")
+        return AuthService.login_response(user, payload["fam"], new_jti)
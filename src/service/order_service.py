@@ -1,37 +1,65 @@
 from src.models.user import User
 from src.models.order import Order, DeliveryStatus
-from src.schema.order_schema import OrderRequest, OrderResponse, UpdateOrderStatusRequest
+from src.models.order_archive import OrderArchive
+from src.schema.order_schema import OrderRequest, OrderResponse, OrderPage, OrderWithCustomerPage, UpdateOrderStatusRequest
 from src.utils.role import get_current_user, role_required
-from src.utils.menu import menu
-from sqlalchemy.orm import Session
+from src.utils.menu_catalog import get_catalog
+from src.utils.pagination import encode_cursor, decode_cursor
+from src.utils.order_events import order_events
+from src.utils.idempotency import order_idempotency
+from src.config.database import get_session_factory
+from src.service.stats_service import OrderStatsService
+from src.config.config import settings
+from sqlalchemy import CompoundSelect, Select, insert, literal_column, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException, status, Depends
+from typing import Iterator, Optional
+import csv
+import heapq
+import io
+import json
 
 
 def calculate_price(size: str, pizza_type: str, quantity: int, toppings: bool) -> float:
     """Calculate the total amount for an order based on the size, pizza type"""
-    if size not in menu:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid pizza size"
-        )
-
-    if pizza_type not in menu[size]:
+    catalog = get_catalog()
+    base_price = catalog.prices.get((size, pizza_type))
+    if base_price is None:
+        if size not in catalog.sizes:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pizza size"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid pizza type specified"
         )
 
-    base_price = menu[size][pizza_type]
-    toppings_price = menu[size][pizza_type].toppings if toppings else 0
+    toppings_price = catalog.toppings.get(size, 0) if toppings else 0
     total_price = (base_price + toppings_price) * quantity
     return total_price
 
 class OrderService:
 
     @staticmethod
-    def create_order(db: Session, order_request: OrderRequest, current_user: User = Depends(get_current_user)) -> OrderResponse:
-        """creates a new order for the current user"""
-        new_order = Order(
+    def order_row(order_request: OrderRequest, current_user) -> dict:
+        """prices one order and returns its orders table row"""
+        return {
+            "size": order_request.size,
+            "quantity": order_request.quantity,
+            "price": calculate_price(order_request.size, order_request.pizza_type, order_request.quantity, order_request.toppings),
+            "pizza_type": order_request.pizza_type,
+            "toppings": order_request.toppings,
+            "order_status": DeliveryStatus.PENDING.value,
+            "user_id": current_user.id,
+        }
+
+    @staticmethod
+    def new_order(order_request: OrderRequest, current_user) -> Order:
+        """prices one order and returns it as a new Order"""
+        return Order(
             size=order_request.size,
             quantity=order_request.quantity,
             price=calculate_price(order_request.size, order_request.pizza_type, order_request.quantity, order_request.toppings),
@@ -40,15 +68,243 @@ class OrderService:
             user_id=current_user.id
         )
 
+    @staticmethod
+    def replayed_order(order: Optional[Order]) -> Order:
+        if order is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The order created with this Idempotency-Key was deleted"
+            )
+        return order
+
+    @staticmethod
+    def batch_rows(order_requests: list[OrderRequest], current_user) -> list[dict]:
+        """prices every line of a batch up front, naming the first invalid line"""
+        if len(order_requests) > int(settings.ORDER_BATCH_MAX):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"A batch can contain at most {settings.ORDER_BATCH_MAX} orders"
+            )
+        rows = []
+        for index, order_request in enumerate(order_requests):
+            try:
+                rows.append(OrderService.order_row(order_request, current_user))
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"Order {index}: {e.detail}")
+        return rows
+
+    @staticmethod
+    def orders_page_statement(
+        current_user,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        order_status: Optional[str] = None,
+        size: Optional[str] = None,
+        pizza_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        model=Order,
+    ) -> Select:
+        """builds the keyset query of one page of orders, fetching one extra row to detect a next page"""
+        statement = select(model)
+        if current_user.role == "admin":
+            if user_id is not None:
+                statement = statement.where(model.user_id == user_id)
+        else:
+            statement = statement.where(model.user_id == current_user.id)
+
+        if order_status is not None:
+            statement = statement.where(model.order_status == order_status)
+        if size is not None:
+            statement = statement.where(model.size == size)
+        if pizza_type is not None:
+            statement = statement.where(model.pizza_type == pizza_type)
+        if cursor is not None:
+            statement = statement.where(model.id > decode_cursor(cursor))
+        return statement.order_by(model.id).limit(limit + 1)
+
+    @staticmethod
+    def page_statements(
+        current_user,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        order_status: Optional[str] = None,
+        size: Optional[str] = None,
+        pizza_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        include_customer: bool = False,
+        include_archived: bool = False,
+    ) -> list[Select]:
+        """the queries of one page of orders, plus the same query over orders_archive when archived orders are included"""
+        statements = []
+        for model in (Order, OrderArchive) if include_archived else (Order,):
+            statement = OrderService.orders_page_statement(current_user, cursor, limit, order_status, size, pizza_type, user_id, model)
+            statements.append(OrderService.with_customers(statement, model) if include_customer else statement)
+        return statements
+
+    @staticmethod
+    def merged_page(results: list[list], limit: int, include_customer: bool = False) -> OrderPage:
+        """builds the page out of the results of page_statements"""
+        # each result is in id order with up to limit + 1 rows, and an id is either live or archived,
+        # so the first limit + 1 orders of the merge are the page and its lookahead row
+        orders = list(heapq.merge(*results, key=lambda order: order.id))[:limit + 1]
+        return OrderService.orders_page(orders, limit, OrderWithCustomerPage if include_customer else OrderPage)
+
+    @staticmethod
+    def orders_page(orders: list[Order], limit: int, page=OrderPage) -> OrderPage:
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1].id)
+        return page(items=orders, next_cursor=next_cursor)
+
+    @staticmethod
+    def with_customers(statement: Select, model=Order) -> Select:
+        """loads the customers of a page of orders in one extra IN query, however long the page is"""
+        # a second query keeps the keyset query on the orders index alone, unlike a join
+        return statement.options(selectinload(model.customer))
+
+    @staticmethod
+    def archived_order_statement(order_id: int, current_user, include_customer: bool = False) -> Select:
+        """looks an order of the current user up in orders_archive"""
+        statement = select(OrderArchive).where(OrderArchive.id == order_id, OrderArchive.user_id == current_user.id)
+        if include_customer:
+            statement = statement.options(joinedload(OrderArchive.customer, innerjoin=True))
+        return statement
+
+    @staticmethod
+    def validate_status(new_status: UpdateOrderStatusRequest) -> None:
+        if new_status.new_status not in DeliveryStatus._value2member_map_:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid order status",
+            )
+
+    @staticmethod
+    def stale_order(still_exists: bool) -> HTTPException:
+        """the error for an update that lost the race on the order's version column"""
+        if not still_exists:
+            return HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Order not found",
+            )
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Order was changed by another request. Please retry.",
+        )
+
+    @staticmethod
+    def status_event(order: Order) -> dict:
+        return {
+            "event": "order_status",
+            "order_id": order.id,
+            "user_id": order.user_id,
+            "order_status": order.order_status,
+            "version": order.version,
+        }
+
+    @staticmethod
+    def create_order(db: Session, order_request: OrderRequest, current_user: User = Depends(get_current_user)) -> OrderResponse:
+        """creates a new order for the current user"""
+        new_order = OrderService.new_order(order_request, current_user)
+
         db.add(new_order)
+        OrderStatsService.record(db, added=[(DeliveryStatus.PENDING, new_order)])
         db.commit()
         db.refresh(new_order)
         return new_order
 
     @staticmethod
-    def get_order_by_id(db:Session, order_id:int, current_user= Depends(get_current_user)) -> OrderResponse:
-        """retrieves an order by id by the current user"""
-        order = db.query(Order).filter(Order.id== order_id, Order.user_id== current_user.id).first()
+    def stored_order(db: Session, current_user, idempotency_key: str, fingerprint: str) -> Optional[Order]:
+        """the order created earlier with a live Idempotency-Key of the current user, live or archived"""
+        stored = db.scalars(order_idempotency.lookup_statement(current_user.id, idempotency_key)).first()
+        if stored is None:
+            return None
+        order_idempotency.check_fingerprint(stored.fingerprint, fingerprint)
+        return OrderService.replayed_order(db.get(Order, stored.order_id) or db.get(OrderArchive, stored.order_id))
+
+    @staticmethod
+    def create_order_once(db: Session, order_request: OrderRequest, current_user, idempotency_key: str, fingerprint: str) -> tuple[Order, bool]:
+        """creates a new order and records its Idempotency-Key in the same transaction.
+        Returns the order and whether it was replayed from an earlier request with the same key."""
+        stored = OrderService.stored_order(db, current_user, idempotency_key, fingerprint)
+        if stored is not None:
+            return stored, True
+
+        new_order = OrderService.new_order(order_request, current_user)
+        try:
+            db.add(new_order)
+            OrderStatsService.record(db, added=[(DeliveryStatus.PENDING, new_order)])
+            db.flush()
+            for statement in order_idempotency.store_statements(current_user.id, idempotency_key, fingerprint, new_order.id):
+                db.execute(statement)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # another worker committed an order with the same key first
+            stored = OrderService.stored_order(db, current_user, idempotency_key, fingerprint)
+            if stored is None:
+                raise
+            return stored, True
+        except Exception:
+            db.rollback()
+            raise
+        db.refresh(new_order)
+        return new_order, False
+
+    @staticmethod
+    def create_orders(db: Session, order_requests: list[OrderRequest], current_user: User = Depends(get_current_user)) -> list[OrderResponse]:
+        """creates several orders for the current user in a single transaction, or none of them"""
+        return OrderService.insert_orders(db, OrderService.batch_rows(order_requests, current_user))
+
+    @staticmethod
+    def insert_orders(db: Session, rows: list[dict]) -> list[Order]:
+        """inserts priced order rows with one multi-row INSERT ... RETURNING and a single commit"""
+        try:
+            new_orders = db.scalars(insert(Order).returning(Order, sort_by_parameter_order=True), rows).all()
+            for new_order in new_orders:
+                db.expunge(new_order)
+            OrderStatsService.record(db, added=[(new_order.order_status, new_order) for new_order in new_orders])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return new_orders
+
+    @staticmethod
+    def group_insert(rows: list[dict]) -> list:
+        """inserts the rows collected by the group commit on a session of its own.
+
+        If the shared transaction fails, every row is retried in a transaction
+        of its own, so one bad row only fails its own request. Returns an
+        Order or the exception raised for each row.
+        """
+        db = get_session_factory()()
+        try:
+            try:
+                results = list(OrderService.insert_orders(db, rows))
+            except Exception:
+                if len(rows) == 1:
+                    raise
+                results = []
+                for row in rows:
+                    try:
+                        results.extend(OrderService.insert_orders(db, [row]))
+                    except Exception as e:
+                        results.append(e)
+        finally:
+            db.close()
+        return results
+
+    @staticmethod
+    def get_order_by_id(db:Session, order_id:int, current_user= Depends(get_current_user), include_customer: bool = False, include_archived: bool = False) -> OrderResponse:
+        """retrieves an order by id by the current user, with its customer joined in when include_customer is set.
+        The archive is only searched when include_archived is set and the order is not in the orders table."""
+        query = db.query(Order).filter(Order.id== order_id, Order.user_id== current_user.id)
+        if include_customer:
+            query = query.options(joinedload(Order.customer, innerjoin=True))
+        order = query.first()
+        if not order and include_archived:
+            order = db.scalars(OrderService.archived_order_statement(order_id, current_user, include_customer)).first()
         if not order:
             raise HTTPException(
                 status_code = status.HTTP_404_NOT_FOUND,
@@ -58,35 +314,98 @@ class OrderService:
 
 
     @staticmethod
-    def get_all_orders(db: Session, current_user= Depends(get_current_user)) -> list[OrderResponse]:
-        """retrieves all orders"""
-        if current_user.role == "user":
-            orders = db.query(Order).filter(Order.user_id == current_user.id).all()
-            return orders
-        elif current_user.role == "admin":
-            orders = db.query(Order).all()
-            return orders
+    def get_all_orders(
+        db: Session,
+        current_user= Depends(get_current_user),
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        order_status: Optional[str] = None,
+        size: Optional[str] = None,
+        pizza_type: Optional[str] = None,
+        user_id: Optional[int] = None,
+        include_customer: bool = False,
+        include_archived: bool = False,
+    ) -> OrderPage:
+        """retrieves one page of orders, admins can see all orders while users only see their own"""
+        statements = OrderService.page_statements(current_user, cursor, limit, order_status, size, pizza_type, user_id, include_customer, include_archived)
+        return OrderService.merged_page([db.scalars(statement).all() for statement in statements], limit, include_customer)
 
 
+    EXPORT_COLUMNS = ("id", "size", "quantity", "price", "pizza_type", "toppings", "order_status", "user_id")
+
+    @staticmethod
+    def export_statement(order_status: Optional[str] = None, include_archived: bool = False) -> Select | CompoundSelect:
+        """selects the exported columns of every order in id order, archived ones too when include_archived is set"""
+        statements = []
+        for model in (Order, OrderArchive) if include_archived else (Order,):
+            statement = select(*(getattr(model, column) for column in OrderService.EXPORT_COLUMNS))
+            if order_status is not None:
+                statement = statement.where(model.order_status == order_status)
+            statements.append(statement)
+        if len(statements) == 1:
+            return statements[0].order_by(Order.id)
+        # an id is either live or archived, so UNION ALL needs no deduplication
+        return union_all(*statements).order_by(literal_column("id"))
+
+    @staticmethod
+    def export_orders(export_format: str, order_status: Optional[str] = None, include_archived: bool = False) -> Iterator[str]:
+        """Streams every order as NDJSON or CSV through a server-side cursor, one chunk at a time"""
+        db = get_session_factory()()
+        # a long read-only scan, served by a replica when one is configured
+        db.info["read_only"] = True
+        try:
+            statement = OrderService.export_statement(order_status, include_archived)
+            result = db.execute(statement.execution_options(yield_per=int(settings.ORDER_EXPORT_CHUNK_SIZE)))
+
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(OrderService.EXPORT_COLUMNS)
+                yield buffer.getvalue()
+                for rows in result.partitions():
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+            else:
+                for rows in result.partitions():
+                    yield "".join(json.dumps(dict(row._mapping)) + "\n" for row in rows)
+        finally:
+            db.close()
+
     @staticmethod
     def update_order_status( db: Session, order_id: int, new_status: UpdateOrderStatusRequest, current_user=Depends(get_current_user)) -> OrderResponse:
         """Change the status of an order given its id."""
+        OrderService.validate_status(new_status)
         order_to_update = db.query(Order).filter(Order.id == order_id).first()
         if order_to_update is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Order not found",
             )
-            order_to_complete.order_status = new_status.order_status
+        OrderStatsService.record(db, added=[(new_status.new_status, order_to_update)], removed=[(order_to_update.order_status, order_to_update)])
+        order_to_update.order_status = new_status.new_status
+        try:
+            # flushed first, so the event carries the new version
+            db.flush()
+            status_event = OrderService.status_event(order_to_update)
+            for statement in order_events.publish_statements([status_event]):
+                db.execute(statement)
             db.commit()
-            db.refresh(order_to_update)
-            return order_to_update
+        except StaleDataError:
+            db.rollback()
+            raise OrderService.stale_order(db.scalar(select(Order.id).where(Order.id == order_id)) is not None)
+        db.refresh(order_to_update)
+        order_events.publish_committed([status_event])
+        return order_to_update
 
     
     @staticmethod
-    def get_order_status(db:Session, order_id:int, current_user= Depends(get_current_user)) -> OrderResponse:
+    def get_order_status(db:Session, order_id:int, current_user= Depends(get_current_user), include_archived: bool = False) -> OrderResponse:
         """Check the status of your order"""
         order = db.query(Order).filter_by(id = order_id, user_id = current_user.id).first()
+        if not order and include_archived:
+            order = db.scalars(OrderService.archived_order_statement(order_id, current_user)).first()
         if not order:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -108,6 +427,15 @@ class OrderService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Order not found",
             )
+        deleted_event = {"event": "order_deleted", "order_id": order_to_delete.id, "user_id": order_to_delete.user_id}
+        OrderStatsService.record(db, removed=[(order_to_delete.order_status, order_to_delete)])
         db.delete(order_to_delete)
-        db.commit()
+        try:
+            for statement in order_events.publish_statements([deleted_event]):
+                db.execute(statement)
+            db.commit()
+        except StaleDataError:
+            db.rollback()
+            raise OrderService.stale_order(db.scalar(select(Order.id).where(Order.id == order_id)) is not None)
+        order_events.publish_committed([deleted_event])
         return {"detail": "Order deleted successfully"}
\ No newline at end of file
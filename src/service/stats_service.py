@@ -0,0 +1,117 @@
+from src.models.order import Order, DeliveryStatus
+from src.models.order_archive import OrderArchive
+from src.models.order_stats import OrderStats
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+from typing import Iterable
+
+
+STATS_DIMENSIONS = ("order_status", "size", "pizza_type")
+
+
+class OrderStatsService:
+    """Keeps the order_stats summary table in step with the orders table.
+
+    Every order write adds its net change to the affected groups inside its
+    own transaction, so the dashboard reads a handful of summary rows instead
+    of scanning the orders. reconcile() rebuilds the table from the orders,
+    live and archived, for changes made outside the API.
+    """
+
+    @staticmethod
+    def delta_rows(added: Iterable = (), removed: Iterable = ()) -> list[dict]:
+        """Nets (order_status, order) pairs entering and leaving each group into one upsert row per group"""
+        totals = {}
+        for changes, sign in ((added, 1), (removed, -1)):
+            for order_status, order in changes:
+                key = (getattr(order_status, "value", order_status) or DeliveryStatus.PENDING.value, order.size, order.pizza_type)
+                count, quantity, revenue = totals.get(key, (0, 0, 0.0))
+                totals[key] = (count + sign, quantity + sign * order.quantity, revenue + sign * order.price)
+        # sorted, so concurrent transactions lock the summary rows in the same order
+        return [
+            {"order_status": key[0], "size": key[1], "pizza_type": key[2], "order_count": count, "quantity": quantity, "revenue": revenue}
+            for key, (count, quantity, revenue) in sorted(totals.items())
+            if count or quantity or revenue
+        ]
+
+    @staticmethod
+    def upsert_statement(dialect: str, rows: list[dict]):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            raise RuntimeError(f"order statistics are not supported on {dialect}")
+        statement = dialect_insert(OrderStats).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=[OrderStats.order_status, OrderStats.size, OrderStats.pizza_type],
+            set_={
+                "order_count": OrderStats.order_count + statement.excluded.order_count,
+                "quantity": OrderStats.quantity + statement.excluded.quantity,
+                "revenue": OrderStats.revenue + statement.excluded.revenue,
+            },
+        )
+
+    @staticmethod
+    def rebuild_statements() -> tuple:
+        # archived orders keep counting, the archiver moves them without touching the summary
+        every_order = union_all(*(
+            select(model.order_status, model.size, model.pizza_type, model.quantity, model.price)
+            for model in (Order, OrderArchive)
+        )).subquery()
+        order_status = func.coalesce(every_order.c.order_status, DeliveryStatus.PENDING.value)
+        grouped = select(
+            order_status,
+            every_order.c.size,
+            every_order.c.pizza_type,
+            func.count(),
+            func.coalesce(func.sum(every_order.c.quantity), 0),
+            func.coalesce(func.sum(every_order.c.price), 0),
+        ).group_by(order_status, every_order.c.size, every_order.c.pizza_type)
+        return (
+            delete(OrderStats),
+            insert(OrderStats).from_select([*STATS_DIMENSIONS, "order_count", "quantity", "revenue"], grouped),
+        )
+
+    @staticmethod
+    def summarize(rows: Iterable[OrderStats]) -> dict:
+        """Rolls the summary rows up into totals per order_status, size and pizza_type"""
+        summary = {"total": {"count": 0, "quantity": 0, "revenue": 0.0}}
+        summary.update({f"by_{dimension}": {} for dimension in STATS_DIMENSIONS})
+        for row in rows:
+            if not row.order_count:
+                continue
+            buckets = [summary["total"]] + [
+                summary[f"by_{dimension}"].setdefault(getattr(row, dimension), {"count": 0, "quantity": 0, "revenue": 0.0})
+                for dimension in STATS_DIMENSIONS
+            ]
+            for bucket in buckets:
+                bucket["count"] += row.order_count
+                bucket["quantity"] += row.quantity
+                bucket["revenue"] += row.revenue
+        for bucket in [summary["total"]] + [b for dimension in STATS_DIMENSIONS for b in summary[f"by_{dimension}"].values()]:
+            bucket["revenue"] = round(bucket["revenue"], 2)
+        return summary
+
+    @staticmethod
+    def record(db: Session, added: Iterable = (), removed: Iterable = ()) -> None:
+        """Adds the net change of an order write to the summary, call it before the write commits"""
+        rows = OrderStatsService.delta_rows(added, removed)
+        if rows:
+            db.execute(OrderStatsService.upsert_statement(db.get_bind().dialect.name, rows))
+
+    @staticmethod
+    def get_stats(db: Session) -> dict:
+        return OrderStatsService.summarize(db.scalars(select(OrderStats)).all())
+
+    @staticmethod
+    def reconcile(db: Session) -> dict:
+        """Rebuilds the summary from the live and archived orders in one transaction"""
+        try:
+            for statement in OrderStatsService.rebuild_statements():
+                db.execute(statement)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return OrderStatsService.get_stats(db)
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+import ipaddress
+import math
+import re
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+from src.utils.metrics import prometheus_metric
+from src.utils.response import failure_response
+
+
+# share of ADMISSION_MAX_INFLIGHT a priority class may fill; lower classes are shed first
+PRIORITY_HEADROOM = {"critical": 1.0, "normal": 0.85, "low": 0.6}
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token, returns 0 when allowed or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    """Limits for the requests whose method and path match, the first matching policy applies"""
+    name: str
+    path: str
+    methods: tuple = ()
+    priority: str = "normal"
+    max_concurrency: Optional[int] = None
+    rate: Optional[float] = None
+    burst: Optional[float] = None
+    client_rate: Optional[float] = None
+    client_burst: Optional[float] = None
+    # long-lived streams hold their slot for minutes, they do not count towards the shared in-flight total
+    long_lived: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        return (not self.methods or method in self.methods) and re.fullmatch(self.path, path) is not None
+
+
+class AdmissionController:
+    """Decides per request whether to admit or shed it.
+
+    All state is touched from the event loop only, between awaits, so it
+    needs no locks. Shedding is cheapest first: a request is rejected before
+    any dependency, database session or password hash is set up for it.
+    """
+
+    def __init__(self, policies: list, max_in_flight: int, max_clients: int = 10000):
+        self.policies = list(policies) + [AdmissionPolicy(name="default", path=".*")]
+        self.max_in_flight = max_in_flight
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self._route_in_flight = {policy.name: 0 for policy in self.policies}
+        self._buckets = {policy.name: TokenBucket(policy.rate, policy.burst or policy.rate) for policy in self.policies if policy.rate}
+        self._client_buckets: "OrderedDict[tuple[str, str], TokenBucket]" = OrderedDict()
+        self.admitted = {policy.name: 0 for policy in self.policies}
+        self.shed = {policy.name: {} for policy in self.policies}
+
+    def policy_for(self, method: str, path: str) -> AdmissionPolicy:
+        return next(policy for policy in self.policies if policy.matches(method, path))
+
+    def _client_bucket(self, policy: AdmissionPolicy, client: str) -> TokenBucket:
+        key = (policy.name, client)
+        bucket = self._client_buckets.get(key)
+        if bucket is None:
+            bucket = self._client_buckets[key] = TokenBucket(policy.client_rate, policy.client_burst or policy.client_rate)
+            while len(self._client_buckets) > self.max_clients:
+                self._client_buckets.popitem(last=False)
+        else:
+            self._client_buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, policy: AdmissionPolicy, client: str) -> Optional[tuple[int, str, float]]:
+        """Returns None when admitted, else the (status code, reason, retry after) of the rejection"""
+        if not policy.long_lived and self.in_flight >= self.max_in_flight * PRIORITY_HEADROOM.get(policy.priority, 1.0):
+            return 503, "overloaded", 1.0
+        if policy.max_concurrency is not None and self._route_in_flight[policy.name] >= policy.max_concurrency:
+            return 503, "concurrency", 1.0
+        if policy.client_rate:
+            wait = self._client_bucket(policy, client).take()
+            if wait:
+                return 429, "client_rate", wait
+        if policy.name in self._buckets:
+            wait = self._buckets[policy.name].take()
+            if wait:
+                return 429, "rate", wait
+        return None
+
+    def acquire(self, policy: AdmissionPolicy) -> None:
+        self.admitted[policy.name] += 1
+        self._route_in_flight[policy.name] += 1
+        if not policy.long_lived:
+            self.in_flight += 1
+
+    def release(self, policy: AdmissionPolicy) -> None:
+        self._route_in_flight[policy.name] -= 1
+        if not policy.long_lived:
+            self.in_flight -= 1
+
+    def reject(self, policy: AdmissionPolicy, reason: str) -> None:
+        self.shed[policy.name][reason] = self.shed[policy.name].get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "policies": {
+                policy.name: {
+                    "priority": policy.priority,
+                    "in_flight": self._route_in_flight[policy.name],
+                    "admitted": self.admitted[policy.name],
+                    "shed": dict(self.shed[policy.name]),
+                }
+                for policy in self.policies
+            },
+        }
+
+    def render(self) -> list[str]:
+        """Returns the admission metrics in the Prometheus text format"""
+        return [
+            *prometheus_metric("admission_in_flight", "gauge", "Requests in flight by admission policy.",
+                               [({"policy": policy.name}, self._route_in_flight[policy.name]) for policy in self.policies]),
+            *prometheus_metric("admission_admitted_total", "counter", "Requests admitted by admission policy.",
+                               [({"policy": policy.name}, self.admitted[policy.name]) for policy in self.policies]),
+            *prometheus_metric("admission_shed_total", "counter", "Requests shed by admission policy and reason.",
+                               [({"policy": policy.name, "reason": reason}, count)
+                                for policy in self.policies for reason, count in sorted(self.shed[policy.name].items())]),
+        ]
+
+
+class AdmissionControlMiddleware:
+    """Sheds requests with 429 (rate limits) or 503 (overload, concurrency) and a Retry-After header.
+
+    Per-client limits key on the peer address. When the peer is one of the
+    `trusted_proxies`, the client is the right-most X-Forwarded-For address
+    that is not itself a trusted proxy, since the left-most entries are
+    whatever the client chose to send.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, trusted_proxies: Iterable[str] = ()):
+        self.app = app
+        self.controller = controller
+        self.trusted_proxies = [ipaddress.ip_network(proxy.strip(), strict=False) for proxy in trusted_proxies if proxy.strip()]
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_of(self, scope: Scope) -> str:
+        peer = scope["client"][0] if scope.get("client") else "unknown"
+        if not self.trusted_proxies or not self._trusted(peer):
+            return peer
+        hops = [
+            hop.strip()
+            for name, value in scope["headers"] if name == b"x-forwarded-for"
+            for hop in value.decode("latin-1").split(",") if hop.strip()
+        ]
+        for hop in reversed(hops):
+            if not self._trusted(hop):
+                return hop
+        return hops[0] if hops else peer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.controller.policy_for(scope["method"], scope["path"])
+        rejection = self.controller.admit(policy, self.client_of(scope))
+        if rejection is not None:
+            status_code, reason, retry_after = rejection
+            self.controller.reject(policy, reason)
+            message = "Too many requests. Please slow down." if status_code == 429 else "Service is busy. Please try again shortly."
+            response = failure_response(status_code=status_code, message=message, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+            await response(scope, receive, send)
+            return
+
+        self.controller.acquire(policy)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(policy)
@@ -0,0 +1,101 @@
+from typing import Awaitable, Callable
+import asyncio
+import contextvars
+
+from starlette.concurrency import run_in_threadpool
+from src.config.config import settings
+from src.utils.metrics import prometheus_metric
+from src.service.order_service import OrderService
+from src.service.async_order_service import AsyncOrderService
+
+
+class GroupCommitter:
+    """Collects rows submitted within `window` seconds and writes them with one `flush` call.
+
+    Each request waits for its own row while the batch shares a single
+    transaction, INSERT and commit, which trades up to `window` seconds of
+    latency for fewer commits when many writes arrive at once. A batch is
+    flushed early once it holds `max_batch` rows. `flush` returns one result
+    per row, in order; a result that is an exception fails only its own row.
+    All state is touched from the event loop only, so it needs no locks.
+    A batch runs in an empty context: it serves many requests, so it must not
+    carry the context variables of whichever request happened to start it.
+    """
+
+    def __init__(self, window: float, max_batch: int, flush: Callable[[list], Awaitable[list]]):
+        self.window = window
+        self.max_batch = max_batch
+        self.flush = flush
+        self.batches = 0
+        self.rows = 0
+        self._pending: list[tuple[object, asyncio.Future]] = []
+        self._timer = None
+        self._running: set[asyncio.Task] = set()
+
+    async def submit(self, row):
+        """Adds `row` to the next batch and returns its result once the batch is written"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now, context=contextvars.Context())
+        # shield, so a client disconnecting does not cancel the write of the whole batch
+        return await asyncio.shield(future)
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch), context=contextvars.Context())
+            # the loop keeps only weak references to tasks
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list) -> None:
+        self.batches += 1
+        self.rows += len(batch)
+        try:
+            results = await self.flush([row for row, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+                # retrieved here so a cancelled waiter does not log "exception was never retrieved"
+                future.exception()
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "pending": len(self._pending),
+            "average_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+        }
+
+    def render(self, name: str) -> list[str]:
+        """Returns the batch counters in the Prometheus text format, a batch is one commit"""
+        return [
+            *prometheus_metric(f"{name}_batches_total", "counter", "Transactions written by the group commit.", [({}, self.batches)]),
+            *prometheus_metric(f"{name}_rows_total", "counter", "Rows written by the group commit.", [({}, self.rows)]),
+        ]
+
+
+async def insert_order_rows(rows: list[dict]) -> list:
+    """flush of the order group commit, on the session kind the app runs with"""
+    if settings.DATABASE_ASYNC:
+        return await AsyncOrderService.group_insert(rows)
+    return await run_in_threadpool(OrderService.group_insert, rows)
+
+
+order_group_commit = GroupCommitter(
+    window=float(settings.ORDER_GROUP_COMMIT_WINDOW_MS) / 1000,
+    max_batch=int(settings.ORDER_GROUP_COMMIT_MAX_BATCH),
+    flush=insert_order_rows,
+)
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+import asyncio
+import hashlib
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, select
+from src.config.config import settings
+from src.models.idempotency_key import IdempotencyKey
+from src.utils.metrics import prometheus_metric
+
+
+def request_fingerprint(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Remembers the order created per (user id, Idempotency-Key) for `ttl` seconds in the idempotency_keys table.
+
+    The key row is written in the transaction that creates the order, so a
+    retry on any worker, or after a restart, gets the stored order back
+    instead of creating another one, and two workers racing with the same
+    key cannot both commit. Expired keys are ignored on read and purged at
+    most every `purge_interval` seconds. Within one process, a retry that
+    arrives while the first attempt is still in flight waits for that
+    attempt instead of starting its own. Failed attempts are not stored, so
+    the client may retry them.
+    """
+
+    def __init__(self, ttl: float, purge_interval: float = 60):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.replayed = 0
+        self.coalesced = 0
+        self._next_purge = 0.0
+        self._in_flight: dict[tuple[int, str], tuple[str, asyncio.Future]] = {}
+
+    @staticmethod
+    def lookup_statement(user_id: int, idempotency_key: str):
+        return select(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == idempotency_key,
+            IdempotencyKey.expires_at > datetime.now(timezone.utc),
+        )
+
+    def store_statements(self, user_id: int, idempotency_key: str, fingerprint: str, order_id: int) -> list:
+        """statements recording the key of a new order, to run in the order's transaction"""
+        now = datetime.now(timezone.utc)
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            expired = delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now)
+        else:
+            # an expired row for this key would still block the insert
+            expired = delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id, IdempotencyKey.key == idempotency_key, IdempotencyKey.expires_at <= now
+            )
+        return [
+            expired,
+            insert(IdempotencyKey).values(
+                user_id=user_id, key=idempotency_key, fingerprint=fingerprint, order_id=order_id,
+                expires_at=now + timedelta(seconds=self.ttl),
+            ),
+        ]
+
+    @staticmethod
+    def check_fingerprint(stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request",
+            )
+
+    async def run(self, user_id: int, idempotency_key: str, fingerprint: str, produce: Callable[[], Awaitable[tuple[object, bool]]]) -> tuple[object, bool]:
+        """Returns the (result, replayed) pair of `produce`, shared with duplicates that arrive while it runs"""
+        key = (user_id, idempotency_key)
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.check_fingerprint(in_flight[0], fingerprint)
+            self.coalesced += 1
+            # shield, so a client disconnecting from this duplicate does not cancel the first attempt
+            result, _ = await asyncio.shield(in_flight[1])
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            result, replayed = await produce()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # retrieved here so an attempt without duplicates does not log "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result((result, replayed))
+            if replayed:
+                self.replayed += 1
+            return result, replayed
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+        }
+
+    def render(self, name: str) -> list[str]:
+        """Returns the idempotency counters in the Prometheus text format"""
+        stats = self.stats()
+        return [
+            *prometheus_metric(f"{name}_in_flight", "gauge", "Keyed requests being processed by this worker.", [({}, stats["in_flight"])]),
+            *prometheus_metric(f"{name}_replayed_total", "counter", "Retries answered with the stored result.", [({}, stats["replayed"])]),
+            *prometheus_metric(f"{name}_coalesced_total", "counter", "Retries that waited for the first attempt still in flight.", [({}, stats["coalesced"])]),
+        ]
+
+
+order_idempotency = IdempotencyStore(ttl=float(settings.IDEMPOTENCY_KEY_TTL))
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping, Optional
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+
+from src.config.config import settings
+from src.utils.menu import menu as DEFAULT_MENU
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MenuCatalog:
+    """Immutable, precompiled view of the menu used for pricing and for GET /menu"""
+    prices: Mapping[tuple[str, str], float]
+    toppings: Mapping[str, float]
+    sizes: frozenset
+    body: bytes
+    etag: str
+
+    @staticmethod
+    def _price(size: str, item: str, price) -> float:
+        if isinstance(price, bool) or not isinstance(price, (int, float)) or not math.isfinite(price) or price < 0:
+            raise ValueError(f"menu price of {item!r} in size {size!r} must be a non-negative number, got {price!r}")
+        return float(price)
+
+    @classmethod
+    def compile(cls, raw_menu: dict) -> "MenuCatalog":
+        """Validates the whole menu before anything is built from it, raising ValueError on the first problem"""
+        if not isinstance(raw_menu, dict) or not raw_menu:
+            raise ValueError("menu must be a non-empty object of sizes")
+        prices, toppings = {}, {}
+        for size, items in raw_menu.items():
+            if not isinstance(items, dict):
+                raise ValueError(f"menu size {size!r} must map pizza types to prices")
+            if not any(pizza_type != "toppings" for pizza_type in items):
+                raise ValueError(f"menu size {size!r} has no pizza types")
+            for pizza_type, price in items.items():
+                if pizza_type == "toppings":
+                    toppings[size] = cls._price(size, pizza_type, price)
+                else:
+                    prices[(size, pizza_type)] = cls._price(size, pizza_type, price)
+
+        body = json.dumps(raw_menu, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return cls(
+            prices=MappingProxyType(prices),
+            toppings=MappingProxyType(toppings),
+            sizes=frozenset(raw_menu),
+            body=body,
+            etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        )
+
+
+class MenuStore:
+    """Holds the current MenuCatalog and swaps it when the menu file changes.
+
+    The file is stat'ed at most once every `reload_interval` seconds, on the
+    request path, so every worker process picks up a new menu without a
+    restart or a background thread. Readers always see either the old or the
+    new catalog, never a mix. A file that cannot be read or does not pass
+    MenuCatalog.compile, whatever the error, leaves the last good catalog in
+    place until the file changes again.
+    """
+
+    def __init__(self, path: Optional[str], reload_interval: float):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = Lock()
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._catalog = self._load() if path else MenuCatalog.compile(DEFAULT_MENU)
+
+    def _load(self) -> MenuCatalog:
+        self._mtime = os.stat(self.path).st_mtime
+        with open(self.path, "r", encoding="utf-8") as menu_file:
+            return MenuCatalog.compile(json.load(menu_file))
+
+    def get(self) -> MenuCatalog:
+        if self.path and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._catalog
+
+    def _maybe_reload(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            if os.stat(self.path).st_mtime != self._mtime:
+                self._catalog = self._load()
+        except Exception:
+            # the request that happened to trigger the reload must still be priced
+            logger.exception("Keeping the current menu, reload of %s failed", self.path)
+        finally:
+            self._lock.release()
+
+
+menu_store = MenuStore(settings.MENU_FILE, float(settings.MENU_RELOAD_INTERVAL))
+
+
+def get_catalog() -> MenuCatalog:
+    return menu_store.get()
@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed upper bounds, in the Prometheus style"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict:
+        """Returns cumulative counts per upper bound, plus the overall count and sum"""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_metric(name: str, kind: str, help_text: str, samples: list) -> list[str]:
+    """Renders (labels, value) samples of one metric in the Prometheus text format"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{prometheus_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def prometheus_histogram(name: str, help_text: str, histograms: list) -> list[str]:
+    """Renders (labels, Histogram snapshot) pairs of one histogram metric in the Prometheus text format"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, snapshot in histograms:
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f"{name}_bucket{prometheus_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{prometheus_labels(labels)} {snapshot['sum']}")
+        lines.append(f"{name}_count{prometheus_labels(labels)} {snapshot['count']}")
+    return lines
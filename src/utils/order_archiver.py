@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+import asyncio
+import logging
+
+from starlette.concurrency import run_in_threadpool
+from src.config.config import settings
+from src.config.database import get_async_session_factory, get_session_factory
+from src.utils.metrics import prometheus_metric
+from src.service.archive_service import OrderArchiveService
+from src.service.async_archive_service import AsyncOrderArchiveService
+
+logger = logging.getLogger(__name__)
+
+
+class OrderArchiver:
+    """Archives delivered orders older than `after_days` days every `interval` seconds while the app runs.
+
+    `archive(older_than_days, batch_size)` does the work and returns how many
+    orders it moved. A failed run is logged and retried at the next
+    interval. Every worker process runs its own archiver; the batches are
+    selected with SKIP LOCKED, so on PostgreSQL concurrent archivers split
+    the work instead of waiting on each other.
+    """
+
+    def __init__(self, after_days: Optional[float], interval: float, batch_size: int, archive: Callable[[float, int], Awaitable[int]]):
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.archive = archive
+        self.runs = 0
+        self.failures = 0
+        self.archived = 0
+        self.last_run: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.after_days)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Order archiver run failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, older_than_days: Optional[float] = None) -> int:
+        """Archives the delivered orders older than `older_than_days`, after_days by default, and returns how many"""
+        self.runs += 1
+        try:
+            archived = await self.archive(older_than_days or self.after_days, self.batch_size)
+        except Exception:
+            self.failures += 1
+            raise
+        self.archived += archived
+        self.last_run = datetime.now(timezone.utc)
+        return archived
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "after_days": self.after_days,
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "archived": self.archived,
+            "last_run": self.last_run.isoformat(timespec="seconds") if self.last_run else None,
+        }
+
+    def render(self, name: str) -> list[str]:
+        """Returns the archiver counters in the Prometheus text format"""
+        return [
+            *prometheus_metric(f"{name}_runs_total", "counter", "Archiver runs, failed ones included.", [({}, self.runs)]),
+            *prometheus_metric(f"{name}_failures_total", "counter", "Archiver runs that failed.", [({}, self.failures)]),
+            *prometheus_metric(f"{name}_orders_total", "counter", "Delivered orders moved to orders_archive.", [({}, self.archived)]),
+        ]
+
+
+def archive_in_session(older_than_days: float, batch_size: int) -> int:
+    db = get_session_factory()()
+    try:
+        return OrderArchiveService.archive_delivered(db, older_than_days, batch_size)
+    finally:
+        db.close()
+
+
+async def archive_orders(older_than_days: float, batch_size: int) -> int:
+    """archive of the order archiver, on the session kind the app runs with"""
+    if settings.DATABASE_ASYNC:
+        async with get_async_session_factory()() as db:
+            return await AsyncOrderArchiveService.archive_delivered(db, older_than_days, batch_size)
+    return await run_in_threadpool(archive_in_session, older_than_days, batch_size)
+
+
+order_archiver = OrderArchiver(
+    after_days=float(settings.ORDER_ARCHIVE_AFTER_DAYS) if settings.ORDER_ARCHIVE_AFTER_DAYS else None,
+    interval=float(settings.ORDER_ARCHIVE_INTERVAL),
+    batch_size=int(settings.ORDER_ARCHIVE_BATCH_SIZE),
+    archive=archive_orders,
+)
@@ -0,0 +1,233 @@
+from threading import Lock, Thread
+from typing import Callable
+import asyncio
+import importlib
+import json
+import logging
+import select
+import time
+
+from sqlalchemy import create_engine, pool, text
+from src.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALL_ORDERS = "*"
+# delivered to listeners when events may have been missed, e.g. while a backend reconnected
+RESYNC = {"event": "resync"}
+
+
+class LocalBackend:
+    """Delivers events to subscribers of this process only"""
+
+    cross_worker = False
+
+    def start(self, deliver: Callable[[dict], None]) -> None:
+        self._deliver = deliver
+
+    def publish(self, event: dict) -> None:
+        self._deliver(event)
+
+
+class PostgresNotifyBackend:
+    """Fans events out to every worker through PostgreSQL LISTEN/NOTIFY.
+
+    Writers send their events with publish_statements, in the transaction
+    that makes the change, so PostgreSQL delivers them exactly when that
+    transaction commits and never for one that rolls back.
+    """
+
+    channel = "order_events"
+    cross_worker = True
+
+    def __init__(self, database_url: str = settings.Database_url, max_backoff: float = 30):
+        # a dedicated NullPool engine so the listener never holds a slot of the request pool
+        self._engine = create_engine(database_url, poolclass=pool.NullPool)
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+
+    def start(self, deliver: Callable[[dict], None]) -> None:
+        Thread(target=self._listen, args=(deliver,), name="order-events-listener", daemon=True).start()
+
+    def publish_statements(self, events: list[dict]) -> list:
+        """one statement notifying all of `events`, to run in the writer's transaction"""
+        return [
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload").bindparams(
+                channel=self.channel, payloads=[json.dumps(event) for event in events]
+            )
+        ]
+
+    def publish(self, event: dict) -> None:
+        with self._engine.begin() as connection:
+            for statement in self.publish_statements([event]):
+                connection.execute(statement)
+
+    def _listen(self, deliver: Callable[[dict], None]) -> None:
+        """Keeps a LISTEN connection open for the life of the process, reconnecting with exponential backoff"""
+        backoff = 0.0
+        while True:
+            try:
+                raw_connection = self._engine.raw_connection()
+            except Exception as e:
+                backoff = min(self.max_backoff, backoff * 2 or 1)
+                logger.warning("Order events listener cannot connect, retrying in %gs: %r", backoff, e)
+                time.sleep(backoff)
+                continue
+            try:
+                connection = raw_connection.driver_connection
+                connection.autocommit = True
+                connection.cursor().execute(f"LISTEN {self.channel}")
+                if backoff:
+                    self.reconnects += 1
+                    logger.info("Order events listener reconnected")
+                    # events published while the listener was away are lost
+                    deliver(RESYNC)
+                backoff = 0.0
+                self._receive(connection, deliver)
+            except Exception as e:
+                backoff = min(self.max_backoff, backoff * 2 or 1)
+                logger.warning("Order events listener lost its connection, reconnecting in %gs: %r", backoff, e)
+                time.sleep(backoff)
+            finally:
+                try:
+                    raw_connection.close()
+                except Exception:
+                    pass
+
+    def _receive(self, connection, deliver: Callable[[dict], None]) -> None:
+        while True:
+            if select.select([connection], [], [], 30) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                payload = connection.notifies.pop(0).payload
+                try:
+                    deliver(json.loads(payload))
+                except Exception:
+                    # one bad event or listener must not take the listener down
+                    logger.exception("Dropping order event %r", payload)
+
+
+BACKENDS = {"local": LocalBackend, "postgres": PostgresNotifyBackend}
+
+
+def load_backend(name: str):
+    """Returns a backend by its short name or by a "package.module:ClassName" path"""
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Subscription:
+    """A bounded per-connection event queue; the oldest event is dropped when a slow reader falls behind"""
+
+    def __init__(self, key, queue_size: int):
+        self.key = key
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def push(self, event: dict) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class OrderEventBroker:
+    """In-process pub/sub of order status changes, keyed by the order owner's user id"""
+
+    def __init__(self, backend, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: dict[object, set[Subscription]] = {}
+        self._listeners: list[Callable[[dict], None]] = []
+        self._lock = Lock()
+        self._started = False
+
+    def _ensure_started(self) -> None:
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self.backend.start(self._deliver)
+                    self._started = True
+
+    def add_listener(self, listener: Callable[[dict], None]) -> None:
+        """Calls `listener` synchronously, on the delivering thread, for every event"""
+        self._ensure_started()
+        with self._lock:
+            self._listeners.append(listener)
+
+    def subscribe(self, key) -> Subscription:
+        """Subscribes the running event loop to the orders of one user, or to ALL_ORDERS"""
+        self._ensure_started()
+        subscription = Subscription(key, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.key]
+
+    def publish(self, event: dict) -> None:
+        """Publishes an event, safe to call from any thread once the change is committed"""
+        self._ensure_started()
+        self.backend.publish(event)
+
+    def publish_statements(self, events: list[dict]) -> list:
+        """Statements publishing `events`, to run in the transaction making the change, for backends that publish through the database"""
+        statements = getattr(self.backend, "publish_statements", None)
+        if statements is None or not events:
+            return []
+        return statements(events)
+
+    def publish_committed(self, events: list[dict]) -> None:
+        """Publishes `events` once their change is committed, unless publish_statements already sent them.
+
+        The change cannot be undone anymore, so a failure is logged instead of raised.
+        """
+        if getattr(self.backend, "publish_statements", None) is not None:
+            return
+        for event in events:
+            try:
+                self.publish(event)
+            except Exception:
+                logger.exception("Publishing order event %r failed", event)
+
+    @property
+    def cross_worker(self) -> bool:
+        """Whether every worker sees the events published by any of them; custom backends declare it with a cross_worker attribute"""
+        return getattr(self.backend, "cross_worker", False)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _deliver(self, event: dict) -> None:
+        if event is RESYNC:
+            with self._lock:
+                listeners = list(self._listeners)
+            for listener in listeners:
+                listener(event)
+            return
+        with self._lock:
+            listeners = list(self._listeners)
+            targets = list(self._subscribers.get(event.get("user_id"), ())) + list(self._subscribers.get(ALL_ORDERS, ()))
+        for listener in listeners:
+            listener(event)
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # the subscriber's event loop is closed, it will unsubscribe itself
+                pass
+
+
+order_events = OrderEventBroker(
+    backend=load_backend(settings.ORDER_EVENTS_BACKEND),
+    queue_size=int(settings.ORDER_EVENTS_QUEUE_SIZE),
+)
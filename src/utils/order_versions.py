@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+import time
+
+from src.config.config import settings
+from src.utils.metrics import prometheus_metric
+from src.utils.order_events import RESYNC, order_events
+
+
+def order_etag(order_id: int, version: int, variant: str = "") -> str:
+    """`variant` names an expanded representation, so it never shares an ETag with the plain one"""
+    return f'"{order_id}-{version}-{variant}"' if variant else f'"{order_id}-{version}"'
+
+
+class OrderVersionCache:
+    """Bounded LRU of order id -> (owner id, version) used to answer conditional GETs.
+
+    Entries are refreshed from order status events and expire after `ttl`
+    seconds as a safety net for changes made outside the API. The cache is
+    only `enabled` with a cross-worker event backend: with the local one, a
+    change made through another worker would never reach this cache and a
+    stale version would be answered with 304 until the entry expired.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple[float, int, int]]" = OrderedDict()
+        self._lock = Lock()
+        self._listening = False
+
+    def get(self, order_id: int) -> Optional[tuple[int, int]]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[order_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(order_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, order_id: int, user_id: int, version: int) -> None:
+        if not self.enabled or self.maxsize <= 0 or self.ttl <= 0:
+            return
+        if not self._listening:
+            self._listening = True
+            order_events.add_listener(self._on_event)
+        with self._lock:
+            self._entries[order_id] = (time.monotonic() + self.ttl, user_id, version)
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, order_id: int) -> None:
+        with self._lock:
+            self._entries.pop(order_id, None)
+
+    def _on_event(self, event: dict) -> None:
+        if event is RESYNC:
+            with self._lock:
+                self._entries.clear()
+            return
+        if event.get("version") is None:
+            self.invalidate(event["order_id"])
+            return
+        with self._lock:
+            if event["order_id"] in self._entries:
+                self._entries[event["order_id"]] = (time.monotonic() + self.ttl, event["user_id"], event["version"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def render(self, name: str) -> list[str]:
+        """Returns the cache counters in the Prometheus text format"""
+        stats = self.stats()
+        return [
+            *prometheus_metric(f"{name}_enabled", "gauge", "1 when conditional reads may be answered from the cache.", [({}, int(stats["enabled"]))]),
+            *prometheus_metric(f"{name}_entries", "gauge", "Order versions in the cache.", [({}, stats["size"])]),
+            *prometheus_metric(f"{name}_hits_total", "counter", "Order version lookups answered from the cache.", [({}, stats["hits"])]),
+            *prometheus_metric(f"{name}_misses_total", "counter", "Order version lookups that missed the cache.", [({}, stats["misses"])]),
+        ]
+
+
+order_versions = OrderVersionCache(
+    maxsize=int(settings.ORDER_VERSION_CACHE_SIZE),
+    ttl=float(settings.ORDER_VERSION_CACHE_TTL),
+    enabled=order_events.cross_worker,
+)
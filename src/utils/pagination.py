@@ -0,0 +1,25 @@
+from fastapi import HTTPException, status
+import base64
+import binascii
+import json
+
+
+def encode_cursor(last_id: int) -> str:
+    """Returns an opaque cursor pointing just after the row with `last_id`"""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Returns the id a cursor points after, rejecting anything that was not produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(cursor)
+        return last_id
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
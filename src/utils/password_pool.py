@@ -0,0 +1,187 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import BoundedSemaphore, Lock
+from typing import Optional
+import asyncio
+import multiprocessing
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from src.config.config import settings
+from src.utils.metrics import prometheus_metric
+import bcrypt
+
+
+class PasswordPool:
+    """Runs bcrypt hashing and verification in a dedicated process pool.
+
+    At most `workers + queue_size` calls may be in flight; anything beyond
+    that is rejected immediately with a 503 instead of tying up another
+    request thread while it waits for a free core. Bulk hashing is the
+    exception: it waits for free slots and never holds more than
+    `batch_concurrency` of them, so logins queue behind at most that many
+    batch jobs however large the batch is.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float, batch_concurrency: Optional[int] = None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.batch_concurrency = batch_concurrency or max(1, workers // 2)
+        self.rejected = 0
+        self._slots = BoundedSemaphore(max(workers, 1) + max(queue_size, 0))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn keeps the workers free of the parent's threads and db connections
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def _acquire_slot(self, wait: bool = False) -> None:
+        if not (self._slots.acquire(timeout=self.timeout) if wait else self._slots.acquire(blocking=False)):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy. Please try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+
+    @staticmethod
+    def _timed_out() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service timed out. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    def _submit(self, fn, *args) -> Future:
+        """Submits a call that already holds a slot; the slot is released when the call finishes"""
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        self._acquire_slot()
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise self._timed_out()
+
+    async def _run_async(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        self._acquire_slot()
+        future = self._submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out()
+
+    def hash(self, password: str) -> str:
+        hashed = self._run(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())
+        return hashed.decode("utf-8")
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        """Hashes a batch of passwords with at most batch_concurrency of them in the pool at once"""
+        if self.workers <= 0:
+            return [bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8") for password in passwords]
+
+        hashed, pending = [], deque()
+        try:
+            for password in passwords:
+                if len(pending) >= self.batch_concurrency:
+                    hashed.append(self._batch_result(pending.popleft()))
+                self._acquire_slot(wait=True)
+                pending.append(self._submit(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt()))
+            while pending:
+                hashed.append(self._batch_result(pending.popleft()))
+        finally:
+            for future in pending:
+                future.cancel()
+        return hashed
+
+    def _batch_result(self, future: Future) -> str:
+        try:
+            return future.result(timeout=self.timeout).decode("utf-8")
+        except FutureTimeoutError:
+            raise self._timed_out()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        try:
+            return self._run(bcrypt.checkpw, plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+        except ValueError:
+            return False
+
+    async def hash_async(self, password: str) -> str:
+        hashed = await self._run_async(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())
+        return hashed.decode("utf-8")
+
+    async def hash_many_async(self, passwords: list[str]) -> list[str]:
+        """hash_many without holding a request thread; only waiting for a free slot uses the threadpool"""
+        if self.workers <= 0:
+            return await run_in_threadpool(self.hash_many, passwords)
+
+        hashed, pending = [], deque()
+        try:
+            for password in passwords:
+                if len(pending) >= self.batch_concurrency:
+                    hashed.append(await self._batch_result_async(pending.popleft()))
+                if not self._slots.acquire(blocking=False):
+                    await run_in_threadpool(self._acquire_slot, True)
+                pending.append(self._submit(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt()))
+            while pending:
+                hashed.append(await self._batch_result_async(pending.popleft()))
+        finally:
+            for future in pending:
+                future.cancel()
+        return hashed
+
+    async def _batch_result_async(self, future: Future) -> str:
+        try:
+            return (await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)).decode("utf-8")
+        except asyncio.TimeoutError:
+            raise self._timed_out()
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        try:
+            return await self._run_async(bcrypt.checkpw, plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+        except ValueError:
+            return False
+
+    def render(self, name: str) -> list[str]:
+        """Returns the pool counters in the Prometheus text format"""
+        in_use = max(self.workers, 1) + max(self.queue_size, 0) - self._slots._value
+        return [
+            *prometheus_metric(f"{name}_in_use", "gauge", "bcrypt calls running or queued.", [({}, in_use)]),
+            *prometheus_metric(f"{name}_rejected_total", "counter", "bcrypt calls rejected with a 503 because the pool was full.", [({}, self.rejected)]),
+        ]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_pool = PasswordPool(
+    workers=int(settings.PASSWORD_HASH_WORKERS),
+    queue_size=int(settings.PASSWORD_HASH_QUEUE_SIZE),
+    timeout=float(settings.PASSWORD_HASH_TIMEOUT),
+)
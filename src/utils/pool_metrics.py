@@ -0,0 +1,161 @@
+from threading import Lock
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.utils.metrics import Histogram, prometheus_histogram, prometheus_metric
+
+
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CONNECTION_AGE_BUCKETS = (1, 10, 60, 300, 900, 1800, 3600, 7200)
+
+
+class PoolMetrics:
+    """Counters and histograms for one engine's connection pool, fed by SQLAlchemy pool events.
+
+    The checkout wait is measured by the instrumented pool classes below, which
+    time the pool's own `_do_get` (waiting for a free slot, or opening an
+    overflow connection) and hand the figure to the checkout event.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkout_wait = Histogram(CHECKOUT_WAIT_BUCKETS)
+        self.connection_age = Histogram(CONNECTION_AGE_BUCKETS)
+        self.connects = 0
+        self.overflow_connects = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self._engine = None
+        self._lock = Lock()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def attach(self, engine, pre_ping: str = "never", pre_ping_idle: float = 0) -> None:
+        """Listens to the pool events of `engine`, and pings idle connections when pre_ping is "idle" """
+        self._engine = engine
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            connection_record.info["connected_at"] = time.monotonic()
+            self._count("connects")
+            if engine.pool.overflow() > 0:
+                self._count("overflow_connects")
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            now = time.monotonic()
+            self._count("checkouts")
+            self.checkout_wait.observe(connection_record.info.pop("checkout_wait", 0.0))
+            self.connection_age.observe(now - connection_record.info.get("connected_at", now))
+
+            idle_since = connection_record.info.get("checked_in_at")
+            if pre_ping == "idle" and idle_since is not None and now - idle_since > pre_ping_idle:
+                self._count("pings")
+                try:
+                    alive = engine.dialect.do_ping(dbapi_connection)
+                except engine.dialect.loaded_dbapi.Error as e:
+                    # a dead connection raises instead of returning False, as pool_pre_ping handles it
+                    if not engine.dialect.is_disconnect(e, dbapi_connection, None):
+                        raise
+                    alive = False
+                if not alive:
+                    self._count("ping_failures")
+                    # the pool discards this connection and retries the checkout with a fresh one
+                    raise exc.DisconnectionError("connection failed the idle pre-ping")
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            connection_record.info["checked_in_at"] = time.monotonic()
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self._count("invalidations")
+
+    def snapshot(self) -> dict:
+        # read through the engine, since dispose() swaps in a new pool
+        pool = self._engine.pool if self._engine is not None else None
+        usage = {}
+        if isinstance(pool, QueuePool):
+            usage = {
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            }
+        with self._lock:
+            counters = {
+                "connects": self.connects,
+                "overflow_connects": self.overflow_connects,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "invalidations": self.invalidations,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+            }
+        return {
+            "name": self.name,
+            "pool": usage,
+            **counters,
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+            "connection_age_seconds": self.connection_age.snapshot(),
+        }
+
+
+# PoolMetrics keyed by the engine's pool_logging_name, which SQLAlchemy carries over when it recreates a pool
+pool_metrics: dict[str, PoolMetrics] = {}
+
+POOL_COUNTERS = ("connects", "overflow_connects", "checkouts", "timeouts", "invalidations", "pings", "ping_failures")
+POOL_GAUGES = ("size", "in_use", "idle", "overflow")
+
+def render_pool_metrics() -> list[str]:
+    """Returns the metrics of every pool in the Prometheus text format"""
+    snapshots = [pool_metrics[name].snapshot() for name in sorted(pool_metrics)]
+    lines = []
+    for gauge in POOL_GAUGES:
+        lines += prometheus_metric(f"db_pool_{gauge}", "gauge", f"Connection pool {gauge.replace('_', ' ')}.",
+                                   [({"pool": s["name"]}, s["pool"][gauge]) for s in snapshots if s["pool"]])
+    for counter in POOL_COUNTERS:
+        lines += prometheus_metric(f"db_pool_{counter}_total", "counter", f"Connection pool {counter.replace('_', ' ')}.",
+                                   [({"pool": s["name"]}, s[counter]) for s in snapshots])
+    lines += prometheus_histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+                                  [({"pool": s["name"]}, s["checkout_wait_seconds"]) for s in snapshots])
+    lines += prometheus_histogram("db_pool_connection_age_seconds", "Age of connections when checked out.",
+                                  [({"pool": s["name"]}, s["connection_age_seconds"]) for s in snapshots])
+    return lines
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            metrics = pool_metrics.get(self._orig_logging_name)
+            if metrics is not None:
+                metrics._count("timeouts")
+            raise
+        record.info["checkout_wait"] = time.monotonic() - started
+        return record
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, name: str, pre_ping: str = "never", pre_ping_idle: float = 0) -> PoolMetrics:
+    metrics = PoolMetrics(name)
+    metrics.attach(getattr(engine, "sync_engine", engine), pre_ping, pre_ping_idle)
+    pool_metrics[name] = metrics
+    return metrics
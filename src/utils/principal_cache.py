@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.config.config import settings
+from src.models.user import User
+from src.utils.metrics import prometheus_metric
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Detached snapshot of the authenticated user, safe to share between requests"""
+    id: int
+    username: str
+    email: str
+    phone_no: str
+    role: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            phone_no=user.phone_no,
+            role=user.role,
+            is_active=bool(user.is_active),
+        )
+
+
+class PrincipalCache:
+    """Bounded LRU of principals keyed by user id, each entry living for `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple[float, Principal]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, principal: Principal) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def render(self, name: str) -> list[str]:
+        """Returns the cache counters in the Prometheus text format"""
+        stats = self.stats()
+        return [
+            *prometheus_metric(f"{name}_entries", "gauge", "Principals in the cache.", [({}, stats["size"])]),
+            *prometheus_metric(f"{name}_hits_total", "counter", "Authenticated requests answered from the cache.", [({}, stats["hits"])]),
+            *prometheus_metric(f"{name}_misses_total", "counter", "Authenticated requests that loaded the user.", [({}, stats["misses"])]),
+        ]
+
+
+principal_cache = PrincipalCache(
+    maxsize=int(settings.PRINCIPAL_CACHE_SIZE),
+    ttl=float(settings.PRINCIPAL_CACHE_TTL),
+)
+
+
+_PENDING_KEY = "principal_invalidations"
+# pending in place of a user id when any user may have changed
+_ALL_USERS = "*"
+
+
+def _mark_stale(connection, target: User) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target: User):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.is_active.history.has_changes():
+        _mark_stale(connection, target)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target: User):
+    _mark_stale(connection, target)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_user_write(orm_execute_state):
+    # update(User) and delete(User) run on a session skip the hooks above, and may match any user.
+    # Writes run on a Connection bypass the session altogether; their users are only refreshed
+    # once their entries expire, after PRINCIPAL_CACHE_TTL seconds.
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is inspect(User):
+        orm_execute_state.session.info.setdefault(_PENDING_KEY, set()).add(_ALL_USERS)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    pending = session.info.pop(_PENDING_KEY, ())
+    if _ALL_USERS in pending:
+        principal_cache.clear()
+        return
+    for user_id in pending:
+        principal_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,103 @@
+from contextvars import ContextVar
+from typing import Optional
+import hashlib
+import hmac
+import math
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.config.config import settings
+
+
+class ClientWrites:
+    """What one request knows about its client's writes"""
+    __slots__ = ("written_at", "wrote")
+
+    def __init__(self, written_at: Optional[float]):
+        self.written_at = written_at
+        self.wrote = False
+
+
+# set per request by the middleware; the threadpool and the async driver's greenlets see the same object
+current_client_writes: ContextVar[Optional[ClientWrites]] = ContextVar("current_client_writes", default=None)
+
+
+class RecentWrites:
+    """Keeps a client's reads on the primary for `window` seconds after it committed a write.
+
+    The time of the client's last write travels with the client in a signed
+    cookie, so its next request sees it on whichever worker it lands on. A
+    missing, expired or tampered cookie lets the reads go to a replica.
+    """
+
+    cookie = "last_write"
+
+    def __init__(self, window: float, secret: str):
+        self.window = window
+        self._secret = secret.encode("utf-8")
+
+    def _signature(self, value: str) -> str:
+        return hmac.new(self._secret, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def encode(self, written_at: float) -> str:
+        value = f"{written_at:.3f}"
+        return f"{value}.{self._signature(value)}"
+
+    def decode(self, cookie: Optional[str]) -> Optional[float]:
+        """Returns the write time in a cookie made by encode, or None"""
+        value, _, signature = (cookie or "").rpartition(".")
+        if not value or not hmac.compare_digest(signature, self._signature(value)):
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+    def mark(self) -> None:
+        """Notes that the current request committed a write"""
+        writes = current_client_writes.get()
+        if writes is not None:
+            writes.wrote = True
+
+    def recent(self) -> bool:
+        """Whether the current request, or its client within `window` seconds, wrote"""
+        writes = current_client_writes.get()
+        if writes is None or self.window <= 0:
+            return False
+        return writes.wrote or (writes.written_at is not None and time.time() - writes.written_at < self.window)
+
+
+class RecentWritesMiddleware:
+    """Reads the client's last write from its cookie and renews the cookie when the request wrote"""
+
+    def __init__(self, app: ASGIApp, recent_writes: RecentWrites):
+        self.app = app
+        self.recent_writes = recent_writes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.recent_writes.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        cookies = cookie_parser(Headers(scope=scope).get("cookie", ""))
+        writes = ClientWrites(self.recent_writes.decode(cookies.get(self.recent_writes.cookie)))
+        token = current_client_writes.set(writes)
+
+        async def send_wrapper(message: Message) -> None:
+            # a write made after the response started, e.g. while streaming, cannot set the cookie anymore
+            if message["type"] == "http.response.start" and writes.wrote:
+                MutableHeaders(scope=message).append("set-cookie", (
+                    f"{self.recent_writes.cookie}={self.recent_writes.encode(time.time())}; "
+                    f"Max-Age={math.ceil(self.recent_writes.window)}; Path=/; HttpOnly; SameSite=Lax"
+                ))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_client_writes.reset(token)
+
+
+recent_writes = RecentWrites(window=float(settings.READ_YOUR_WRITES_WINDOW), secret=settings.JWT_SECRET_KEY or "")
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import secrets
+import time
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from src.models.refresh_family import RefreshTokenFamily
+from src.utils.metrics import prometheus_metric
+
+
+class RefreshTokenStore:
+    """Tracks the single live refresh token of every login session in the refresh_token_families table.
+
+    Each login starts a token family; every refresh rotates the family to a
+    new `jti`. Presenting an older `jti` of a family means the token was
+    replayed, so the whole family is revoked and the session must log in
+    again. The rotation is one conditional UPDATE, so two workers, or two
+    requests racing with the same token, can never both rotate a family,
+    and a restart loses nothing. Only the family id, current jti and expiry
+    are kept per session.
+    """
+
+    def __init__(self, purge_interval: float = 60):
+        self.purge_interval = purge_interval
+        self.reuse_detected = 0
+        self._next_purge = 0.0
+
+    def render(self, name: str) -> list[str]:
+        """Returns the refresh token counters in the Prometheus text format"""
+        return prometheus_metric(f"{name}_reuse_detected_total", "counter", "Replayed refresh tokens whose family was revoked.", [({}, self.reuse_detected)])
+
+    @staticmethod
+    def _new_id() -> str:
+        return secrets.token_urlsafe(12)
+
+    def _start_statements(self, user_id: int, ttl: float) -> tuple[str, str, list]:
+        family, jti = self._new_id(), self._new_id()
+        now = datetime.now(timezone.utc)
+        statements = [insert(RefreshTokenFamily).values(family=family, user_id=user_id, jti=jti, expires_at=now + timedelta(seconds=ttl))]
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            statements.insert(0, delete(RefreshTokenFamily).where(RefreshTokenFamily.expires_at <= now))
+        return family, jti, statements
+
+    @staticmethod
+    def _rotate_statement(family: str, jti: str, new_jti: str, ttl: float):
+        now = datetime.now(timezone.utc)
+        return (
+            update(RefreshTokenFamily)
+            .where(RefreshTokenFamily.family == family, RefreshTokenFamily.jti == jti, RefreshTokenFamily.expires_at > now)
+            .values(jti=new_jti, expires_at=now + timedelta(seconds=ttl))
+        )
+
+    @staticmethod
+    def _revoke_live_statement(family: str):
+        # a family that is still live but did not match the jti was replayed; expired ones are left to the purge
+        return delete(RefreshTokenFamily).where(RefreshTokenFamily.family == family, RefreshTokenFamily.expires_at > datetime.now(timezone.utc))
+
+    def start(self, db: Session, user_id: int, ttl: float) -> tuple[str, str]:
+        """Opens a new token family and returns its (family, jti)"""
+        family, jti, statements = self._start_statements(user_id, ttl)
+        try:
+            for statement in statements:
+                db.execute(statement)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return family, jti
+
+    def rotate(self, db: Session, family: str, jti: str, ttl: float) -> Optional[str]:
+        """Swaps the presented jti for a new one, or revokes the family on reuse"""
+        new_jti = self._new_id()
+        try:
+            rotated = db.execute(self._rotate_statement(family, jti, new_jti, ttl)).rowcount
+            if not rotated and db.execute(self._revoke_live_statement(family)).rowcount:
+                self.reuse_detected += 1
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return new_jti if rotated else None
+
+    def revoke(self, db: Session, family: str) -> None:
+        db.execute(delete(RefreshTokenFamily).where(RefreshTokenFamily.family == family))
+        db.commit()
+
+    async def start_async(self, db: AsyncSession, user_id: int, ttl: float) -> tuple[str, str]:
+        family, jti, statements = self._start_statements(user_id, ttl)
+        try:
+            for statement in statements:
+                await db.execute(statement)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return family, jti
+
+    async def rotate_async(self, db: AsyncSession, family: str, jti: str, ttl: float) -> Optional[str]:
+        new_jti = self._new_id()
+        try:
+            rotated = (await db.execute(self._rotate_statement(family, jti, new_jti, ttl))).rowcount
+            if not rotated and (await db.execute(self._revoke_live_statement(family))).rowcount:
+                self.reuse_detected += 1
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        return new_jti if rotated else None
+
+    async def revoke_async(self, db: AsyncSession, family: str) -> None:
+        await db.execute(delete(RefreshTokenFamily).where(RefreshTokenFamily.family == family))
+        await db.commit()
+
+
+refresh_store = RefreshTokenStore()
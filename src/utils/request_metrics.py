@@ -0,0 +1,155 @@
+from contextvars import ContextVar
+from typing import Optional
+import logging
+import time
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.utils.metrics import Histogram, prometheus_histogram, prometheus_metric
+
+logger = logging.getLogger(__name__)
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUERY_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+# requests that matched no route share one label, so scanners cannot create a series per path
+UNMATCHED_ROUTE = "unmatched"
+HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+class RequestQueries:
+    """The SQL statements run on behalf of one request"""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# set per request by the middleware; the threadpool and the async driver's greenlets see the same object
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_queries.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = current_queries.get()
+    started = conn.info.get("query_started")
+    if queries is not None and started:
+        queries.count += 1
+        queries.seconds += time.perf_counter() - started.pop()
+
+def handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("query_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+def track_queries(engine) -> None:
+    """Counts and times the statements `engine` runs for the request in progress"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries", "query_seconds", "responses", "over_budget")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_seconds = Histogram(QUERY_TIME_BUCKETS)
+        self.responses: dict[int, int] = {}
+        self.over_budget = 0
+
+
+class RequestMetrics:
+    """Latency, status codes and SQL statements per route template, with a per-request query budget.
+
+    A request that runs more than `query_budget` statements is counted and
+    printed with its route, which is how an N+1 loop shows up. Routes are
+    keyed by their path template, not the raw path, so /order/{order_id} is
+    one series however many orders there are.
+    """
+
+    def __init__(self, query_budget: int):
+        self.query_budget = query_budget
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+        # by method, the route of a request is only known once the router has matched it
+        self.in_flight: dict[str, int] = {}
+
+    def route(self, method: str, path: str) -> RouteMetrics:
+        key = (method, path)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes.setdefault(key, RouteMetrics())
+        return metrics
+
+    def observe(self, method: str, path: str, status_code: int, seconds: float, queries: RequestQueries) -> None:
+        metrics = self.route(method, path)
+        metrics.latency.observe(seconds)
+        metrics.queries.observe(queries.count)
+        metrics.query_seconds.observe(queries.seconds)
+        metrics.responses[status_code] = metrics.responses.get(status_code, 0) + 1
+        if queries.count > self.query_budget:
+            metrics.over_budget += 1
+            logger.warning("query budget exceeded: %s %s ran %d SQL statements, budget is %d", method, path, queries.count, self.query_budget)
+
+    def render(self) -> list[str]:
+        """Returns the request metrics in the Prometheus text format"""
+        routes = sorted(self.routes.items())
+        labelled = [({"method": method, "route": path}, metrics) for (method, path), metrics in routes]
+        return [
+            *prometheus_histogram("http_request_duration_seconds", "Request latency by route.",
+                                  [(labels, metrics.latency.snapshot()) for labels, metrics in labelled]),
+            *prometheus_metric("http_requests_in_progress", "gauge", "Requests in progress by method.",
+                               [({"method": method}, count) for method, count in sorted(self.in_flight.items())]),
+            *prometheus_metric("http_responses_total", "counter", "Responses by route and status code.",
+                               [({**labels, "status": status_code}, count) for labels, metrics in labelled
+                                for status_code, count in sorted(metrics.responses.items())]),
+            *prometheus_histogram("http_request_sql_statements", "SQL statements run per request by route.",
+                                  [(labels, metrics.queries.snapshot()) for labels, metrics in labelled]),
+            *prometheus_histogram("http_request_sql_duration_seconds", "Time spent in SQL statements per request by route.",
+                                  [(labels, metrics.query_seconds.snapshot()) for labels, metrics in labelled]),
+            *prometheus_metric("http_request_sql_budget_exceeded_total", "counter", "Requests that ran more SQL statements than the query budget.",
+                               [(labels, metrics.over_budget) for labels, metrics in labelled]),
+        ]
+
+
+class RequestMetricsMiddleware:
+    """Records every HTTP request in RequestMetrics once its response has been sent"""
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        status_code = 500
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+        self.metrics.in_flight[method] = self.metrics.in_flight.get(method, 0) + 1
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.in_flight[method] -= 1
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+            self.metrics.observe(method, path, status_code, time.perf_counter() - started, queries)
+            current_queries.reset(token)
@@ -1,6 +1,14 @@
 from fastapi.responses import JSONResponse
 from typing import Any, Dict, Optional
 
+try:
+    from fastapi.responses import ORJSONResponse
+    import orjson  # noqa: F401
+    FastJSONResponse = ORJSONResponse
+except ImportError:
+    # orjson is optional, the stdlib encoder is used without it
+    FastJSONResponse = JSONResponse
+
 
 def success_response(status_code: int, message: str, data: Optional[Dict]=None):
     """Returnsa JSON responce for successful operations"""
@@ -9,15 +17,15 @@ def success_response(status_code: int, message: str, data: Optional[Dict]=None):
     "message" : message,
     "data": data or {}
     }
-    return JSONResponse(status_code=status_code, content=response_data)
+    return FastJSONResponse(status_code=status_code, content=response_data)
 
 
 
-def failure_response(status_code: int, message: str, data: Optional[Dict]=None):
+def failure_response(status_code: int, message: str, data: Optional[Dict]=None, headers: Optional[Dict[str, str]]=None):
     """Returnsa JSON responce for failed operations"""
     response_data={
     "status": "failure",
     "message" : message,
     "data": data or {}
     }
-    return JSONResponse(status_code=status_code, content=response_data)
\ No newline at end of file
+    return FastJSONResponse(status_code=status_code, content=response_data, headers=headers)
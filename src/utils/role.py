@@ -1,19 +1,27 @@
 from fastapi import Depends, HTTPException, status, Response, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from  fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from src.config.database import get_db
+from src.config.database import get_session, replica_reads, run_db
 from src.models.user import User
-from src.config.config import settings
+from src.utils.principal_cache import Principal, principal_cache
+from src.utils.token_cache import decode_token
 import jwt
 
 
 security = HTTPBearer()
 
 
+def load_user(db: Session, user_id: int):
+    return db.scalars(select(User).where(User.id == user_id)).first()
 
-def get_current_user(request:Request, credentials: HTTPAuthorizationCredentials= Depends(security), db: Session = Depends(get_db)) -> User:
+async def load_user_async(db, user_id: int):
+    return (await db.scalars(select(User).where(User.id == user_id))).first()
 
-    """verifies the validity of the token of current user and returns the user object"""
+
+async def get_current_user(request:Request, credentials: HTTPAuthorizationCredentials= Depends(security), db: Session = Depends(get_session)) -> Principal:
+
+    """verifies the validity of the token of current user and returns the cached principal of the user"""
     try:
         token = credentials.credentials
         if token is None:
@@ -21,7 +29,13 @@ def get_current_user(request:Request, credentials: HTTPAuthorizationCredentials=
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Authorization token is missing"
             )
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        payload = decode_token(token)
+        # a refresh token is signed with the same key but must only ever reach /refresh
+        if payload.get("type") != "access":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token type"
+            )
         user_id = payload.get("id")
         if user_id is None:
             raise HTTPException(
@@ -29,14 +43,25 @@ def get_current_user(request:Request, credentials: HTTPAuthorizationCredentials=
                 detail="Invalid token: user id not found"
             )
 
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            with replica_reads(db):
+                user = await run_db(load_user, load_user_async, db, user_id)
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            principal = Principal.from_user(user)
+            principal_cache.put(principal)
+
+        if not principal.is_active:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="User account is inactive"
             )
 
-        return user
+        return principal
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,7 +72,7 @@ def get_current_user(request:Request, credentials: HTTPAuthorizationCredentials=
 
 def role_required(allowed_roles: list):
     """Dependency to state which roles are allowed to access a particular route"""
-    def role_checker(current_user: User = Depends(get_current_user)):
+    async def role_checker(current_user: Principal = Depends(get_current_user)):
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
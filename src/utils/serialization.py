@@ -0,0 +1,26 @@
+"""Single-pass JSON serialization of order responses.
+
+Returning ORM objects through `response_model` makes FastAPI validate them,
+dump them to Python primitives and then run the stdlib encoder over the
+result. The cached TypeAdapters below validate straight from the ORM
+attributes and write JSON bytes inside pydantic-core instead.
+`python -m loadtest serialize` compares the cost of both paths.
+"""
+from typing import Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from src.schema.order_schema import OrderPage, OrderResponse, OrderWithCustomerPage, OrderWithCustomerResponse
+
+
+ORDER_LIST = TypeAdapter(list[OrderResponse])
+ORDER_PAGE = TypeAdapter(OrderPage)
+ORDER_WITH_CUSTOMER = TypeAdapter(OrderWithCustomerResponse)
+ORDER_WITH_CUSTOMER_PAGE = TypeAdapter(OrderWithCustomerPage)
+
+
+def model_response(adapter: TypeAdapter, value, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Validates `value` from attributes and returns it as JSON bytes, skipping the response_model round trip"""
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
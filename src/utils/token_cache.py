@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from threading import Lock
+from types import MappingProxyType
+from typing import Mapping, Optional
+import hashlib
+import time
+
+from src.config.config import settings
+from src.utils.metrics import prometheus_metric
+import jwt
+
+
+class TokenCache:
+    """Bounded LRU of already verified JWT payloads, keyed by a digest of the raw token.
+
+    Every entry expires at the token's own `exp` claim, so a hit can skip
+    signature verification without ever outliving the token. Payloads are
+    handed out read-only, since every request with the token shares them.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple[float, Mapping]]" = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Mapping]:
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, payload: Mapping) -> None:
+        expires = payload.get("exp")
+        if self.maxsize <= 0 or expires is None:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (float(expires), MappingProxyType(dict(payload)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def render(self, name: str) -> list[str]:
+        """Returns the cache counters in the Prometheus text format"""
+        stats = self.stats()
+        return [
+            *prometheus_metric(f"{name}_entries", "gauge", "Verified tokens in the cache.", [({}, stats["size"])]),
+            *prometheus_metric(f"{name}_hits_total", "counter", "Tokens answered from the cache.", [({}, stats["hits"])]),
+            *prometheus_metric(f"{name}_misses_total", "counter", "Tokens whose signature was checked.", [({}, stats["misses"])]),
+        ]
+
+
+token_cache = TokenCache(maxsize=int(settings.TOKEN_CACHE_SIZE))
+
+
+def decode_token(token: str) -> Mapping:
+    """Returns the verified, read-only payload of a token, only checking the signature on a cache miss"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = MappingProxyType(jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]))
+        token_cache.put(token, payload)
+    return payload
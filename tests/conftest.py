@@ -0,0 +1,122 @@
+"""Test settings and fixtures.
+
+The app reads its settings when it is imported, so the environment is set
+here before anything imports `src`. Tests run against a fresh SQLite file,
+or against TEST_DATABASE_URL when it is set; they never touch DATABASE_URL.
+"""
+from contextlib import contextmanager
+from typing import Iterator
+import os
+import tempfile
+import uuid
+
+import pytest
+
+TEST_DIRECTORY = tempfile.mkdtemp(prefix="pizza-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", f"sqlite:///{TEST_DIRECTORY}/test.db")
+os.environ["DATABASE_ASYNC"] = "false"
+os.environ["ASYNC_DATABASE_URL"] = ""
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["DB_CREATE_SCHEMA"] = "false"
+# the suite signs many users up from one client, which the login rate limits would shed
+os.environ["ADMISSION_CONTROL"] = "false"
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("JWT_ACCESS_TOKEN_EXPIRES", "30")
+os.environ.setdefault("JWT_REFRESH_TOKEN_EXPIRES", "600")
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+
+@pytest.fixture(scope="session")
+def engine():
+    import src  # noqa: F401, registers every model
+    from src.config.database import Base, get_engine
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        # pysqlite only opens a transaction before DML, so releasing a test's first savepoint
+        # would commit it; let SQLAlchemy emit BEGIN itself, as its documentation recommends
+        @event.listens_for(engine, "connect")
+        def no_implicit_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+        engine.dispose()
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def connection(engine) -> Iterator[Connection]:
+    """A connection in a transaction that is rolled back after the test"""
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            yield connection
+        finally:
+            transaction.rollback()
+
+
+@pytest.fixture
+def session_on(connection):
+    """Opens sessions whose commits only release a savepoint of the test's transaction"""
+    sessions = []
+
+    def open_session() -> Session:
+        sessions.append(Session(bind=connection, join_transaction_mode="create_savepoint"))
+        return sessions[-1]
+
+    yield open_session
+    # each session holds a savepoint nested in the previous one's
+    for session in reversed(sessions):
+        session.close()
+
+
+@contextmanager
+def recorded_statements(connection: Connection) -> Iterator[list]:
+    """Collects the (statement, parameters) sent on `connection` inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def record_statements():
+    return recorded_statements
+
+
+@pytest.fixture(scope="session")
+def client(engine):
+    from fastapi.testclient import TestClient
+    import src
+    with TestClient(src.app) as client:
+        yield client
+
+
+@pytest.fixture
+def signed_up(client):
+    """Signs a new user up and returns (email, password, login response data)"""
+
+    def sign_up(role: str = "user") -> dict:
+        email = f"user-{uuid.uuid4().hex[:12]}@example.com"
+        password = "test-password"
+        response = client.post("/api/v1/auth/signup", json={
+            "username": email.split("@")[0], "email": email, "phone": "0123456789", "password": password, "role": role,
+        })
+        assert response.status_code == 201, response.text
+        response = client.post("/api/v1/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"email": email, "password": password, **response.json()["data"]["data"]}
+
+    return sign_up
@@ -0,0 +1,120 @@
+import pytest
+
+from src.utils import admission as admission_module
+from src.utils.admission import AdmissionControlMiddleware, AdmissionController, AdmissionPolicy
+
+
+def scope(peer: str, *forwarded: str) -> dict:
+    return {"client": (peer, 51234), "headers": [(b"x-forwarded-for", value.encode("latin-1")) for value in forwarded]}
+
+
+@pytest.fixture
+def middleware():
+    return AdmissionControlMiddleware(None, AdmissionController([], max_in_flight=10), trusted_proxies=["10.0.0.0/8", " 192.168.1.5 ", ""])
+
+
+def test_direct_clients_key_on_the_peer(middleware):
+    # X-Forwarded-For from an untrusted peer is ignored, so it cannot dodge its own bucket
+    assert middleware.client_of(scope("203.0.113.9", "198.51.100.1")) == "203.0.113.9"
+
+
+def test_clients_behind_trusted_proxies_key_on_the_forwarded_address(middleware):
+    assert middleware.client_of(scope("10.1.2.3", "198.51.100.7")) == "198.51.100.7"
+    # the left-most entry is chosen by the client; the right-most untrusted one was seen by the proxy
+    assert middleware.client_of(scope("10.1.2.3", "1.1.1.1, 198.51.100.7, 192.168.1.5")) == "198.51.100.7"
+    assert middleware.client_of(scope("192.168.1.5", "1.1.1.1", "198.51.100.7")) == "198.51.100.7"
+
+
+def test_trusted_proxy_without_forwarded_header_is_the_client(middleware):
+    assert middleware.client_of(scope("10.1.2.3")) == "10.1.2.3"
+
+
+def test_without_trusted_proxies_the_header_is_ignored():
+    middleware = AdmissionControlMiddleware(None, AdmissionController([], max_in_flight=10))
+    assert middleware.client_of(scope("10.1.2.3", "198.51.100.7")) == "10.1.2.3"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock that only moves when the test advances it"""
+    now = [1000.0]
+    monkeypatch.setattr(admission_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_empty_token_bucket_is_a_429_with_retry_after(clock):
+    policy = AdmissionPolicy(name="limited", path="/limited", rate=2, burst=2)
+    controller = AdmissionController([policy], max_in_flight=10)
+    assert controller.admit(policy, "a") is None
+    assert controller.admit(policy, "b") is None
+    assert controller.admit(policy, "c") == (429, "rate", 0.5)
+
+    clock[0] += 0.5
+    assert controller.admit(policy, "c") is None
+
+
+def test_client_bucket_only_limits_that_client(clock):
+    policy = AdmissionPolicy(name="login", path="/login", client_rate=1, client_burst=1)
+    controller = AdmissionController([policy], max_in_flight=10)
+    assert controller.admit(policy, "a") is None
+    assert controller.admit(policy, "a") == (429, "client_rate", 1.0)
+    assert controller.admit(policy, "b") is None
+
+
+def test_route_concurrency_limit_is_a_503():
+    policy = AdmissionPolicy(name="import", path="/import", max_concurrency=1)
+    controller = AdmissionController([policy], max_in_flight=10)
+    controller.acquire(policy)
+    assert controller.admit(policy, "a") == (503, "concurrency", 1.0)
+    controller.release(policy)
+    assert controller.admit(policy, "a") is None
+
+
+def test_low_priority_is_shed_before_critical():
+    policies = {priority: AdmissionPolicy(name=priority, path=f"/{priority}", priority=priority) for priority in ("low", "normal", "critical")}
+    controller = AdmissionController(list(policies.values()), max_in_flight=10)
+
+    def shed() -> list[str]:
+        return [priority for priority, policy in policies.items() if controller.admit(policy, "a") is not None]
+
+    for in_flight, expected in ((5, []), (6, ["low"]), (9, ["low", "normal"]), (10, ["low", "normal", "critical"])):
+        while controller.in_flight < in_flight:
+            controller.acquire(policies["critical"])
+        assert shed() == expected
+    assert controller.admit(policies["low"], "a") == (503, "overloaded", 1.0)
+
+
+def test_long_lived_streams_do_not_count_towards_in_flight():
+    stream = AdmissionPolicy(name="events", path="/events", priority="critical", max_concurrency=3, long_lived=True)
+    order = AdmissionPolicy(name="order", path="/order")
+    controller = AdmissionController([stream, order], max_in_flight=2)
+    for _ in range(3):
+        assert controller.admit(stream, "a") is None
+        controller.acquire(stream)
+    assert controller.in_flight == 0
+    assert controller.admit(order, "a") is None
+    # still bounded by its own concurrency limit
+    assert controller.admit(stream, "a") == (503, "concurrency", 1.0)
+
+    # and an overloaded worker keeps serving open streams
+    controller.acquire(order)
+    controller.acquire(order)
+    assert controller.admit(order, "a") == (503, "overloaded", 1.0)
+    controller.release(stream)
+    assert controller.admit(stream, "a") is None
+
+
+def test_middleware_sheds_with_retry_after(clock):
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    policy = AdmissionPolicy(name="limited", path="/limited", rate=0.25, burst=1)
+    app = Starlette(routes=[Route("/limited", lambda request: PlainTextResponse("ok"))])
+    app.add_middleware(AdmissionControlMiddleware, controller=AdmissionController([policy], max_in_flight=10))
+    client = TestClient(app)
+    assert client.get("/limited").status_code == 200
+    shed = client.get("/limited")
+    assert shed.status_code == 429
+    assert shed.headers["Retry-After"] == "4"
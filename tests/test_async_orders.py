@@ -0,0 +1,87 @@
+"""The order routes on the AsyncSession path, as they run with DATABASE_ASYNC enabled"""
+import uuid
+
+import pytest
+
+
+def bearer(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+
+def line(pizza_type: str = "cheese", quantity: int = 1) -> dict:
+    return {"size": "small", "quantity": quantity, "pizza_type": pizza_type, "toppings": False}
+
+
+@pytest.fixture
+def async_sessions(client, engine):
+    """Serves every route an AsyncSession on the test database, and records the sessions handed out"""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from src.config.database import RoutingSession, get_session, to_async_url
+
+    async_engine = create_async_engine(to_async_url(engine.url.render_as_string(hide_password=False)))
+    factory = async_sessionmaker(bind=async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False)
+    handed_out = []
+
+    async def get_async_session():
+        async with factory() as db:
+            handed_out.append(db)
+            yield db
+
+    client.app.dependency_overrides[get_session] = get_async_session
+    try:
+        yield handed_out
+    finally:
+        del client.app.dependency_overrides[get_session]
+        client.portal.call(async_engine.dispose)
+
+
+def test_order_life_cycle(client, signed_up, async_sessions):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    user, admin = signed_up(), signed_up("admin")
+    created = client.post("/api/v1/order/order", json=line(), headers=bearer(user))
+    assert created.status_code == 201, created.text
+    order = created.json()
+
+    read = client.get(f"/api/v1/order/order/{order['id']}", headers=bearer(user))
+    assert read.json()["id"] == order["id"]
+    assert client.get(
+        f"/api/v1/order/order/{order['id']}", headers={**bearer(user), "If-None-Match": read.headers["ETag"]}
+    ).status_code == 304
+
+    updated = client.patch(f"/api/v1/order/orders/{order['id']}/status", json={"new_status": "is_delivering"}, headers=bearer(admin))
+    assert updated.status_code == 200, updated.text
+    assert client.get(f"/api/v1/order/orders/{order['id']}/status", headers=bearer(user)).json()["order_status"] == "is_delivering"
+    assert client.get(
+        f"/api/v1/order/order/{order['id']}", headers={**bearer(user), "If-None-Match": read.headers["ETag"]}
+    ).status_code == 200
+
+    assert client.delete(f"/api/v1/order/order/{order['id']}", headers=bearer(user)).status_code == 200
+    assert client.get(f"/api/v1/order/order/{order['id']}", headers=bearer(user)).status_code == 404
+    assert async_sessions and all(isinstance(db, AsyncSession) for db in async_sessions)
+
+
+def test_pages_and_batches(client, signed_up, async_sessions):
+    user = signed_up()
+    batch = client.post("/api/v1/order/orders/batch", json={"orders": [line(), line("supreme"), line("meat")]}, headers=bearer(user))
+    assert batch.status_code == 201, batch.text
+    assert client.post("/api/v1/order/orders/batch", json={"orders": [line(), line("no-such-pizza")]}, headers=bearer(user)).status_code == 400
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/v1/order/orders", params={"limit": 2, **({"cursor": cursor} if cursor else {})}, headers=bearer(user)).json()
+        seen += [order["id"] for order in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [order["id"] for order in batch.json()]
+
+
+def test_idempotent_create(client, signed_up, async_sessions):
+    user, key = signed_up(), uuid.uuid4().hex
+    headers = {**bearer(user), "Idempotency-Key": key}
+    first = client.post("/api/v1/order/order", json=line(), headers=headers)
+    retry = client.post("/api/v1/order/order", json=line(), headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
@@ -0,0 +1,114 @@
+from sqlalchemy import update
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def refresh(client, refresh_token: str):
+    return client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_access_token_authenticates(client, signed_up):
+    user = signed_up()
+    assert client.get("/api/v1/order/orders", headers=bearer(user["access_token"])).status_code == 200
+
+
+def test_refresh_token_is_not_an_access_token(client, signed_up):
+    user = signed_up()
+    response = client.get("/api/v1/order/orders", headers=bearer(user["refresh_token"]))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid token type"
+
+
+def test_refresh_rotates_and_revokes_the_family_on_reuse(client, signed_up):
+    user = signed_up()
+    first = refresh(client, user["refresh_token"])
+    assert first.status_code == 200
+    rotated = first.json()["data"]["data"]
+    assert client.get("/api/v1/order/orders", headers=bearer(rotated["access_token"])).status_code == 200
+
+    # replaying the old token revokes the family, so the rotated token stops working as well
+    assert refresh(client, user["refresh_token"]).status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+
+
+def test_refresh_survives_a_restart(client, signed_up):
+    from src.utils.refresh_store import RefreshTokenStore
+    import src.service.auth_service as auth_service
+
+    user = signed_up()
+    # a fresh store is what another worker, or this one after a restart, has
+    original, auth_service.refresh_store = auth_service.refresh_store, RefreshTokenStore()
+    try:
+        assert refresh(client, user["refresh_token"]).status_code == 200
+    finally:
+        auth_service.refresh_store = original
+
+
+def test_inactive_user_cannot_refresh(client, signed_up, engine):
+    from src.models.user import User
+
+    user = signed_up()
+    with engine.begin() as connection:
+        connection.execute(update(User).where(User.email == user["email"]).values(is_active=False))
+    response = refresh(client, user["refresh_token"])
+    assert response.status_code == 403
+    assert response.json()["message"] == "User account is inactive"
+
+
+def test_refresh_uses_the_current_role(client, signed_up, engine):
+    from src.models.user import User
+
+    user = signed_up()
+    with engine.begin() as connection:
+        connection.execute(update(User).where(User.email == user["email"]).values(role="admin"))
+    assert refresh(client, user["refresh_token"]).json()["data"]["data"]["role"] == "admin"
+
+
+def test_login_releases_its_connection_while_bcrypt_runs(signed_up, engine, monkeypatch):
+    from sqlalchemy.orm import Session
+    from src.schema.login_schema import loginRequest
+    from src.service import auth_service
+    from src.service.auth_service import AuthService
+
+    user = signed_up()
+    checked_out = []
+
+    def verify(plain_password, hashed_password):
+        checked_out.append(engine.pool.checkedout())
+        return True
+
+    monkeypatch.setattr(auth_service, "verify_password", verify)
+    with Session(engine) as db:
+        login = AuthService.login(db, loginRequest(email=user["email"], password=user["password"]))
+    assert checked_out == [0]
+    assert login.email == user["email"]
+
+
+def test_async_login_releases_its_connection_while_bcrypt_runs(signed_up, engine, monkeypatch):
+    import asyncio
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from src.config.database import to_async_url
+    from src.schema.login_schema import loginRequest
+    from src.service import async_auth_service
+    from src.service.async_auth_service import AsyncAuthService
+
+    user = signed_up()
+    async_engine = create_async_engine(to_async_url(engine.url.render_as_string(hide_password=False)))
+    checked_out = []
+
+    async def verify_async(plain_password, hashed_password):
+        checked_out.append(async_engine.pool.checkedout())
+        return True
+
+    async def login():
+        try:
+            async with AsyncSession(async_engine) as db:
+                return await AsyncAuthService.login(db, loginRequest(email=user["email"], password=user["password"]))
+        finally:
+            await async_engine.dispose()
+
+    monkeypatch.setattr(async_auth_service.password_pool, "verify_async", verify_async)
+    assert asyncio.run(login()).email == user["email"]
+    assert checked_out == [0]
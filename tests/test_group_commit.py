@@ -0,0 +1,29 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from src.utils.group_commit import GroupCommitter
+
+request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.mark.parametrize("max_batch", [1, 10], ids=["full batch", "timer"])
+def test_batches_do_not_inherit_a_request_context(max_batch):
+    seen = []
+
+    async def flush(rows: list) -> list:
+        seen.append(request_id.get())
+        return rows
+
+    async def main():
+        committer = GroupCommitter(window=0.01, max_batch=max_batch, flush=flush)
+
+        async def request(name: str):
+            request_id.set(name)
+            return await committer.submit(name)
+
+        return await asyncio.gather(request("first"), request("second"))
+
+    assert asyncio.run(main()) == ["first", "second"]
+    assert seen and set(seen) == {None}
@@ -0,0 +1,80 @@
+import uuid
+
+from sqlalchemy import select, update
+
+
+def create(client, user, idempotency_key: str, quantity: int = 1):
+    return client.post(
+        "/api/v1/order/order",
+        json={"size": "small", "quantity": quantity, "pizza_type": "cheese", "toppings": False},
+        headers={"Authorization": f"Bearer {user['access_token']}", "Idempotency-Key": idempotency_key},
+    )
+
+
+def test_retry_replays_the_first_order(client, signed_up):
+    user, key = signed_up(), uuid.uuid4().hex
+    first = create(client, user, key)
+    assert first.status_code == 201
+    retry = create(client, user, key)
+    assert retry.status_code == 201
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert create(client, user, key, quantity=2).status_code == 422
+
+
+def test_retry_on_another_worker_replays_from_the_database(client, signed_up):
+    from src.utils.idempotency import IdempotencyStore
+    import src.routes.order_route as order_route
+
+    user, key = signed_up(), uuid.uuid4().hex
+    first = create(client, user, key)
+    # a fresh store is what another worker, or this one after a restart, has
+    original, order_route.order_idempotency = order_route.order_idempotency, IdempotencyStore(ttl=60)
+    try:
+        assert create(client, user, key).json()["id"] == first.json()["id"]
+    finally:
+        order_route.order_idempotency = original
+
+
+def test_expired_key_creates_a_new_order(client, signed_up, engine):
+    from datetime import datetime, timezone
+    from src.models.idempotency_key import IdempotencyKey
+
+    user, key = signed_up(), uuid.uuid4().hex
+    first = create(client, user, key)
+    with engine.begin() as connection:
+        connection.execute(update(IdempotencyKey).where(IdempotencyKey.key == key).values(expires_at=datetime.now(timezone.utc)))
+    second = create(client, user, key)
+    assert second.status_code == 201
+    assert second.json()["id"] != first.json()["id"]
+    assert "Idempotent-Replayed" not in second.headers
+
+
+def test_racing_workers_create_one_order(session_on, monkeypatch):
+    from src.models.idempotency_key import IdempotencyKey
+    from src.models.order import Order
+    from src.models.user import User
+    from src.schema.order_schema import OrderRequest
+    from src.service.order_service import OrderService
+
+    setup = session_on()
+    user = User(username="racer", email="racer@example.com", phone_no="0123456789", password="x")
+    setup.add(user)
+    setup.commit()
+    request = OrderRequest(size="small", quantity=1, pizza_type="cheese", toppings=False)
+
+    winner, replayed = OrderService.create_order_once(session_on(), request, user, "race", "fingerprint")
+    assert not replayed
+
+    # the loser looked the key up before the winner committed
+    lookup = OrderService.stored_order
+    misses = iter([True])
+    monkeypatch.setattr(OrderService, "stored_order", staticmethod(
+        lambda *args: None if next(misses, False) else lookup(*args)
+    ))
+    loser = session_on()
+    order, replayed = OrderService.create_order_once(loser, request, user, "race", "fingerprint")
+    assert replayed
+    assert order.id == winner.id
+    assert loser.scalars(select(Order).where(Order.user_id == user.id)).all() == [order]
+    assert len(loser.scalars(select(IdempotencyKey).where(IdempotencyKey.user_id == user.id)).all()) == 1
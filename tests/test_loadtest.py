@@ -0,0 +1,15 @@
+import pytest
+
+from loadtest.scenarios import SCENARIOS, Scenario
+
+
+def test_scenario_requires_a_user():
+    class NoUsers(Scenario):
+        pass
+
+    with pytest.raises(TypeError):
+        NoUsers()
+
+
+def test_every_scenario_is_complete():
+    assert all(isinstance(scenario, Scenario) and scenario.description for scenario in SCENARIOS.values())
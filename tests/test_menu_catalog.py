@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from src.utils.menu_catalog import MenuCatalog, MenuStore
+
+MENU = {"small": {"cheese": 10.0, "toppings": 2.0}}
+
+
+def write_menu(path, content: str, mtime: float) -> None:
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.mark.parametrize("raw_menu", [
+    [],
+    {},
+    {"small": []},
+    {"small": {"toppings": 2.0}},
+    {"small": {"cheese": "10"}},
+    {"small": {"cheese": None}},
+    {"small": {"cheese": True}},
+    {"small": {"cheese": -1}},
+    {"small": {"cheese": float("nan")}},
+])
+def test_invalid_menus_are_rejected(raw_menu):
+    with pytest.raises(ValueError):
+        MenuCatalog.compile(raw_menu)
+
+
+@pytest.mark.parametrize("content", ["[1, 2]", '{"small": {"cheese": null}}', '{"small": {"cheese": NaN}}', "{not json"])
+def test_bad_reload_keeps_the_last_good_menu(tmp_path, content):
+    path = tmp_path / "menu.json"
+    write_menu(path, json.dumps(MENU), 1000)
+    store = MenuStore(str(path), reload_interval=0)
+    good = store.get()
+
+    write_menu(path, content, 2000)
+    assert store.get() is good
+
+    fixed = {"small": {"cheese": 12.0}}
+    write_menu(path, json.dumps(fixed), 3000)
+    assert store.get().prices == {("small", "cheese"): 12.0}
+
+
+def test_menu_answers_a_matching_etag_with_304(client):
+    first = client.get("/api/v1/menu")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.json()["small"]["cheese"] > 0
+
+    for if_none_match in (etag, f'"stale", W/{etag}', "*"):
+        cached = client.get("/api/v1/menu", headers={"If-None-Match": if_none_match})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+
+    assert client.get("/api/v1/menu", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_etag_changes_with_the_menu(tmp_path):
+    path = tmp_path / "menu.json"
+    write_menu(path, json.dumps(MENU), 1000)
+    store = MenuStore(str(path), reload_interval=0)
+    before = store.get().etag
+
+    write_menu(path, json.dumps({"small": {"cheese": 12.0}}), 2000)
+    assert store.get().etag != before
+    # the same content gets the same ETag, on any worker
+    assert MenuCatalog.compile(MENU).etag == before
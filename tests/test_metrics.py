@@ -0,0 +1,21 @@
+from src.config.config import settings
+
+
+def test_metrics_are_off_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_require_the_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    assert "db_pool" in response.text
+    assert "principal_cache_hits_total" in response.text
+    assert "token_cache_hits_total" in response.text
+    assert "order_version_cache_hits_total" in response.text
+    assert "order_idempotency_replayed_total" in response.text
+    assert "password_pool_rejected_total" in response.text
+    assert "refresh_tokens_reuse_detected_total" in response.text
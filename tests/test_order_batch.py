@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import func, select
+
+
+def bearer(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+
+def line(pizza_type: str = "cheese", quantity: int = 1) -> dict:
+    return {"size": "small", "quantity": quantity, "pizza_type": pizza_type, "toppings": False}
+
+
+def order_ids(client, user: dict) -> list[int]:
+    return [order["id"] for order in client.get("/api/v1/order/orders", headers=bearer(user)).json()["items"]]
+
+
+def test_batch_creates_every_order(client, signed_up):
+    user = signed_up()
+    response = client.post("/api/v1/order/orders/batch", json={"orders": [line(), line("supreme", 2)]}, headers=bearer(user))
+    assert response.status_code == 201, response.text
+    created = response.json()
+    assert [(order["pizza_type"], order["quantity"]) for order in created] == [("cheese", 1), ("supreme", 2)]
+    assert order_ids(client, user) == [order["id"] for order in created]
+
+
+def test_an_invalid_line_creates_no_order(client, signed_up):
+    user = signed_up()
+    response = client.post("/api/v1/order/orders/batch", json={"orders": [line(), line("no-such-pizza")]}, headers=bearer(user))
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Order 1: ")
+    assert order_ids(client, user) == []
+
+
+def test_a_failure_after_the_insert_rolls_the_whole_batch_back(session_on, monkeypatch):
+    from src.models.order import Order
+    from src.models.order_stats import OrderStats
+    from src.models.user import User
+    from src.schema.order_schema import OrderRequest
+    from src.service.order_service import OrderService
+    from src.service.stats_service import OrderStatsService
+
+    db = session_on()
+    user = User(username="batch", email="batch@example.com", phone_no="0123456789", password="x")
+    db.add(user)
+    db.commit()
+    stats_before = db.scalar(select(func.coalesce(func.sum(OrderStats.order_count), 0)))
+
+    def failing_record(db, **changes):
+        # every order of the batch is already inserted when the summary is written
+        assert db.scalar(select(func.count()).select_from(Order).where(Order.user_id == user.id)) == 2
+        raise RuntimeError("order_stats is unavailable")
+
+    monkeypatch.setattr(OrderStatsService, "record", staticmethod(failing_record))
+    rows = OrderService.batch_rows([OrderRequest(**line()), OrderRequest(**line("supreme"))], user)
+    with pytest.raises(RuntimeError):
+        OrderService.insert_orders(db, rows)
+
+    assert db.scalar(select(func.count()).select_from(Order).where(Order.user_id == user.id)) == 0
+    assert db.scalar(select(func.coalesce(func.sum(OrderStats.order_count), 0))) == stats_before
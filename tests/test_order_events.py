@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+import json
+
+import pytest
+
+from src.utils import order_events as order_events_module
+from src.utils.order_events import RESYNC, LocalBackend, OrderEventBroker, PostgresNotifyBackend
+
+
+class Stop(BaseException):
+    """Ends the listener loop, which retries on every Exception"""
+
+
+class FakeConnection:
+    def __init__(self, payloads: list, lost: bool):
+        self.notifies = []
+        self.listening = []
+        self.closed = False
+        self._payloads = payloads
+        self._lost = lost
+
+    @property
+    def driver_connection(self):
+        return self
+
+    def cursor(self):
+        return SimpleNamespace(execute=self.listening.append)
+
+    def poll(self):
+        if self._payloads:
+            self.notifies.extend(SimpleNamespace(payload=payload) for payload in self._payloads)
+            self._payloads = []
+        elif self._lost:
+            raise OSError("server closed the connection unexpectedly")
+        else:
+            raise Stop
+
+    def close(self):
+        self.closed = True
+
+
+def test_listener_reconnects_and_listens_again(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(order_events_module.time, "sleep", sleeps.append)
+    monkeypatch.setattr(order_events_module.select, "select", lambda r, w, x, timeout: (r, w, x))
+    first = FakeConnection([json.dumps({"order_id": 1}), "not json"], lost=True)
+    second = FakeConnection([json.dumps({"order_id": 2})], lost=False)
+    attempts = iter([first, ConnectionError("refused"), second])
+
+    def raw_connection():
+        attempt = next(attempts)
+        if isinstance(attempt, Exception):
+            raise attempt
+        return attempt
+
+    backend = PostgresNotifyBackend("postgresql://localhost/unused")
+    monkeypatch.setattr(backend._engine, "raw_connection", raw_connection)
+    delivered = []
+    with pytest.raises(Stop):
+        backend._listen(delivered.append)
+
+    # the bad payload is dropped, the lost connection is replaced and LISTENs again
+    assert delivered == [{"order_id": 1}, RESYNC, {"order_id": 2}]
+    assert first.closed
+    assert first.listening == second.listening == ["LISTEN order_events"]
+    assert sleeps == [1, 2]
+    assert backend.reconnects == 1
+
+
+def test_resync_clears_the_version_cache():
+    from src.utils.order_versions import OrderVersionCache
+
+    cache = OrderVersionCache(maxsize=10, ttl=60)
+    cache.put(1, 7, 3)
+    cache._on_event(RESYNC)
+    assert cache.get(1) is None
+
+
+def test_postgres_events_go_out_with_the_writers_transaction():
+    from sqlalchemy.dialects import postgresql
+
+    broker = OrderEventBroker(PostgresNotifyBackend("postgresql://localhost/unused"), queue_size=1)
+    events = [{"order_id": 1}, {"order_id": 2}]
+    [statement] = broker.publish_statements(events)
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert "pg_notify" in str(compiled)
+    assert compiled.params["payloads"] == [json.dumps(event) for event in events]
+    # already sent by the commit, so nothing opens a connection of its own
+    broker.publish_committed(events)
+    assert broker.publish_statements([]) == []
+
+
+class FailingBackend(LocalBackend):
+    def publish(self, event: dict) -> None:
+        raise ConnectionError("broker is down")
+
+
+def test_local_events_are_published_after_the_commit():
+    broker = OrderEventBroker(LocalBackend(), queue_size=1)
+    delivered = []
+    broker.add_listener(delivered.append)
+    assert broker.publish_statements([{"order_id": 1}]) == []
+    broker.publish_committed([{"order_id": 1}, {"order_id": 2}])
+    assert delivered == [{"order_id": 1}, {"order_id": 2}]
+
+
+def test_a_failed_publish_does_not_fail_the_committed_write(caplog):
+    broker = OrderEventBroker(FailingBackend(), queue_size=1)
+    broker.publish_committed([{"order_id": 1}])
+    assert "Publishing order event" in caplog.text
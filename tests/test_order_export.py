@@ -0,0 +1,100 @@
+import json
+
+from sqlalchemy import update
+
+
+def bearer(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+
+def create_order(client, user: dict, pizza_type: str = "cheese") -> dict:
+    response = client.post(
+        "/api/v1/order/order", json={"size": "small", "quantity": 1, "pizza_type": pizza_type, "toppings": False}, headers=bearer(user)
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def export_ids(client, admin: dict, **params) -> list[int]:
+    response = client.get("/api/v1/order/orders/export", params=params, headers=bearer(admin))
+    assert response.status_code == 200, response.text
+    return [json.loads(line)["id"] for line in response.text.splitlines()]
+
+
+def test_export_includes_archived_orders_on_request(client, signed_up, engine):
+    from datetime import timedelta
+    from sqlalchemy.orm import Session
+    from src.models.order import Order, utcnow
+    from src.service.archive_service import OrderArchiveService
+
+    user, admin = signed_up(), signed_up("admin")
+    archived, live = create_order(client, user), create_order(client, user)
+    # delivered long before any order of the other tests, so only this one is archived
+    with engine.begin() as connection:
+        connection.execute(
+            update(Order).where(Order.id == archived["id"]).values(order_status="delivered", updated_at=utcnow() - timedelta(days=400))
+        )
+    with Session(engine) as db:
+        assert OrderArchiveService.archive_delivered(db, older_than_days=365) == 1
+
+    ids = export_ids(client, admin)
+    assert live["id"] in ids and archived["id"] not in ids
+
+    ids = export_ids(client, admin, include_archived="true")
+    assert live["id"] in ids and archived["id"] in ids
+    assert ids == sorted(ids)
+
+    delivered = export_ids(client, admin, include_archived="true", order_status="delivered")
+    assert archived["id"] in delivered and live["id"] not in delivered
+
+
+def test_export_streams_ndjson_and_csv(client, signed_up):
+    import csv
+    import io
+
+    user, admin = signed_up(), signed_up("admin")
+    order = create_order(client, user, pizza_type="supreme")
+
+    ndjson = client.get("/api/v1/order/orders/export", headers=bearer(admin))
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    rows = {row["id"]: row for row in map(json.loads, ndjson.text.splitlines())}
+    assert rows[order["id"]] == {key: order[key] for key in rows[order["id"]]}
+    assert rows[order["id"]]["pizza_type"] == "supreme"
+
+    exported = client.get("/api/v1/order/orders/export", params={"format": "csv"}, headers=bearer(admin))
+    assert exported.headers["content-type"].startswith("text/csv")
+    assert exported.headers["content-disposition"] == 'attachment; filename="orders.csv"'
+    reader = list(csv.DictReader(io.StringIO(exported.text)))
+    assert [row["id"] for row in reader] == [str(order_id) for order_id in rows]
+    assert next(row for row in reader if row["id"] == str(order["id"]))["pizza_type"] == "supreme"
+
+
+def test_export_filters_by_status(client, signed_up, engine):
+    from src.models.order import Order
+
+    user, admin = signed_up(), signed_up("admin")
+    pending, in_transit = create_order(client, user), create_order(client, user)
+    with engine.begin() as connection:
+        connection.execute(update(Order).where(Order.id == in_transit["id"]).values(order_status="in-transit"))
+
+    ids = export_ids(client, admin, order_status="in-transit")
+    assert in_transit["id"] in ids and pending["id"] not in ids
+
+
+def test_export_is_written_one_chunk_at_a_time(client, signed_up, monkeypatch):
+    from src.config.config import settings
+    from src.service.order_service import OrderService
+
+    user = signed_up()
+    for _ in range(3):
+        create_order(client, user)
+    monkeypatch.setattr(settings, "ORDER_EXPORT_CHUNK_SIZE", 2)
+    chunks = list(OrderService.export_orders("csv"))
+    rows = sum(chunk.count("\n") for chunk in chunks[1:])
+    # the header, then one chunk per two rows
+    assert len(chunks) == 1 + -(-rows // 2)
+    assert all(chunk.count("\n") <= 2 for chunk in chunks)
+
+
+def test_export_is_for_admins_only(client, signed_up):
+    assert client.get("/api/v1/order/orders/export", headers=bearer(signed_up())).status_code == 403
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from sqlalchemy import update
+
+
+def rebuilt_stats(db) -> dict:
+    """the summary as reconcile would rebuild it, without keeping the rebuild"""
+    from src.service.stats_service import OrderStatsService
+
+    nested = db.begin_nested()
+    for statement in OrderStatsService.rebuild_statements():
+        db.execute(statement)
+    stats = OrderStatsService.get_stats(db)
+    nested.rollback()
+    return stats
+
+
+def test_summary_follows_every_order_write(session_on):
+    from src.models.order import Order, utcnow
+    from src.models.user import User
+    from src.schema.order_schema import OrderRequest, UpdateOrderStatusRequest
+    from src.service.archive_service import OrderArchiveService
+    from src.service.order_service import OrderService
+    from src.service.stats_service import OrderStatsService
+
+    db = session_on()
+    # other tests change orders behind the summary's back, so start from a rebuilt one
+    OrderStatsService.reconcile(db)
+    user = User(username="stats", email="stats@example.com", phone_no="0123456789", password="x", role="admin")
+    db.add(user)
+    db.commit()
+
+    def total() -> dict:
+        stats = OrderStatsService.get_stats(db)
+        assert stats == rebuilt_stats(db)
+        return stats["total"]
+
+    before = total()
+    cheese = OrderService.create_order(db, OrderRequest(size="small", quantity=2, pizza_type="cheese", toppings=False), user)
+    OrderService.create_orders(db, [
+        OrderRequest(size="small", quantity=1, pizza_type="supreme", toppings=False),
+        OrderRequest(size="small", quantity=3, pizza_type="meat", toppings=False),
+    ], user)
+    after_create = total()
+    assert after_create["count"] == before["count"] + 3
+    assert after_create["quantity"] == before["quantity"] + 6
+
+    OrderService.update_order_status(db, cheese.id, UpdateOrderStatusRequest(new_status="delivered"), user)
+    assert total() == after_create
+    assert OrderStatsService.get_stats(db)["by_order_status"]["delivered"]["count"] >= 1
+
+    supreme = db.query(Order).filter_by(user_id=user.id, pizza_type="supreme").one()
+    OrderService.delete_order(db, supreme.id, user)
+    after_delete = total()
+    assert after_delete["count"] == after_create["count"] - 1
+
+    # archived orders keep counting
+    db.execute(update(Order).where(Order.id == cheese.id).values(updated_at=utcnow() - timedelta(days=400)))
+    db.commit()
+    assert OrderArchiveService.archive_delivered(db, older_than_days=365) >= 1
+    assert total() == after_delete
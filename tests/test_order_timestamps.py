@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+
+def test_timestamps_are_utc_aware(client, signed_up):
+    user = signed_up()
+    order = client.post(
+        "/api/v1/order/order", json={"size": "small", "quantity": 1, "pizza_type": "cheese", "toppings": False},
+        headers={"Authorization": f"Bearer {user['access_token']}"},
+    ).json()
+    for name in ("created_at", "updated_at"):
+        assert datetime.fromisoformat(order[name].replace("Z", "+00:00")).utcoffset() == timedelta(0)
+
+
+def test_naive_timestamps_are_read_as_utc():
+    from src.schema.order_schema import OrderResponse
+
+    naive = datetime(2026, 1, 2, 3, 4, 5)
+    order = OrderResponse(id=1, size="small", quantity=1, price=1.0, pizza_type="cheese", toppings=0, order_status="pending", user_id=1,
+                          created_at=naive, updated_at=naive.replace(tzinfo=timezone(timedelta(hours=2))))
+    assert order.created_at == naive.replace(tzinfo=timezone.utc)
+    assert order.updated_at.utcoffset() == timedelta(hours=2)
+
+
+def test_bulk_update_sets_updated_at(session_on):
+    from src.models.order import Order
+    from src.models.user import User
+
+    db = session_on()
+    user = User(username="bulk", email="bulk@example.com", phone_no="0123456789", password="x")
+    db.add(user)
+    db.flush()
+    long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    db.add_all(Order(size="small", quantity=1, price=1.0, pizza_type="cheese", user_id=user.id, created_at=long_ago, updated_at=long_ago) for _ in range(2))
+    db.commit()
+
+    db.execute(update(Order).where(Order.user_id == user.id).values(order_status="delivered"))
+    db.commit()
+    updated = db.scalars(select(Order.updated_at).where(Order.user_id == user.id)).all()
+    assert len(updated) == 2
+    assert all(value.replace(tzinfo=timezone.utc) > long_ago for value in updated)
@@ -0,0 +1,149 @@
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+import pytest
+
+
+def bearer(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+
+def test_local_backend_never_answers_from_the_version_cache(client, signed_up, engine):
+    from src.models.order import Order
+    from src.utils.order_versions import order_versions
+
+    assert not order_versions.enabled
+    user = signed_up()
+    order = client.post(
+        "/api/v1/order/order", json={"size": "small", "quantity": 1, "pizza_type": "cheese", "toppings": False}, headers=bearer(user)
+    ).json()
+    first = client.get(f"/api/v1/order/order/{order['id']}", headers=bearer(user))
+    etag = first.headers["ETag"]
+    assert client.get(f"/api/v1/order/order/{order['id']}", headers={**bearer(user), "If-None-Match": etag}).status_code == 304
+
+    # a change made through another worker, which publishes no event to this one
+    with engine.begin() as connection:
+        connection.execute(update(Order).where(Order.id == order["id"]).values(order_status="delivered", version=Order.version + 1))
+    changed = client.get(f"/api/v1/order/order/{order['id']}", headers={**bearer(user), "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["order_status"] == "delivered"
+
+
+@pytest.fixture
+def order_on(session_on):
+    from src.models.order import Order
+    from src.models.user import User
+
+    db = session_on()
+    user = User(username="stale", email="stale@example.com", phone_no="0123456789", password="x", role="admin")
+    db.add(user)
+    db.flush()
+    order = Order(size="small", quantity=1, price=11.7, pizza_type="cheese", toppings=0, user_id=user.id)
+    db.add(order)
+    db.commit()
+    return order
+
+
+def test_lost_update_is_a_conflict(session_on, order_on):
+    from fastapi import HTTPException
+    from src.models.order import Order
+    from src.schema.order_schema import UpdateOrderStatusRequest
+    from src.service.order_service import OrderService
+
+    db = session_on()
+    # held, so the identity map keeps the version this session read
+    loaded = db.get(Order, order_on.id)
+    other = session_on()
+    other.execute(update(Order).where(Order.id == order_on.id).values(order_status="in-transit", version=Order.version + 1))
+    other.commit()
+
+    with pytest.raises(HTTPException) as error:
+        OrderService.update_order_status(db, order_on.id, UpdateOrderStatusRequest(new_status="delivered"), order_on.customer)
+    assert error.value.status_code == 409
+
+
+@pytest.fixture
+def race_engine(tmp_path):
+    """An engine of its own, left in pysqlite's default mode, where a read holds no lock once it is done,
+    so another connection can change the order between the read and the write of the request under test"""
+    from sqlalchemy import create_engine
+    from src.config.database import Base
+    from src.models.order import Order
+    from src.models.user import User
+
+    engine = create_engine(f"sqlite:///{tmp_path}/race.db")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        user = User(username="racer", email="racer@example.com", phone_no="0123456789", password="x")
+        db.add(user)
+        db.flush()
+        db.add(Order(size="small", quantity=1, price=11.7, pizza_type="cheese", toppings=0, user_id=user.id))
+        db.commit()
+    yield engine
+    engine.dispose()
+
+
+def concurrent_write(expected: int):
+    """the write that makes the request under test fail with `expected`"""
+    from src.models.order import Order
+
+    if expected == 404:
+        return delete(Order)
+    return update(Order).values(order_status="in-transit", version=Order.version + 1)
+
+
+@pytest.mark.parametrize("expected", [409, 404])
+@pytest.mark.parametrize("write", ["update", "delete"])
+def test_write_racing_another_write(race_engine, monkeypatch, write, expected):
+    from fastapi import HTTPException
+    from src.models.user import User
+    from src.schema.order_schema import UpdateOrderStatusRequest
+    from src.service.order_service import OrderService
+    from src.service.stats_service import OrderStatsService
+
+    record = OrderStatsService.record
+
+    def record_after_a_concurrent_write(db, **changes):
+        with race_engine.begin() as connection:
+            connection.execute(concurrent_write(expected))
+        record(db, **changes)
+
+    monkeypatch.setattr(OrderStatsService, "record", staticmethod(record_after_a_concurrent_write))
+    with Session(race_engine) as db:
+        user = db.scalars(select(User)).one()
+        with pytest.raises(HTTPException) as error:
+            if write == "update":
+                OrderService.update_order_status(db, 1, UpdateOrderStatusRequest(new_status="delivered"), user)
+            else:
+                OrderService.delete_order(db, 1, user)
+    assert error.value.status_code == expected
+
+
+@pytest.mark.parametrize("expected", [409, 404])
+def test_async_delete_racing_another_write(race_engine, monkeypatch, expected):
+    import asyncio
+    from fastapi import HTTPException
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from src.models.user import User
+    from src.service.async_order_service import AsyncOrderService
+    from src.service.async_stats_service import AsyncOrderStatsService
+
+    record = AsyncOrderStatsService.record
+
+    async def record_after_a_concurrent_write(db, **changes):
+        with race_engine.begin() as connection:
+            connection.execute(concurrent_write(expected))
+        await record(db, **changes)
+
+    async def delete_order():
+        async_engine = create_async_engine(race_engine.url.set(drivername="sqlite+aiosqlite"))
+        try:
+            async with AsyncSession(async_engine) as db:
+                user = (await db.scalars(select(User))).one()
+                await AsyncOrderService.delete_order(db, 1, user)
+        finally:
+            await async_engine.dispose()
+
+    monkeypatch.setattr(AsyncOrderStatsService, "record", staticmethod(record_after_a_concurrent_write))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(delete_order())
+    assert error.value.status_code == expected
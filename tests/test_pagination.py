@@ -0,0 +1,71 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from src.utils.pagination import decode_cursor, encode_cursor
+
+
+def bearer(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+
+def create_order(client, user: dict) -> int:
+    response = client.post(
+        "/api/v1/order/order", json={"size": "small", "quantity": 1, "pizza_type": "cheese", "toppings": False}, headers=bearer(user)
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("last_id", [0, 1, 42, 2**40])
+def test_cursor_round_trip(last_id):
+    assert decode_cursor(encode_cursor(last_id)) == last_id
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "%%%%",
+    raw_cursor({"id": "1"}),
+    raw_cursor({"id": None}),
+    raw_cursor({"last": 1}),
+    raw_cursor([1]),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_tampered_cursor_is_a_bad_request(client, signed_up):
+    response = client.get("/api/v1/order/orders", params={"cursor": raw_cursor({"id": "1"})}, headers=bearer(signed_up()))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_pages_have_no_duplicates_or_gaps_while_orders_change(client, signed_up):
+    user = signed_up()
+    created = [create_order(client, user) for _ in range(5)]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/v1/order/orders", params=params, headers=bearer(user)).json()
+        seen += [order["id"] for order in page["items"]]
+        pages += 1
+        if pages == 1:
+            # a row deleted before the cursor and a row added after it move no other row across a page boundary
+            assert client.delete(f"/api/v1/order/order/{seen[0]}", headers=bearer(user)).status_code == 200
+            created.append(create_order(client, user))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == sorted(created)
+    assert pages == 3
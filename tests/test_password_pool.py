@@ -0,0 +1,61 @@
+import asyncio
+
+import bcrypt
+
+from src.config.config import settings
+from src.utils.password_pool import PasswordPool
+
+
+def in_use(pool: PasswordPool) -> int:
+    return pool.workers + pool.queue_size - pool._slots._value
+
+
+def watch_slots(pool: PasswordPool) -> list[int]:
+    """Records how many slots are held each time a call is submitted"""
+    seen, submit = [], pool._submit
+
+    def recording_submit(fn, *args):
+        future = submit(fn, *args)
+        seen.append(in_use(pool))
+        return future
+
+    pool._submit = recording_submit
+    return seen
+
+
+def test_hash_many_keeps_slots_free_for_logins():
+    pool = PasswordPool(workers=2, queue_size=2, timeout=10, batch_concurrency=1)
+    seen = watch_slots(pool)
+    try:
+        hashed = pool.hash_many(["a", "b", "c"])
+        assert [bcrypt.checkpw(p, h.encode("utf-8")) for p, h in zip([b"a", b"b", b"c"], hashed)] == [True] * 3
+        assert max(seen) == 1
+        assert in_use(pool) == 0
+    finally:
+        pool.shutdown()
+
+
+def test_hash_many_async_keeps_slots_free_for_logins():
+    pool = PasswordPool(workers=2, queue_size=2, timeout=10, batch_concurrency=1)
+    seen = watch_slots(pool)
+    try:
+        hashed = asyncio.run(pool.hash_many_async(["a", "b"]))
+        assert [bcrypt.checkpw(p, h.encode("utf-8")) for p, h in zip([b"a", b"b"], hashed)] == [True] * 2
+        assert max(seen) == 1
+        assert in_use(pool) == 0
+    finally:
+        pool.shutdown()
+
+
+def test_import_is_capped(client, signed_up, monkeypatch):
+    monkeypatch.setattr(settings, "USER_IMPORT_MAX", 2)
+    admin = signed_up(role="admin")
+    users = [
+        {"username": f"capped{i}", "email": f"capped{i}@example.com", "phone": "0123456789", "password": "test-password"}
+        for i in range(3)
+    ]
+    response = client.post(
+        "/api/v1/auth/users/import", json={"users": users}, headers={"Authorization": f"Bearer {admin['access_token']}"}
+    )
+    assert response.status_code == 400
+    assert response.json()["message"] == "An import can contain at most 2 users"
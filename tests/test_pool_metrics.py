@@ -0,0 +1,24 @@
+import os
+
+from sqlalchemy import create_engine, text
+
+
+def test_idle_pre_ping_replaces_a_dead_connection(tmp_path):
+    from src.utils.pool_metrics import InstrumentedQueuePool, instrument_engine
+
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'pool.db')}", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_logging_name="pre-ping-test")
+    metrics = instrument_engine(engine, "pre-ping-test", pre_ping="idle", pre_ping_idle=0)
+    try:
+        with engine.connect() as connection:
+            dead = connection.connection.dbapi_connection
+        # the pooled connection dies while idle, as after a database restart or a proxy timeout
+        dead.close()
+
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT 1")).scalar() == 1
+            assert connection.connection.dbapi_connection is not dead
+        assert metrics.pings >= 1
+        assert metrics.ping_failures == 1
+    finally:
+        engine.dispose()
@@ -0,0 +1,74 @@
+from sqlalchemy import update
+import pytest
+
+
+@pytest.fixture
+def cached_user(session_on):
+    """A user committed in the test's transaction, with its principal in the cache"""
+    from src.models.user import User
+    from src.utils.principal_cache import Principal, principal_cache
+
+    db = session_on()
+    user = User(username="cached", email="cached@example.com", phone_no="0123456789", password="x")
+    db.add(user)
+    db.commit()
+    principal_cache.put(Principal.from_user(user))
+    yield user
+    principal_cache.invalidate(user.id)
+
+
+def test_requests_are_authenticated_from_the_cache(client, signed_up):
+    from src.utils.principal_cache import principal_cache
+
+    user = signed_up()
+    headers = {"Authorization": f"Bearer {user['access_token']}"}
+    assert client.get("/api/v1/order/orders", headers=headers).status_code == 200
+    hits = principal_cache.hits
+    assert client.get("/api/v1/order/orders", headers=headers).status_code == 200
+    assert principal_cache.hits == hits + 1
+
+
+def test_role_change_invalidates_the_principal(session_on, cached_user):
+    from src.models.user import User
+    from src.utils.principal_cache import principal_cache
+
+    db = session_on()
+    user = db.get(User, cached_user.id)
+    user.username = "renamed"
+    db.commit()
+    assert principal_cache.get(cached_user.id) is not None
+
+    user.role = "admin"
+    db.commit()
+    assert principal_cache.get(cached_user.id) is None
+
+
+def test_rolled_back_role_change_keeps_the_principal(session_on, cached_user):
+    from src.models.user import User
+    from src.utils.principal_cache import principal_cache
+
+    db = session_on()
+    db.get(User, cached_user.id).role = "admin"
+    db.flush()
+    db.rollback()
+    assert principal_cache.get(cached_user.id) is not None
+
+
+def test_user_delete_invalidates_the_principal(session_on, cached_user):
+    from src.models.user import User
+    from src.utils.principal_cache import principal_cache
+
+    db = session_on()
+    db.delete(db.get(User, cached_user.id))
+    db.commit()
+    assert principal_cache.get(cached_user.id) is None
+
+
+def test_bulk_user_update_clears_the_cache(session_on, cached_user):
+    from src.models.user import User
+    from src.utils.principal_cache import principal_cache
+
+    db = session_on()
+    db.execute(update(User).where(User.email == cached_user.email).values(is_active=False))
+    db.commit()
+    assert principal_cache.get(cached_user.id) is None
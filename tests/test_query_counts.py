@@ -0,0 +1,78 @@
+"""Loading orders with include=customer takes the same number of statements for any page size.
+
+Orders of distinct customers are seeded inside a rolled back transaction,
+so a lazy load cannot be served by the identity map; a statement count that
+grows with the page size is an N+1 query.
+"""
+import pytest
+from sqlalchemy import insert, select
+
+PAGE_SIZES = (1, 10, 100)
+
+
+@pytest.fixture
+def seeded(connection):
+    from src.models.order import Order, DeliveryStatus
+    from src.models.user import User
+    from src.utils.principal_cache import Principal
+
+    user_ids = connection.scalars(
+        insert(User).returning(User.id, sort_by_parameter_order=True),
+        [
+            {"username": f"count-check-{i}", "email": f"count-check-{i}@example.com", "phone_no": "0123456789", "password": "-", "role": "user"}
+            for i in range(max(PAGE_SIZES) + 1)
+        ],
+    ).all()
+    connection.execute(insert(Order), [
+        {"size": "small", "quantity": 1, "price": 11.7, "pizza_type": "cheese", "toppings": 0, "order_status": DeliveryStatus.PENDING.value, "user_id": user_id}
+        for user_id in user_ids
+    ])
+    order_id, user_id = connection.execute(select(Order.id, Order.user_id).order_by(Order.id.desc()).limit(1)).one()
+    return {
+        "order_id": order_id,
+        "admin": Principal(id=0, username="count-check", email="count-check@example.com", phone_no="", role="admin", is_active=True),
+        "owner": Principal(id=user_id, username="count-check", email="count-check@example.com", phone_no="", role="user", is_active=True),
+    }
+
+
+def load_all_orders(db, seeded, limit):
+    from src.service.order_service import OrderService
+    from src.utils.serialization import ORDER_WITH_CUSTOMER_PAGE
+    ORDER_WITH_CUSTOMER_PAGE.dump_json(OrderService.get_all_orders(db, seeded["admin"], limit=limit, include_customer=True))
+
+
+def load_one_order(db, seeded, limit):
+    from src.service.order_service import OrderService
+    from src.utils.serialization import ORDER_WITH_CUSTOMER
+    order = OrderService.get_order_by_id(db, seeded["order_id"], seeded["owner"], include_customer=True)
+    ORDER_WITH_CUSTOMER.dump_json(ORDER_WITH_CUSTOMER.validate_python(order, from_attributes=True))
+
+
+def load_lazily(db, seeded, limit):
+    from src.schema.order_schema import OrderWithCustomerPage
+    from src.service.order_service import OrderService
+    from src.utils.serialization import ORDER_WITH_CUSTOMER_PAGE
+    statement = OrderService.orders_page_statement(seeded["admin"], limit=limit)
+    ORDER_WITH_CUSTOMER_PAGE.dump_json(OrderService.orders_page(db.scalars(statement).all(), limit, OrderWithCustomerPage))
+
+
+def statement_counts(load, seeded, connection, session_on, record_statements) -> list[int]:
+    counts = []
+    for limit in PAGE_SIZES:
+        db = session_on()
+        with record_statements(connection) as statements:
+            load(db, seeded, limit)
+        counts.append(len(statements))
+    return counts
+
+
+@pytest.mark.parametrize("load", [load_all_orders, load_one_order])
+def test_include_customer_takes_constant_statements(load, seeded, connection, session_on, record_statements):
+    counts = statement_counts(load, seeded, connection, session_on, record_statements)
+    assert len(set(counts)) == 1, f"statements per page size {PAGE_SIZES}: {counts}"
+
+
+def test_lazy_loading_is_detected(seeded, connection, session_on, record_statements):
+    # the check above would catch an N+1 query: loading the customers lazily grows with the page
+    counts = statement_counts(load_lazily, seeded, connection, session_on, record_statements)
+    assert counts[-1] > counts[0]
@@ -0,0 +1,98 @@
+"""Every OrderService query must be served by an index.
+
+Each read path, archived orders included, and the archiver's batch query
+run inside a rolled back transaction; every SELECT they send is EXPLAINed.
+Sequential scans are disabled on PostgreSQL, so a "Seq Scan" left in a
+plan means no index can serve that query shape. An index scan that only
+filters rows, without using the index to find them, counts as a full scan
+too.
+"""
+import json
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.engine import Connection
+
+
+def order_queries() -> dict:
+    from src.schema.order_schema import UpdateOrderStatusRequest
+    from src.service.archive_service import OrderArchiveService
+    from src.service.order_service import OrderService
+    from src.utils.principal_cache import Principal
+
+    customer = Principal(id=0, username="plan-check", email="plan-check@example.com", phone_no="", role="user", is_active=True)
+    admin = Principal(id=0, username="plan-check", email="plan-check@example.com", phone_no="", role="admin", is_active=True)
+    return {
+        "get_order_by_id": lambda db: OrderService.get_order_by_id(db, 0, customer),
+        "get_order_by_id (include=customer)": lambda db: OrderService.get_order_by_id(db, 0, customer, include_customer=True),
+        "get_order_by_id (include_archived)": lambda db: OrderService.get_order_by_id(db, 0, customer, include_customer=True, include_archived=True),
+        "get_order_status": lambda db: OrderService.get_order_status(db, 0, customer),
+        "get_order_status (include_archived)": lambda db: OrderService.get_order_status(db, 0, customer, include_archived=True),
+        "get_all_orders (user)": lambda db: OrderService.get_all_orders(db, customer),
+        "get_all_orders (user, next page)": lambda db: OrderService.get_all_orders(db, customer, cursor="eyJpZCI6MH0"),
+        "get_all_orders (admin)": lambda db: OrderService.get_all_orders(db, admin),
+        "get_all_orders (admin, include=customer)": lambda db: OrderService.get_all_orders(db, admin, include_customer=True),
+        "get_all_orders (admin, by user)": lambda db: OrderService.get_all_orders(db, admin, user_id=0),
+        "get_all_orders (admin, by status)": lambda db: OrderService.get_all_orders(db, admin, order_status="pending"),
+        "get_all_orders (user, include_archived)": lambda db: OrderService.get_all_orders(db, customer, include_archived=True),
+        "get_all_orders (admin, by status, include_archived)": lambda db: OrderService.get_all_orders(db, admin, order_status="delivered", include_archived=True),
+        "archive_delivered": lambda db: OrderArchiveService.archive_delivered(db, 30),
+        "update_order_status": lambda db: OrderService.update_order_status(db, 0, UpdateOrderStatusRequest(new_status="pending"), admin),
+        "delete_order": lambda db: OrderService.delete_order(db, 0, customer),
+    }
+
+
+QUERY_NAMES = [
+    "get_order_by_id", "get_order_by_id (include=customer)", "get_order_by_id (include_archived)",
+    "get_order_status", "get_order_status (include_archived)",
+    "get_all_orders (user)", "get_all_orders (user, next page)", "get_all_orders (admin)",
+    "get_all_orders (admin, include=customer)", "get_all_orders (admin, by user)", "get_all_orders (admin, by status)",
+    "get_all_orders (user, include_archived)", "get_all_orders (admin, by status, include_archived)",
+    "archive_delivered", "update_order_status", "delete_order",
+]
+
+
+def full_scans(connection: Connection, statement: str, parameters) -> list[str]:
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans, nodes = [], [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node.get("Node Type") == "Seq Scan":
+                scans.append(f"Seq Scan on {node.get('Relation Name')}")
+            elif node.get("Node Type") in ("Index Scan", "Index Only Scan") and "Filter" in node and "Index Cond" not in node:
+                scans.append(f"Full {node['Node Type']} on {node.get('Relation Name')} using {node.get('Index Name')}")
+            nodes.extend(node.get("Plans", []))
+        return scans
+
+    if connection.dialect.name == "sqlite":
+        details = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()]
+        upper = " ".join(statement.upper().split())
+        # an unfiltered SCAN that needs no temp b-tree walks the rowid (primary key) b-tree
+        # in key order; under a LIMIT that is the SQLite form of a primary key index scan
+        if " WHERE " not in upper and "LIMIT" in upper and not any(detail.startswith("USE TEMP B-TREE") for detail in details):
+            return []
+        return [detail for detail in details if detail.startswith("SCAN ")]
+
+    pytest.skip(f"query plan checks are not supported on {connection.dialect.name}")
+
+
+def test_every_query_is_checked():
+    assert sorted(QUERY_NAMES) == sorted(order_queries())
+
+
+@pytest.mark.parametrize("name", QUERY_NAMES)
+def test_order_query_uses_an_index(name, connection, session_on, record_statements):
+    db = session_on()
+    with record_statements(connection) as statements:
+        try:
+            order_queries()[name](db)
+        except HTTPException:
+            pass
+    selects = [(statement, parameters) for statement, parameters in statements if statement.lstrip().upper().startswith("SELECT")]
+    assert selects
+    scans = [scan for statement, parameters in selects for scan in full_scans(connection, statement, parameters)]
+    assert not scans, f"{name} falls back to a full table scan: {', '.join(scans)}"
@@ -0,0 +1,78 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, func, insert, select
+import pytest
+
+metadata = MetaData()
+origin = Table("origin", metadata, Column("id", Integer, primary_key=True), Column("name", String(20)))
+
+
+@pytest.fixture
+def routed_app(tmp_path, monkeypatch):
+    """An app whose sessions write to a primary SQLite file and may read from a replica file"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from src.config import database
+    from src.config.database import ReplicaSet, RoutingSession, replica_reads
+    from src.utils.recent_writes import RecentWritesMiddleware, recent_writes
+
+    engines = {}
+    for name in ("primary", "replica"):
+        engines[name] = create_engine(f"sqlite:///{tmp_path}/{name}.db")
+        metadata.create_all(engines[name])
+        with engines[name].begin() as connection:
+            connection.execute(insert(origin).values(name=name))
+    monkeypatch.setattr(database, "REPLICA_URLS", [str(engines["replica"].url)])
+
+    app = FastAPI()
+    app.add_middleware(RecentWritesMiddleware, recent_writes=recent_writes)
+
+    def session() -> RoutingSession:
+        return RoutingSession(bind=engines["primary"], replicas=ReplicaSet([engines["replica"]], "round_robin"))
+
+    @app.get("/read")
+    def read():
+        with session() as db, replica_reads(db):
+            return db.scalar(select(origin.c.name).order_by(origin.c.id))
+
+    @app.post("/write")
+    def write():
+        with session() as db:
+            db.execute(insert(origin).values(name="written"))
+            db.commit()
+            with replica_reads(db):
+                return db.scalar(select(origin.c.name).order_by(origin.c.id))
+
+    with TestClient(app) as client:
+        yield client, engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+def rows(engine) -> int:
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(origin))
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(routed_app):
+    client, engines = routed_app
+    assert client.get("/read").json() == "replica"
+
+    # the write lands on the primary, and the rest of its request reads from there
+    assert client.post("/write").json() == "primary"
+    assert (rows(engines["primary"]), rows(engines["replica"])) == (2, 1)
+
+
+def test_the_next_read_of_the_writing_client_goes_to_the_primary(routed_app):
+    from fastapi.testclient import TestClient
+    from src.utils.recent_writes import recent_writes
+
+    client, engines = routed_app
+    written = client.post("/write")
+    assert recent_writes.cookie in written.cookies
+    # the cookie carries the write to the next request, whichever worker serves it
+    assert client.get("/read").json() == "primary"
+
+    other = TestClient(client.app)
+    assert other.get("/read").json() == "replica"
+    value, _, signature = written.cookies[recent_writes.cookie].rpartition(".")
+    other.cookies.set(recent_writes.cookie, f"{float(value) + 3600:.3f}.{signature}")
+    assert other.get("/read").json() == "replica"
@@ -0,0 +1,17 @@
+import time
+
+import pytest
+
+from src.utils.token_cache import TokenCache
+
+
+def test_cached_payloads_are_read_only():
+    cache = TokenCache(maxsize=10)
+    payload = {"id": 1, "role": "user", "exp": time.time() + 60}
+    cache.put("token", payload)
+    payload["role"] = "admin"
+
+    cached = cache.get("token")
+    assert cached["role"] == "user"
+    with pytest.raises(TypeError):
+        cached["role"] = "admin"